@@ -4,26 +4,37 @@ Makes it easy to add new data sources
 """
 from statistics import mean
 
-from data_sources.leith_st_traffic import TrafficFetcherLeithSt
-from data_sources.gilmerton_road_traffic import TrafficFetcherGilmertonRoad
-from data_sources.lady_road_traffic import TrafficFetcherLadyRoad
-from data_sources.nicolson_st_traffic import TrafficFetcherNicolsonSt
-from data_sources.portobello_high_st_traffic import TrafficFetcherPortobelloHighSt
-from data_sources.edi_airport_traffic import TrafficFetcherEdiAirport
-from data_sources.princes_st_traffic import TrafficFetcherPrincesSt
+from data_sources.traffic import TrafficFetcher
+from data_sources.traffic_tiles import TrafficTileFetcher
 from data_sources.liveVehicleLocation import LiveVehicleLocationFetcher
 from data_sources.flights import FlightFetcher
 from data_sources.stops import BusStopFetcher
 from data_sources.weather import WeatherFetcher
 from data_sources.energy import EnergyFetcher
+from data_sources.air_quality import AirQualityFetcher
 from datetime import datetime
-from typing import Dict, Optional
-import predictor_engine
+from typing import Dict, List, Optional
+from air_quality_grid import IDWGrid
+from air_quality_service import AirQualityPredictor, FEATURE_COLUMNS, weather_to_features
+from backtest import SnapshotRecorder
+from flight_poller import FlightPoller
+from circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError
+from road_risk import RoadRiskIndex
+from traffic_budget import PollingBudget
+from road_safety import RoadSafetyTable
+from serialization import dumps
+from prediction_runner import PredictionRunner
+from config.settings import PREDICTION_EXECUTION_MODE, TRAFFIC_INGESTION_MODE, TRAFFIC_MAX_READING_AGE
+from config.traffic_segments import SEGMENTS, TrafficSegment
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+
 class DataAggregator:
     """Combines all data sources into unified city metrics"""
     
@@ -42,26 +53,60 @@ class DataAggregator:
 
 
 
-        self.traffic_princes_st = TrafficFetcherPrincesSt(tomtom_api_key)
-        self.traffic_edi_airport = TrafficFetcherEdiAirport(tomtom_api_key)
-        self.traffic_portobello_high_st = TrafficFetcherPortobelloHighSt(tomtom_api_key)
-        self.traffic_nicolson_st = TrafficFetcherNicolsonSt(tomtom_api_key)
-        self.traffic_lady_road = TrafficFetcherLadyRoad(tomtom_api_key)
-        self.traffic_gilmerton_road = TrafficFetcherGilmertonRoad(tomtom_api_key)
-        self.traffic_leith_st = TrafficFetcherLeithSt(tomtom_api_key)
+        # Every segment in config/traffic_segments.json, read through one fetcher:
+        # a flowSegmentData request each, or all of them from city-wide flow tiles
+        self.traffic_segments = SEGMENTS
+        if TRAFFIC_INGESTION_MODE == "tiles":
+            self.traffic = TrafficTileFetcher(tomtom_api_key)
+        else:
+            self.traffic = TrafficFetcher(tomtom_api_key)
+        # Point polling spends a daily request quota; tiles are a fixed cost per TTL
+        self.traffic_budget = PollingBudget([s.key for s in SEGMENTS]) if isinstance(self.traffic, TrafficFetcher) else None
+        self._traffic_latest: Dict[str, tuple] = {}  # (fetched at, entry) per segment, reused between polls
 
         self.liveLocation = LiveVehicleLocationFetcher()
         self.stops = BusStopFetcher()
 
+        # OpenAQ sensor readings (only polled when an API key is configured)
+        self.air_sensors = AirQualityFetcher() if os.getenv("AIR_QUALITY_API_KEY") else None
+        self.air_grid = IDWGrid()
+
+        # PM2.5 estimates from the trained model; app.py starts loading it at startup
+        self.air_quality_model = AirQualityPredictor()
+
+        # GB collision statistics, memory-mapped (build with `python road_safety.py build`)
+        try:
+            self.road_safety = RoadSafetyTable.load()
+            self.road_risk = RoadRiskIndex(self.road_safety)
+        except (OSError, ValueError) as e:
+            logger.warning("Road safety table unavailable (run `python road_safety.py build`): %s", e)
+            self.road_safety = None
+            self.road_risk = None
+
         # Add more sources later:
 
         # self.social = SocialFetcher()
-        
+
+        # Optionally record every snapshot for offline backtesting (see backtest.py)
+        record_path = os.getenv("SNAPSHOT_RECORD_PATH")
+        self.recorder = SnapshotRecorder(record_path) if record_path else None
+
+        # One circuit breaker per upstream, so a dead API is skipped instead of timing out every cycle
+        self.breakers = {name: CircuitBreaker(name) for name in
+                         ("weather", "energy", "flights", "traffic", "live_transport", "stops", "air_quality")}
+
+        # Flights are polled on their own schedule (OpenSky is slow and rationed); app.py starts it
+        self.flight_poller = FlightPoller(self.fetch_flight_data)
+
+        # Prediction engine, run off the event loop by default
+        self.predictions = PredictionRunner(PREDICTION_EXECUTION_MODE)
+
         self.last_data = None
+        self.last_data_json: Optional[bytes] = None  # last_data, encoded once when published
     
     async def fetch_weather_data(self):
         try:
-            data = await self.weather.fetch_weather()
+            data = await self.breakers["weather"].call(self.weather.fetch_weather)
             score = self.weather.calculate_score(data)
             return {
                 'score': score,
@@ -69,13 +114,34 @@ class DataAggregator:
                 'description': data['description'],
                 'raw': data
             }
+        except CircuitOpenError:
+            return None
         except Exception as e:
-            print(f"Weather error: {e}")
+            logger.warning("Weather error: %s", e)
             return None
 
+    def segment_weather_data(self) -> Dict[str, Dict]:
+        """Weather at each traffic segment, looked up from the cached hourly forecasts (no requests)"""
+        if self.weather.values is None:
+            return {}
+        segments = {}
+        for segment in self.traffic_segments:
+            data = self.weather.lookup(segment.key)
+            try:
+                score = self.weather.calculate_score(data)
+            except TypeError:  # A missing hourly value
+                score = None
+            segments[segment.key] = {
+                'score': score,
+                'temperature': data['temperature'],
+                'description': data['description'],
+                'wind_speed': data['wind_speed'],
+            }
+        return segments
+
     async def fetch_energy_data(self):
         try:
-            data = await self.energy.fetch()
+            data = await self.breakers["energy"].call(self.energy.fetch)
             score = self.energy.calculate_score(data)
             return {
                 'score': score,
@@ -83,179 +149,203 @@ class DataAggregator:
                 'dominant_fuel': data['dominant_fuel'],
                 'raw': data
             }
+        except CircuitOpenError:
+            return None
         except Exception as e:
-            print(f"Energy error: {e}")
+            logger.warning("Energy error: %s", e)
             return None
 
     async def fetch_flight_data(self):
         try:
-            data = await self.flights.fetch()
+            data = await self.breakers["flights"].call(self.flights.fetch)
             score = self.flights.calculate_score(data)
             return {
                 'score': score,
                 'arriving_count': len(data['arriving']),
                 'departing_count': len(data['departing']),
                 'total_in_air': data['total_in_air'],
+                'recent_landings': data['recent_landings'],
+                'recent_takeoffs': data['recent_takeoffs'],
                 'raw': data
             }
-        except Exception as e:
-            print(f"Flight error: {e}")
+        except CircuitOpenError:
             return None
-
-    async def fetch_traffic_princes_st_data(self):
-        try:
-            data = await self.traffic_princes_st.fetch_traffic_princes_st()
-            score = self.traffic_princes_st.calculate_score(data)
-            return {
-                'score': score,
-                'current_speed': data['current_speed'],
-                'free_flow_speed': data['free_flow_speed'],
-                'road_closure': data['road_closure'],
-                'raw': data
-            }
         except Exception as e:
-            print(f"Traffic error: {e}")
+            logger.warning("Flight error: %s", e)
             return None
 
-    async def fetch_traffic_edi_airport_data(self):
-        try:
-            data = await self.traffic_edi_airport.fetch_traffic_edi_airport()
-            score = self.traffic_edi_airport.calculate_score(data)
-            return {
-                'score': score,
-                'current_speed': data['current_speed'],
-                'free_flow_speed': data['free_flow_speed'],
-                'road_closure': data['road_closure'],
-                'raw': data
-            }
-        except Exception as e:
-            print(f"Traffic error: {e}")
-            return None
+    def _traffic_entry(self, data: Dict) -> Dict:
+        return {
+            'score': self.traffic.calculate_score(data),
+            'current_speed': data['current_speed'],
+            'free_flow_speed': data['free_flow_speed'],
+            'road_closure': data['road_closure'],
+            'stale': False,
+            'age_s': 0,
+            'raw': data
+        }
 
-    async def fetch_traffic_portobello_high_st_data(self):
+    async def fetch_segment_traffic_data(self, segment: TrafficSegment):
+        if self.traffic_budget and self.breakers["traffic"].state != OPEN:
+            self.traffic_budget.record()
         try:
-            data = await self.traffic_portobello_high_st.fetch_traffic_portobello_high_st()
-            score = self.traffic_portobello_high_st.calculate_score(data)
-            return {
-                'score': score,
-                'current_speed': data['current_speed'],
-                'free_flow_speed': data['free_flow_speed'],
-                'road_closure': data['road_closure'],
-                'raw': data
-            }
+            return self._traffic_entry(await self.breakers["traffic"].call(self.traffic.fetch_segment, segment))
+        except CircuitOpenError:
+            return None
         except Exception as e:
-            print(f"Traffic error: {e}")
+            logger.warning("Traffic error (%s): %s", segment.slug, e)
             return None
 
-    async def fetch_traffic_nicolson_st_data(self):
+    def _open_traffic_anomalies(self) -> List[str]:
+        return [p['validation_data']['location_key'] for p in self.predictions.latest.get('predictions', [])
+                if p['validation_data'].get('detector', 'traffic') == 'traffic']
+
+    async def fetch_traffic_data(self) -> Dict[str, Dict]:
+        """
+        All registered segments, keyed by snapshot key ({} where a request failed).
+        With a polling budget only the segments it says are due are fetched; the
+        rest (and all of them while the TomTom circuit is open) keep their last reading,
+        marked stale with its age, until it is older than TRAFFIC_MAX_READING_AGE.
+        Stale entries are left out of the prediction engine's history and forecasts.
+        """
+        segments = self.traffic_segments
+        if self.traffic_budget:
+            due = set(self.traffic_budget.due(self._open_traffic_anomalies()))
+            segments = [segment for segment in segments if segment.key in due]
+        breaker = self.breakers["traffic"]
+        if segments and not breaker.allow():
+            segments = []
+        if self.traffic_budget:
+            self.traffic_budget.mark_polled(segment.key for segment in segments)
+        results = await self.traffic.fetch_many(segments) if segments else {}
+        if results:
+            # TomTom counts as down only if every request this cycle failed
+            errors = [r for r in results.values() if isinstance(r, Exception)]
+            if len(errors) == len(results):
+                breaker.record_failure(errors[0])
+            else:
+                breaker.record_success()
+
+        traffic = {}
+        now = time.time()
+        for segment in self.traffic_segments:
+            if segment.key not in results:
+                fetched_at, entry = self._traffic_latest.get(segment.key, (now, {}))
+                age = now - fetched_at
+                if entry and age <= TRAFFIC_MAX_READING_AGE:
+                    traffic[segment.key] = {**entry, 'stale': True, 'age_s': round(age)}
+                else:
+                    traffic[segment.key] = {}
+                    self._traffic_latest.pop(segment.key, None)
+                continue
+            result = results[segment.key]
+            if isinstance(result, Exception):
+                logger.warning("Traffic error (%s): %s", segment.slug, result)
+                traffic[segment.key] = {}
+            else:
+                traffic[segment.key] = self._traffic_entry(result)
+                if self.traffic_budget:
+                    self.traffic_budget.observe(segment.key, traffic[segment.key]['score'])
+            self._traffic_latest[segment.key] = (now, traffic[segment.key])
+        return traffic
+
+    async def fetch_citywide_flow_data(self):
+        """Congestion over the whole tile bbox (tile ingestion only)"""
+        if not isinstance(self.traffic, TrafficTileFetcher) or self.breakers["traffic"].state == OPEN:
+            return None
         try:
-            data = await self.traffic_nicolson_st.fetch_traffic_nicolson_st()
-            score = self.traffic_nicolson_st.calculate_score(data)
-            return {
-                'score': score,
-                'current_speed': data['current_speed'],
-                'free_flow_speed': data['free_flow_speed'],
-                'road_closure': data['road_closure'],
-                'raw': data
-            }
+            return await self.traffic.flow_summary()
         except Exception as e:
-            print(f"Traffic error: {e}")
+            logger.warning("Traffic tiles error: %s", e)
             return None
 
-    async def fetch_traffic_lady_road_data(self):
+    async def fetch_live_transport_data(self):
         try:
-            data = await self.traffic_lady_road.fetch_traffic_lady_road()
-            score = self.traffic_lady_road.calculate_score(data)
+            data = await self.breakers["live_transport"].call(self.liveLocation.fetch_transport)
             return {
-                'score': score,
-                'current_speed': data['current_speed'],
-                'free_flow_speed': data['free_flow_speed'],
-                'road_closure': data['road_closure'],
-                'raw': data
+                'raw': data,
+                'vehicle_count': len(data) if data else 0
             }
+        except CircuitOpenError:
+            return None
         except Exception as e:
-            print(f"Traffic error: {e}")
+            logger.warning("Live location error: %s", e)
             return None
 
-    async def fetch_traffic_gilmerton_road_data(self):
+    async def fetch_stops_data(self):
         try:
-            data = await self.traffic_gilmerton_road.fetch_traffic_gilmerton_road()
-            score = self.traffic_gilmerton_road.calculate_score(data)
+            data = await self.breakers["stops"].call(self.stops.fetch_stops)
             return {
-                'score': score,
-                'current_speed': data['current_speed'],
-                'free_flow_speed': data['free_flow_speed'],
-                'road_closure': data['road_closure'],
-                'raw': data
+                'raw': data,
+                'stop_count': len(data) if data else 0
             }
+        except CircuitOpenError:
+            return None
         except Exception as e:
-            print(f"Traffic error: {e}")
+            logger.warning("Bus stops error: %s", e)
             return None
 
-    async def fetch_traffic_leith_st_data(self):
+    async def fetch_air_sensor_data(self):
+        if self.air_sensors is None:
+            return None
         try:
-            data = await self.traffic_leith_st.fetch_traffic_leith_st()
-            score = self.traffic_leith_st.calculate_score(data)
-            return {
-                'score': score,
-                'current_speed': data['current_speed'],
-                'free_flow_speed': data['free_flow_speed'],
-                'road_closure': data['road_closure'],
-                'raw': data
-            }
+            return await self.breakers["air_quality"].call(self.air_sensors.fetch_air_quality)
+        except CircuitOpenError:
+            return None
         except Exception as e:
-            print(f"Traffic error: {e}")
+            logger.warning("Air quality sensors error: %s", e)
             return None
 
-    async def fetch_live_transport_data(self):
-        try:
-            data = await self.liveLocation.fetch_transport()
-            return {
-                'raw': data,
-                'vehicle_count': len(data) if data else 0
-            }
-        except Exception as e:
-            print(f"Live location error: {e}")
+    def get_air_quality_grid(self, pollutant: str = "pm25") -> Optional[Dict]:
+        """Interpolated surface from the latest sensor readings (refreshed by fetch_all_data)."""
+        if self.air_sensors is None:
             return None
+        table = self.air_sensors.table
+        columns = table.pollutants.get(pollutant)
+        if columns is None:
+            return None
+        surface = self.air_grid.surface(columns, table.units.get(pollutant))
+        if surface is not None:
+            surface['pollutant'] = pollutant
+        return surface
 
-    async def fetch_stops_data(self):
+    async def fetch_air_quality(self):
         try:
-            data = await self.stops.fetch_stops()
+            # Reuse the weather from the latest snapshot rather than calling Open-Meteo again
+            weather = (self.last_data or {}).get('weather', {}).get('raw')
+            if not weather:
+                weather = await self.breakers["weather"].call(self.weather.fetch_weather)
+            features = weather_to_features(weather)
+            if features is None:
+                return None
+            pm25 = await self.air_quality_model.predict(features)
             return {
-                'raw': data,
-                'stop_count': len(data) if data else 0
+                'pm25_estimate': pm25,
+                'unit': 'µg/m³',
+                'model_ready': self.air_quality_model.model is not None,
+                'model_version': self.air_quality_model.model_version,
+                'features': dict(zip(FEATURE_COLUMNS, features)),
+                'weather_timestamp': weather.get('timestamp')
             }
+        except CircuitOpenError:
+            return None
         except Exception as e:
-            print(f"Bus stops error: {e}")
+            logger.warning("Air quality error: %s", e)
             return None
 
     async def fetch_all_data(self) -> Dict:
         weather_data = await self.fetch_weather_data() or {}
         energy_data = await self.fetch_energy_data() or {}
-        #flight_data = await self.fetch_flight_data() or {}
-        flight_data = {}
-        traffic_princes_st_data = await self.fetch_traffic_princes_st_data() or {}
-        traffic_edi_airport_data = await self.fetch_traffic_edi_airport_data() or {}
-        traffic_portobello_high_st_data = await self.fetch_traffic_portobello_high_st_data() or {}
-        traffic_nicolson_st_data = await self.fetch_traffic_nicolson_st_data() or {}
-        traffic_lady_road_data = await self.fetch_traffic_lady_road_data() or {}
-        traffic_gilmerton_road_data = await self.fetch_traffic_gilmerton_road_data() or {}
-        traffic_leith_st_data = await self.fetch_traffic_leith_st_data() or {}
+        flight_data = self.flight_poller.latest or {}
+        traffic_data = await self.fetch_traffic_data()
         live_transport_data = await self.fetch_live_transport_data() or {}
         stops_data = await self.fetch_stops_data() or {}
-
+        air_sensor_data = await self.fetch_air_sensor_data() or {}
 
         # Get scores for city_pulse calculation, with fallbacks
         weather_score = weather_data.get('score', 50)
         energy_score = energy_data.get('score', 50)
-        traffic_scores = [traffic_princes_st_data.get('score', 50),
-                          traffic_edi_airport_data.get('score', 50),
-                          traffic_portobello_high_st_data.get('score', 50),
-                          traffic_nicolson_st_data.get('score', 50),
-                          traffic_lady_road_data.get('score', 50),
-                          traffic_gilmerton_road_data.get('score', 50),
-                          traffic_leith_st_data.get('score', 50)
-                          ]
+        traffic_scores = [segment.get('score', 50) for segment in traffic_data.values()] or [50]
         traffic_score = mean(traffic_scores)
         flight_score = flight_data.get('score', 0)
 
@@ -264,15 +354,11 @@ class DataAggregator:
             'live_transport': live_transport_data,
             'stops': stops_data,
             'weather': weather_data,
+            'segment_weather': self.segment_weather_data(),
             'energy': energy_data,
+            'air_quality': air_sensor_data,
             'flights': flight_data,
-            'princes_street_traffic': traffic_princes_st_data,
-            'edi_airport_traffic': traffic_edi_airport_data,
-            'portobello_high_st_traffic': traffic_portobello_high_st_data,
-            'nicolson_st_traffic': traffic_nicolson_st_data,
-            'lady_road_traffic': traffic_lady_road_data,
-            'gilmerton_road_traffic': traffic_gilmerton_road_data,
-            'leith_st_traffic': traffic_leith_st_data,
+            **traffic_data,
             'social': {'score': 50, 'mood': 50, 'raw': None},
             'city_pulse': {
                 'mood': weather_score * 0.7 + 50 * 0.3,
@@ -281,16 +367,32 @@ class DataAggregator:
             }
         }
 
-        predictor_engine.run_prediction_cycle(combined_data)
+        citywide_flow = await self.fetch_citywide_flow_data()
+        if citywide_flow:
+            combined_data['citywide_flow'] = citywide_flow
+        if self.traffic_budget:
+            combined_data['polling_budget'] = self.traffic_budget.status()
+        combined_data['source_health'] = {name: breaker.status() for name, breaker in self.breakers.items()}
+
+        if self.road_risk:
+            combined_data['road_risk'] = self.road_risk.compute(combined_data)
+
+        if self.recorder:
+            self.recorder.write(combined_data)
 
         # --- EMBED PREDICTIONS AND STATS FOR THE WEBSOCKET ---
-        combined_data['predictions'] = predictor_engine.get_live_predictions_and_stats()
+        combined_data['predictions'] = await self.predictions.run(combined_data)
 
         
+        self.last_data_json = dumps(combined_data)
         self.last_data = combined_data
         return combined_data
 
     
     def get_last_data(self) -> Optional[Dict]:
         """Get cached data (for when frontend first connects)"""
-        return self.last_data
\ No newline at end of file
+        return self.last_data
+
+    def get_last_data_json(self) -> Optional[bytes]:
+        """The cached snapshot as JSON, already encoded (for /api/data and the WebSocket)"""
+        return self.last_data_json
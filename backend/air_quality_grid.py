@@ -0,0 +1,82 @@
+"""
+Pollution surface over Edinburgh from point sensor readings.
+Inverse distance weighting: each cell is a weighted mean of the sensors, with
+weights 1/d^p. The normalized (cells x sensors) weight matrix depends only on
+where the reporting sensors are, so it is built once per sensor set and every
+refresh after that is a single matrix-vector product.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from config.settings import AIR_GRID_BBOX, AIR_GRID_IDW_POWER, AIR_GRID_SHAPE
+
+KM_PER_DEGREE_LAT = 111.32
+
+
+class IDWGrid:
+    def __init__(self, bbox=AIR_GRID_BBOX, shape=AIR_GRID_SHAPE, power: float = AIR_GRID_IDW_POWER,
+                 max_cached_sets: int = 8):
+        self.bbox = list(bbox)
+        self.shape = tuple(shape)
+        self.power = power
+        south, west, north, east = self.bbox
+        self.lats = np.linspace(south, north, self.shape[0])
+        self.lons = np.linspace(west, east, self.shape[1])
+        self._km_per_degree_lon = KM_PER_DEGREE_LAT * np.cos(np.radians((south + north) / 2))
+        # Cell centres in local km, flattened row-major
+        grid_lat, grid_lon = np.meshgrid(self.lats, self.lons, indexing="ij")
+        self._cells = np.column_stack([grid_lat.ravel() * KM_PER_DEGREE_LAT, grid_lon.ravel() * self._km_per_degree_lon])
+        self._max_cached_sets = max_cached_sets
+        self._weights: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+
+    def _build_weights(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        sensors = np.column_stack([lats * KM_PER_DEGREE_LAT, lons * self._km_per_degree_lon])
+        distances = np.sqrt(((self._cells[:, None, :] - sensors[None, :, :]) ** 2).sum(axis=2))
+        with np.errstate(divide="ignore"):
+            weights = distances ** -self.power
+        # A cell sitting on a sensor just takes that sensor's value
+        exact = np.isinf(weights)
+        on_sensor = exact.any(axis=1)
+        weights[on_sensor] = exact[on_sensor]
+        return weights / weights.sum(axis=1, keepdims=True)
+
+    def weights(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Normalized weight matrix for this sensor layout, reused until the layout changes."""
+        key = lats.tobytes() + lons.tobytes()
+        weights = self._weights.get(key)
+        if weights is None:
+            weights = self._build_weights(lats, lons)
+            self._weights[key] = weights
+            if len(self._weights) > self._max_cached_sets:
+                self._weights.popitem(last=False)
+        else:
+            self._weights.move_to_end(key)
+        return weights
+
+    def interpolate(self, lats, lons, values) -> Optional[np.ndarray]:
+        """(rows, cols) surface from sensor readings; sensors with NaN values or positions are left out."""
+        lats, lons, values = (np.asarray(a, dtype=np.float64) for a in (lats, lons, values))
+        valid = ~(np.isnan(lats) | np.isnan(lons) | np.isnan(values))
+        if not valid.any():
+            return None
+        return (self.weights(lats[valid], lons[valid]) @ values[valid]).reshape(self.shape)
+
+    def surface(self, columns: Dict[str, np.ndarray], unit: Optional[str] = None) -> Optional[Dict]:
+        """JSON-ready grid from one pollutant's columns of a PollutantTable."""
+        grid = self.interpolate(columns["lat"], columns["lon"], columns["value"])
+        if grid is None:
+            return None
+        return {
+            "generated_at": datetime.now().isoformat(),
+            "unit": unit,
+            "bbox": self.bbox,
+            "shape": list(self.shape),
+            "lats": np.round(self.lats, 5).tolist(),
+            "lons": np.round(self.lons, 5).tolist(),
+            "sensors": int((~np.isnan(columns["value"])).sum()),
+            "values": np.round(grid, 2).tolist(),
+        }
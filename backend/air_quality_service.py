@@ -0,0 +1,199 @@
+"""
+Online PM2.5 inference with the model from data_analysis/train_air_quality_model.py.
+The model is loaded once, in the background, and requests are micro-batched onto
+a small thread pool. Results are cached by quantized feature vector, so repeat
+requests for the same conditions never reach the model. New model versions
+are swapped in with reload() without interrupting requests.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from feature_pipeline import FEATURE_COLUMNS, compile_pipeline
+from model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "data_analysis", "air_quality_model.pkl")
+# Flat-array export of the same model (see flat_forest.py); preferred when present
+FLAT_MODEL_PATH = os.path.join(os.path.dirname(__file__), "data_analysis", "air_quality_model.forest")
+
+# Cache key resolution per feature (FEATURE_COLUMNS order); finer than this doesn't move the estimate
+FEATURE_QUANTA = [0.1, 0.1, 0.1, 1.0, 0.5, 10.0, 10.0, 0.5]
+
+_live_features = compile_pipeline("open_meteo")
+
+
+def weather_to_features(weather: Dict) -> Optional[List[float]]:
+    """
+    Maps WeatherFetcher output (Open-Meteo units) onto the MIDAS training columns.
+    Returns None if a field the model needs is missing.
+    """
+    features = _live_features.transform_record(weather)
+    return None if features is None else features.tolist()
+
+
+class AirQualityPredictor:
+    """Loads the PM2.5 model once and serves batched, cached predictions."""
+
+    def __init__(self, model_path: str = MODEL_PATH, flat_model_path: str = FLAT_MODEL_PATH,
+                 registry: Optional[ModelRegistry] = None, batch_window_ms: float = 2.0, max_batch: int = 64,
+                 cache_size: int = 4096, workers: int = 2):
+        self.model_path = model_path
+        self.flat_model_path = flat_model_path
+        self.registry = registry or ModelRegistry()
+        self.model_version: Optional[str] = None
+        self._generation = 0  # Bumped on every model swap, so stale results aren't cached
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self.model = None
+        self.load_error: Optional[str] = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="air-quality")
+        self._loading: Optional[asyncio.Future] = None
+        self._cache: "OrderedDict[Tuple, float]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+
+    # ---------- loading ----------
+
+    def _model_source(self) -> Tuple[str, Optional[str]]:
+        """(path, registry version) of the model to serve: the promoted version if any, else the bundled one."""
+        version = self.registry.current()
+        if version is not None:
+            feature_names = self.registry.metadata(version).get("feature_names")
+            if feature_names == FEATURE_COLUMNS:
+                return self.registry.artifact(version), version
+            logger.warning("Promoted model %s expects features %s; serving the bundled model", version, feature_names)
+        if self.flat_model_path and os.path.isdir(self.flat_model_path):
+            return self.flat_model_path, None
+        return self.model_path, None
+
+    def _read_model(self):
+        start = time.perf_counter()
+        source, version = self._model_source()
+        if os.path.isdir(source):
+            # Memory-mapped arrays: near-instant, and pages are shared between workers
+            from flat_forest import FlatForest
+            model = FlatForest.load(source)
+        else:
+            import joblib  # Only needed here; keeps the import off the request path
+            # Trained on a DataFrame, served plain arrays in FEATURE_COLUMNS order
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            model = joblib.load(source)
+            # Small batches are faster on one thread than fanned out across cores
+            if hasattr(model, "n_jobs"):
+                model.n_jobs = 1
+        logger.info("🌫️ Air quality model %s loaded from %s in %.3fs", version or "(bundled)",
+                    os.path.basename(source), time.perf_counter() - start)
+        return model, version
+
+    def _load(self):
+        self.model, self.model_version = self._read_model()
+
+    async def reload(self) -> bool:
+        """
+        Loads the current model off the event loop and swaps it in. Batches already
+        running finish on the old model; requests keep being served throughout.
+        """
+        try:
+            model, version = await asyncio.get_running_loop().run_in_executor(self._executor, self._read_model)
+        except Exception as e:
+            logger.error("Air quality model reload failed, keeping %s: %s", self.model_version or "(bundled)", e)
+            return False
+        self.model, self.model_version = model, version
+        self._generation += 1
+        self._cache.clear()
+        return True
+
+    def start_loading(self) -> asyncio.Future:
+        """Starts loading the model in the background (idempotent)."""
+        if self._loading is None:
+            self._loading = asyncio.get_running_loop().run_in_executor(self._executor, self._load)
+        return self._loading
+
+    async def ready(self) -> bool:
+        try:
+            await self.start_loading()
+        except Exception as e:
+            if self.load_error is None:
+                logger.error("Air quality model failed to load: %s", e)
+            self.load_error = str(e)
+            return False
+        return True
+
+    # ---------- inference ----------
+
+    @staticmethod
+    def _cache_key(features: List[float]) -> Tuple:
+        return tuple(round(value / q) for value, q in zip(features, FEATURE_QUANTA))
+
+    async def predict(self, features: List[float]) -> Optional[float]:
+        """PM2.5 estimate (µg/m³) for one feature vector, or None if the model is unavailable."""
+        key = self._cache_key(features)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        if not await self.ready():
+            return None
+
+        if self._batcher is None or self._batcher.done():
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.create_task(self._batch_loop())
+        future = asyncio.get_running_loop().create_future()
+        # Predict on the quantized vector so the cached value is the same for every member of the bucket
+        await self._queue.put(([k * q for k, q in zip(key, FEATURE_QUANTA)], future))
+        return await future
+
+    async def _batch_loop(self):
+        """Collects requests for up to `batch_window` and runs them as one model call."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            features = np.array([item[0] for item in batch], dtype=np.float64)
+            generation = self._generation
+            try:
+                predictions = await loop.run_in_executor(self._executor, self.model.predict, features)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (vector, future), value in zip(batch, predictions):
+                value = round(float(value), 2)
+                if generation == self._generation:
+                    self._remember(self._cache_key(vector), value)
+                if not future.done():
+                    future.set_result(value)
+
+    def _remember(self, key: Tuple, value: float):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def shutdown(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
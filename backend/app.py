@@ -4,18 +4,26 @@ Provides REST API and WebSocket for real-time data
 """
 
 from contextlib import asynccontextmanager  # ← ADD THIS!
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
-from typing import List
+from typing import List, Optional
 from datetime import datetime
-import predictor_engine
+import logging
 
+from config.logging_config import setup_logging, shutdown_logging
 from aggregator import DataAggregator
+from model_retrainer import ModelRetrainer
+from serialization import FastJSONResponse
 from config.settings import UPDATE_INTERVAL, FRONTEND_URL
+from config.traffic_segments import SEGMENTS_BY_SLUG
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Global state
 aggregator = DataAggregator()
+retrainer = ModelRetrainer(aggregator.air_quality_model)
 active_connections: List[WebSocket] = []
 
 
@@ -26,15 +34,15 @@ async def data_loop():
     Background task: Fetch data periodically and broadcast to clients
     Runs continuously while server is up
     """
-    print(f"🔄 Starting data loop (updating every {UPDATE_INTERVAL}s)")
+    logger.info("🔄 Starting data loop (updating every %ss)", UPDATE_INTERVAL)
     
     while True:
         try:
             # Fetch all data
             data = await aggregator.fetch_all_data()
             
-            # Broadcast to all connected clients
-            await broadcast_data(data)
+            # Broadcast to all connected clients (the snapshot was encoded once when published)
+            await broadcast_data(aggregator.get_last_data_json())
             
             # Log for debugging
             weather_score = data['weather']['score']
@@ -43,28 +51,27 @@ async def data_loop():
             energy_score = data['energy']['score']
             intensity = data['energy']['carbon_intensity']
 
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] "
-                  f"Weather: {temp}°C (score: {weather_score}) | "
-                  f"Energy: {intensity} gCO2/kWh (score: {energy_score}) | "
-                  f"Clients: {len(active_connections)}")
+            logger.info("Weather: %s°C (score: %s) | Energy: %s gCO2/kWh (score: %s) | Clients: %d",
+                        temp, weather_score, intensity, energy_score, len(active_connections))
 
             
         except Exception as e:
-            print(f"❌ Error in data loop: {e}")
+            logger.error("❌ Error in data loop: %s", e)
         
         # Wait before next update
         await asyncio.sleep(UPDATE_INTERVAL)
 
 
-async def broadcast_data(data: dict):
-    """Send data to all connected WebSocket clients"""
+async def broadcast_data(payload: bytes):
+    """Send pre-encoded JSON to all connected WebSocket clients"""
     if not active_connections:
         return
     
+    text = payload.decode("utf-8")  # Text frames, as the frontend expects; decoded once for everyone
     disconnected = []
     for connection in active_connections:
         try:
-            await connection.send_json(data)
+            await connection.send_text(text)
         except:
             disconnected.append(connection)
     
@@ -86,16 +93,34 @@ async def lifespan(app: FastAPI):
     
     # Start background task
     task = asyncio.create_task(data_loop())
+
+    # Load the air quality model in the background so startup isn't held up
+    aggregator.air_quality_model.start_loading()
+    retrainer.start()
+    aggregator.flight_poller.start()
     
     yield  # Server is running
     
     # Shutdown (when server stops)
     task.cancel()
+    retrainer.shutdown()
+    aggregator.flight_poller.shutdown()
+    await aggregator.flights.close()
+    await aggregator.energy.close()
+    await aggregator.weather.close()
+    await aggregator.liveLocation.close()
+    await aggregator.stops.close()
+    await aggregator.traffic.close()
+    if aggregator.air_sensors is not None:
+        await aggregator.air_sensors.close()
+    aggregator.predictions.shutdown()
+    aggregator.air_quality_model.shutdown()
     print("👋 Server shutting down...")
+    shutdown_logging()
 
 
 # Create FastAPI app WITH lifespan
-app = FastAPI(title="Edinburgh Pulse API", lifespan=lifespan)
+app = FastAPI(title="Edinburgh Pulse API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Enable CORS for React frontend
 app.add_middleware(
@@ -130,13 +155,11 @@ async def get_current_data():
     Get current city data
     React frontend calls this to get initial data
     """
-    # If we have cached data, return it immediately
-    if aggregator.get_last_data():
-        return aggregator.get_last_data()
-    
-    # Otherwise fetch new data
-    data = await aggregator.fetch_all_data()
-    return data
+    # If we have cached data, return it immediately (already encoded)
+    if aggregator.get_last_data_json() is None:
+        # Otherwise fetch new data
+        await aggregator.fetch_all_data()
+    return FastJSONResponse(aggregator.get_last_data_json())
 
 
 @app.get("/api/health")
@@ -144,7 +167,8 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "sources": {name: breaker.status() for name, breaker in aggregator.breakers.items()}
     }
 
 @app.get("/api/weather")
@@ -157,60 +181,52 @@ async def get_energy_data():
     """Get current energy grid data"""
     return await aggregator.fetch_energy_data()
 
+@app.get("/api/energy/forecast")
+async def get_energy_forecast():
+    """Half-hourly GB carbon intensity forecast for the next 24h (from the cached block)"""
+    await aggregator.fetch_energy_data()  # Refreshes the block if it is due
+    return {"forecast": aggregator.energy.forecast_curve()}
+
 @app.get("/api/flights")
 async def get_flight_data():
-    """Get current flight data for Edinburgh Airport"""
-    return await aggregator.fetch_flight_data()
-
-@app.get("/api/traffic/princes-street")
-async def get_traffic_data():
-    """Get current traffic data for Princes Street"""
-    return await aggregator.fetch_traffic_princes_st_data()
-
-@app.get("/api/traffic/edinburgh-airport")
-async def get_traffic_data():
-    """Get current traffic data for Edinburgh Airport"""
-    return await aggregator.fetch_traffic_edi_airport_data()
-
-@app.get("/api/traffic/portobello-high-street")
-async def get_traffic_data():
-    """Get current traffic data for Portobello High Street"""
-    return await aggregator.fetch_traffic_portobello_high_st_data()
-
-@app.get("/api/traffic/nicolson-street")
-async def get_traffic_data():
-    """Get current traffic data for Nicolson Street"""
-    return await aggregator.fetch_traffic_nicolson_st_data()
-
-@app.get("/api/traffic/lady-road")
-async def get_traffic_data():
-    """Get current traffic data for Lady Road"""
-    return await aggregator.fetch_traffic_lady_road_data()
-
-@app.get("/api/traffic/gilmerton-road")
-async def get_traffic_data():
-    """Get current traffic data for Gilmerton Road"""
-    return await aggregator.fetch_traffic_gilmerton_road_data()
-
-@app.get("/api/traffic/leith-street")
-async def get_traffic_data():
-    """Get current traffic data for Leith Street"""
-    return await aggregator.fetch_traffic_leith_st_data()
+    """Get the latest flight data for Edinburgh Airport (polled in the background)"""
+    return aggregator.flight_poller.latest
+
+@app.get("/api/flights/{icao24}/track")
+async def get_flight_track(icao24: str):
+    """Recent positions of one aircraft"""
+    track = aggregator.flights.tracks.track(icao24.lower())
+    if not track:
+        raise HTTPException(status_code=404, detail=f"No track for aircraft: {icao24}")
+    return {"icao24": icao24.lower(), "track": track}
+
+@app.get("/api/traffic/{segment}")
+async def get_traffic_data(segment: str):
+    """Get current traffic data for one segment (slugs are in config/traffic_segments.json)"""
+    match = SEGMENTS_BY_SLUG.get(segment)
+    if match is None:
+        raise HTTPException(status_code=404, detail=f"Unknown traffic segment: {segment}")
+    return await aggregator.fetch_segment_traffic_data(match)
 
 @app.get("/api/live-transport")
 async def get_live_transport_data():
     """Get live locations of all public transport vehicles"""
-    return await aggregator.fetch_live_transport_data()
+    return FastJSONResponse(await aggregator.fetch_live_transport_data())
 
 @app.get("/api/stops")
 async def get_stops_data():
     """Get all bus/tram stop information"""
-    return await aggregator.fetch_stops_data()
+    return FastJSONResponse(await aggregator.fetch_stops_data())
 
 @app.get("/api/predictions")
 async def get_predictions():
     """Get all active predictions and the current accuracy stats."""
-    return predictor_engine.get_live_predictions_and_stats()
+    return aggregator.predictions.latest
+
+@app.get("/api/forecast/traffic")
+async def get_traffic_forecast():
+    """Get forecast traffic scores for each segment over the next 15-60 minutes."""
+    return aggregator.predictions.latest_forecast
 
 @app.get("/api/air")
 async def get_air_quality_data():
@@ -218,6 +234,70 @@ async def get_air_quality_data():
     return await aggregator.fetch_air_quality()
 
 
+@app.get("/api/air/sensors")
+async def get_air_sensor_data():
+    """Latest OpenAQ readings around Edinburgh, per pollutant"""
+    if aggregator.air_sensors is None:
+        return {"error": "AIR_QUALITY_API_KEY not configured"}
+    table = aggregator.air_sensors.table
+    return {
+        "pollutants": table.summary(),
+        "readings": {name: table.readings(name) for name in table.pollutants},
+    }
+
+
+@app.get("/api/air/grid")
+async def get_air_quality_grid(pollutant: str = "pm25"):
+    """Pollutant surface over Edinburgh, interpolated from the sensor readings"""
+    grid = aggregator.get_air_quality_grid(pollutant)
+    if grid is None:
+        return {"error": f"No {pollutant} readings available"}
+    return grid
+
+
+@app.get("/api/road-safety")
+async def get_road_safety(dataset: str = "speed_limit", road_class: Optional[str] = None,
+                          speed_limit: Optional[str] = None, section: Optional[str] = None,
+                          factor: Optional[str] = None, method: Optional[str] = None,
+                          severity: Optional[str] = None, year: Optional[str] = None,
+                          group_by: Optional[str] = None):
+    """
+    GB collision totals from RAS0301 (dataset=speed_limit) or RAS0701 (dataset=factors).
+    The tables carry their own subtotal rows ("All speeds", "All road types", "Any RSF");
+    columns left unfiltered are read from those, so totals match the published figures.
+    """
+    road_safety = aggregator.road_safety
+    if road_safety is None:
+        return {"error": "Road safety table not built"}
+    if group_by is not None and group_by not in road_safety.categories:
+        return {"error": f"Can't group by {group_by!r}", "columns": list(road_safety.categories)}
+    if severity is None and group_by != "severity":
+        severity = "All collisions"  # Severities overlap (Fatal is part of FSC), so never sum across them
+    try:
+        return road_safety.aggregate(group_by=group_by, dataset=dataset, road_class=road_class,
+                                     speed_limit=speed_limit, section=section, factor=factor,
+                                     method=method, severity=severity, year=year)
+    except KeyError as e:
+        return {"error": str(e.args[0])}
+
+
+@app.get("/api/road-safety/categories")
+async def get_road_safety_categories():
+    """Valid values for each /api/road-safety filter"""
+    if aggregator.road_safety is None:
+        return {"error": "Road safety table not built"}
+    return aggregator.road_safety.categories
+
+
+@app.get("/api/risk")
+async def get_road_risk():
+    """Per-segment road risk from the latest snapshot"""
+    data = aggregator.get_last_data()
+    if data is None or 'road_risk' not in data:
+        return {"error": "No risk scores yet"}
+    return data['road_risk']
+
+
 # ==================== WEBSOCKET (Real-time Updates) ====================
 
 @app.websocket("/ws")
@@ -228,12 +308,12 @@ async def websocket_endpoint(websocket: WebSocket):
     """
     await websocket.accept()
     active_connections.append(websocket)
-    print(f"✅ Client connected. Total connections: {len(active_connections)}")
+    logger.info("✅ Client connected. Total connections: %d", len(active_connections))
     
     try:
         # Send initial data immediately
-        if aggregator.get_last_data():
-            await websocket.send_json(aggregator.get_last_data())
+        if aggregator.get_last_data_json():
+            await websocket.send_text(aggregator.get_last_data_json().decode("utf-8"))
         
         # Keep connection alive
         while True:
@@ -245,7 +325,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 
     except WebSocketDisconnect:
         active_connections.remove(websocket)
-        print(f"❌ Client disconnected. Total connections: {len(active_connections)}")
+        logger.info("❌ Client disconnected. Total connections: %d", len(active_connections))
 
 
 # ==================== RUN SERVER ====================
@@ -0,0 +1,205 @@
+"""
+Offline backtest / replay harness for predictor_engine.
+Replays recorded snapshots through run_prediction_cycle under a virtual clock,
+so threshold changes can be evaluated against months of history in minutes.
+
+Record snapshots from the live server with SNAPSHOT_RECORD_PATH=snapshots.jsonl,
+then e.g.:
+    python backtest.py snapshots.jsonl
+    python backtest.py snapshots.jsonl --thresholds 1.5 2 2.5 --min-std-devs 0.5 1 2
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from statistics import mean, median
+from typing import Dict, List, Optional
+
+import predictor_engine
+
+# Snapshot keys with no bearing on the engine; they dominate the snapshot size.
+_UNRECORDED_KEYS = ("stops", "predictions")
+
+
+class SnapshotRecorder:
+    """Appends slimmed-down `combined_data` snapshots to a JSON-lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, combined_data: Dict):
+        snapshot = {}
+        for key, value in combined_data.items():
+            if key in _UNRECORDED_KEYS:
+                continue
+            if isinstance(value, dict):
+                # The raw payloads are just the unscored source data again
+                value = {k: v for k, v in value.items() if k != "raw"}
+            snapshot[key] = value
+        with open(self.path, "a") as f:
+            f.write(json.dumps(snapshot) + "\n")
+
+
+def load_snapshots(path: str) -> List[Dict]:
+    """Loads recorded snapshots, oldest first."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _snapshot_time(snapshot: Dict) -> datetime:
+    ts = datetime.fromisoformat(snapshot["timestamp"])
+    # The aggregator stamps local naive times; only the spacing matters here
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _find_incidents(snapshots: List[Dict], incident_threshold: float) -> Dict[str, List[list]]:
+    """Ground truth: runs of consecutive fresh readings below `incident_threshold`, per road."""
+    incidents: Dict[str, List[list]] = {}
+    open_incidents: Dict[str, list] = {}
+    for snapshot in snapshots:
+        now = _snapshot_time(snapshot)
+        for key, value in snapshot.items():
+            if "traffic" not in key or not isinstance(value, dict) or value.get("score") is None:
+                continue
+            if value.get("stale"):  # A reused reading says nothing new about the road
+                continue
+            if value["score"] < incident_threshold:
+                if key not in open_incidents:
+                    open_incidents[key] = [now, now]
+                    incidents.setdefault(key, []).append(open_incidents[key])
+                open_incidents[key][1] = now
+            else:
+                open_incidents.pop(key, None)
+    return incidents
+
+
+def replay(snapshots: List[Dict], params: Optional[Dict] = None, incident_threshold: float = 50.0) -> Dict:
+    """
+    Runs the engine over `snapshots` from a clean state and scores the run.
+
+    `params` overrides engine settings by name, e.g.
+    {"ANOMALY_THRESHOLD_STD_DEV": 2.5, "MIN_STD_DEV_TO_PREDICT": 1.0}.
+    """
+    params = params or {}
+    saved = {name: getattr(predictor_engine, name) for name in params}
+    virtual_now = [None]
+
+    predictor_engine.reset_state()
+    predictor_engine.set_clock(lambda: virtual_now[0])
+    for name, value in params.items():
+        setattr(predictor_engine, name, value)
+
+    # The engine's per-cycle logging would swamp a replay
+    engine_logger = predictor_engine.logger
+    saved_level = engine_logger.level
+    engine_logger.setLevel(logging.WARNING)
+
+    created = []  # (location_key, created_at)
+    try:
+        start = time.perf_counter()
+        for snapshot in snapshots:
+            virtual_now[0] = _snapshot_time(snapshot)
+            # What the live runner hands the engine: detector fields only, stale readings left out
+            for pred in predictor_engine.run_prediction_cycle(predictor_engine.project_snapshot(snapshot)):
+                # Ground truth below only covers traffic; other detectors don't count here
+                if pred["validation_data"]["detector"] != "traffic":
+                    continue
+                created.append((pred["validation_data"]["location_key"], virtual_now[0]))
+        elapsed = time.perf_counter() - start
+        # Accuracy for the traffic detector only, like the incidents below
+        stats = predictor_engine.get_live_predictions_and_stats()["stats"]["by_detector"].get(
+            "traffic", {"accuracy_percent": None, "correct_count": 0, "validated_count": 0})
+    finally:
+        engine_logger.setLevel(saved_level)
+        for name, value in saved.items():
+            setattr(predictor_engine, name, value)
+        predictor_engine.set_clock(None)
+        predictor_engine.reset_state()
+
+    # Match predictions to ground-truth incidents on the same road
+    incidents = _find_incidents(snapshots, incident_threshold)
+    latencies = []
+    false_alarms = 0
+    detected = set()
+    for location_key, created_at in created:
+        hit = next((i for i, (begin, end) in enumerate(incidents.get(location_key, []))
+                    if begin <= created_at <= end), None)
+        if hit is None:
+            false_alarms += 1
+        elif (location_key, hit) not in detected:
+            detected.add((location_key, hit))
+            latencies.append((created_at - incidents[location_key][hit][0]).total_seconds())
+
+    total_incidents = sum(len(runs) for runs in incidents.values())
+    return {
+        "params": params,
+        "cycles": len(snapshots),
+        "elapsed_s": round(elapsed, 3),
+        "cycles_per_sec": round(len(snapshots) / elapsed, 1) if elapsed > 0 else None,
+        "predictions_made": len(created),
+        "accuracy_percent": stats["accuracy_percent"],
+        "validated_count": stats["validated_count"],
+        "correct_count": stats["correct_count"],
+        "incidents": total_incidents,
+        "incidents_detected": len(detected),
+        "detection_rate_percent": round(100 * len(detected) / total_incidents, 2) if total_incidents else None,
+        "false_alarms": false_alarms,
+        "mean_latency_to_detect_s": round(mean(latencies), 1) if latencies else None,
+        "median_latency_to_detect_s": round(median(latencies), 1) if latencies else None,
+    }
+
+
+# Each sweep worker loads the snapshots once instead of receiving them per task
+_worker_snapshots: List[Dict] = []
+
+
+def _init_worker(path: str):
+    global _worker_snapshots
+    _worker_snapshots = load_snapshots(path)
+
+
+def _replay_in_worker(args) -> Dict:
+    params, incident_threshold = args
+    return replay(_worker_snapshots, params, incident_threshold)
+
+
+def sweep(path: str, grid: Dict[str, list], incident_threshold: float = 50.0,
+          workers: Optional[int] = None) -> List[Dict]:
+    """Replays every combination in `grid` across a process pool."""
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as pool:
+        return list(pool.map(_replay_in_worker, [(params, incident_threshold) for params in combos]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded snapshots through the prediction engine.")
+    parser.add_argument("snapshots", help="JSON-lines file written via SNAPSHOT_RECORD_PATH")
+    parser.add_argument("--thresholds", type=float, nargs="+",
+                        default=[predictor_engine.ANOMALY_THRESHOLD_STD_DEV],
+                        help="ANOMALY_THRESHOLD_STD_DEV values to try")
+    parser.add_argument("--min-std-devs", type=float, nargs="+",
+                        default=[predictor_engine.MIN_STD_DEV_TO_PREDICT],
+                        help="MIN_STD_DEV_TO_PREDICT values to try")
+    parser.add_argument("--incident-threshold", type=float, default=50.0,
+                        help="Scores below this count as a real incident")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    grid = {
+        "ANOMALY_THRESHOLD_STD_DEV": args.thresholds,
+        "MIN_STD_DEV_TO_PREDICT": args.min_std_devs,
+    }
+    print(f"🔁 Replaying {args.snapshots} over {len(args.thresholds) * len(args.min_std_devs)} parameter set(s)...")
+    results = sweep(args.snapshots, grid, args.incident_threshold, args.workers)
+    results.sort(key=lambda r: (r["accuracy_percent"] or 0, r["detection_rate_percent"] or 0), reverse=True)
+    for r in results:
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
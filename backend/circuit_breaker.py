@@ -0,0 +1,101 @@
+"""
+Per-upstream circuit breakers for the aggregator's fetchers.
+
+After CIRCUIT_FAILURE_THRESHOLD consecutive failures a source's breaker opens
+and calls fail immediately with CircuitOpenError (no request, no timeout) until
+its backoff has passed. Then one probe call is let through (half-open): success
+closes the breaker, failure re-opens it with the backoff doubled, up to
+CIRCUIT_MAX_BACKOFF.
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from config.settings import CIRCUIT_BASE_BACKOFF, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_MAX_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a source whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 base_backoff: float = CIRCUIT_BASE_BACKOFF, max_backoff: float = CIRCUIT_MAX_BACKOFF,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self.state = CLOSED
+        self.failures = 0          # Consecutive failures
+        self.backoff = base_backoff
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+        self.last_success: Optional[str] = None
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now (moves an open breaker to half-open once its backoff is up)."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self._clock() >= self.retry_at:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True  # One probe at a time
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("%s recovered; circuit closed", self.name)
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = self.base_backoff
+        self.last_success = datetime.now().isoformat()
+        self._probing = False
+
+    def record_failure(self, error: Exception):
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        if self.state == HALF_OPEN:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+        elif self.failures < self.failure_threshold:
+            return
+        self.state = OPEN
+        self.retry_at = self._clock() + self.backoff
+        self._probing = False
+        logger.warning("%s failing (%s); circuit open for %.0fs", self.name, self.last_error, self.backoff)
+
+    async def call(self, fn: Callable[..., Awaitable], *args, **kwargs):
+        """Awaits fn(*args, **kwargs) through the breaker; raises CircuitOpenError without calling it when open."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self.record_failure(e)
+            else:
+                self._probing = False  # Cancelled: neither a success nor a failure
+            raise
+        self.record_success()
+        return result
+
+    def status(self) -> Dict:
+        retry_in = max(0.0, self.retry_at - self._clock()) if self.state == OPEN else None
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_in": round(retry_in) if retry_in is not None else None,
+            "last_error": self.last_error,
+            "last_success": self.last_success,
+        }
@@ -0,0 +1,126 @@
+"""
+Logging setup for the backend.
+Records go onto a bounded in-memory queue and a background listener thread does
+the actual stdout writes, so logging never blocks the event loop. Chatty
+DEBUG messages are sampled per call site.
+"""
+
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.queues
+import queue
+import sys
+import threading
+
+from config.settings import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_EVERY
+
+_listener: logging.handlers.QueueListener | None = None
+_stream: logging.Handler | None = None
+# Worker processes log onto this queue; a second listener in the parent drains it
+_worker_queue: multiprocessing.queues.Queue | None = None
+_worker_listener: logging.handlers.QueueListener | None = None
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through the first DEBUG record from each call site, then one in `every`.
+    A string first argument is part of the key, so e.g. each road's debug line
+    is sampled on its own. INFO and above always pass.
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.INFO or self.every == 1:
+            return True
+        first_arg = record.args[0] if isinstance(record.args, tuple) and record.args else None
+        if not isinstance(first_arg, str):
+            first_arg = None  # Keep the key space bounded
+        key = (record.name, record.lineno, first_arg)
+        with self._lock:
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+        return seen % self.every == 0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records (and counts them) instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: str = LOG_LEVEL, sample_every: int = LOG_SAMPLE_EVERY):
+    """Routes all logging through the queue. Safe to call more than once."""
+    global _listener, _stream
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_every))
+
+    _stream = logging.StreamHandler(sys.stdout)
+    _stream.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s %(name)s: %(message)s", "%H:%M:%S"))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, _stream, respect_handler_level=True)
+    _listener.start()
+
+
+def worker_log_queue() -> multiprocessing.queues.Queue:
+    """
+    The queue to pass to setup_worker_logging in a process pool's initargs.
+    Started on first use; its listener writes to the same stream as the parent.
+    """
+    global _worker_queue, _worker_listener
+    setup_logging()
+    if _worker_queue is None:
+        _worker_queue = multiprocessing.Queue(maxsize=LOG_QUEUE_SIZE)
+        _worker_listener = logging.handlers.QueueListener(_worker_queue, _stream, respect_handler_level=True)
+        _worker_listener.start()
+    return _worker_queue
+
+
+def setup_worker_logging(log_queue: multiprocessing.queues.Queue, level: str = LOG_LEVEL,
+                         sample_every: int = LOG_SAMPLE_EVERY):
+    """
+    Process pool initializer: routes the worker's logging onto `log_queue`.
+    A forked worker inherits the parent's module state but not its listener
+    threads, so that state is reset here rather than reused.
+    """
+    global _listener, _stream, _worker_queue, _worker_listener
+    _listener = _stream = _worker_queue = _worker_listener = None
+
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_every))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+
+def shutdown_logging():
+    """Flushes whatever is still queued and stops the listener threads."""
+    global _listener, _worker_queue, _worker_listener
+    if _worker_listener is not None:
+        _worker_listener.stop()
+        _worker_queue.close()
+        _worker_queue = _worker_listener = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -16,3 +16,79 @@ EDINBURGH_AIRPORT_BBOX = [
     56.00,  # Max Latitude (North)
     -3.30   # Max Longitude (East)
 ]
+
+
+# Prediction engine execution: "inline" (on the event loop), "thread" or "process".
+# Thread and process modes hand the engine a private copy of the snapshot.
+PREDICTION_EXECUTION_MODE = "thread"
+
+# Logging
+LOG_LEVEL = "INFO"        # Set to "DEBUG" for the prediction engine's per-road output
+LOG_SAMPLE_EVERY = 10     # Only 1 in N DEBUG records per call site is written
+LOG_QUEUE_SIZE = 10000    # Records beyond this are dropped rather than blocking
+
+# Air quality model retraining, run in a separate process (None disables it).
+# Glob patterns are relative to the backend directory; drop new MIDAS/pollutant
+# exports in to have them picked up (runs with no new files are skipped). See
+# data_analysis/retrain.py.
+AIR_QUALITY_RETRAIN_INTERVAL = 24 * 60 * 60  # seconds
+AIR_QUALITY_RETRAIN_WEATHER = ["data_analysis/midas-open_uk-hourly-weather-*.csv"]
+AIR_QUALITY_RETRAIN_STATIONS = [19260]
+AIR_QUALITY_RETRAIN_POLLUTANT = ["data_analysis/pollutant-*.csv"]
+
+# Air quality surface (see air_quality_grid.py): [S, W, N, E] and cells (rows, cols)
+AIR_GRID_BBOX = [55.88, -3.35, 56.00, -3.05]
+AIR_GRID_SHAPE = (48, 60)
+AIR_GRID_IDW_POWER = 2
+
+# TomTom flow requests in flight at once (segments live in config/traffic_segments.json)
+TRAFFIC_MAX_CONCURRENCY = 5
+
+# Traffic ingestion: "points" polls flowSegmentData once per registered segment;
+# "tiles" fetches TomTom vector flow tiles over TRAFFIC_TILE_BBOX and reads every
+# segment (plus a city-wide summary) from them (see data_sources/traffic_tiles.py)
+TRAFFIC_INGESTION_MODE = "points"
+TRAFFIC_TILE_BBOX = [55.89, -3.40, 56.00, -3.05]  # [S, W, N, E], includes the airport
+TRAFFIC_TILE_ZOOM = 12  # 15 tiles per style over the bbox
+TRAFFIC_TILE_TTL = 60   # seconds; TomTom refreshes flow about once a minute
+
+# TomTom request budget for "points" ingestion (see traffic_budget.py): each segment
+# is polled every UPDATE_INTERVAL to TRAFFIC_MAX_POLL_INTERVAL seconds depending on
+# how much of the day's quota is left and how interesting the road is right now
+TRAFFIC_DAILY_QUOTA = 2500         # flowSegmentData requests per UTC day
+TRAFFIC_QUOTA_RESERVE = 0.05       # Share held back for on-demand /api/traffic/{segment} requests
+TRAFFIC_MAX_POLL_INTERVAL = 15 * 60
+# Between polls a segment reuses its last reading (marked stale) for up to this many
+# seconds, after which it is dropped until a fresh one arrives
+TRAFFIC_MAX_READING_AGE = 2 * TRAFFIC_MAX_POLL_INTERVAL
+
+# Circuit breakers per upstream (see circuit_breaker.py): open after this many
+# consecutive failures, then retry after a backoff that doubles up to the max
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_BASE_BACKOFF = 30    # seconds
+CIRCUIT_MAX_BACKOFF = 10 * 60
+
+# OpenSky flights, polled in the background (see flight_poller.py) within the
+# anonymous allowance of about 400 requests a day
+FLIGHT_REQUESTS_PER_DAY = 400
+FLIGHT_BURST = 5             # Requests that can be made back to back after a quiet spell
+FLIGHT_MIN_INTERVAL = 30     # seconds between polls, however many tokens are left
+FLIGHT_MAX_AGE = 15 * 60     # Older flight data is left out of the snapshot
+FLIGHT_TRACK_AIRCRAFT = 256  # Aircraft with a track; the least recently seen is evicted
+FLIGHT_TRACK_POINTS = 60     # Positions kept per aircraft
+
+# Carbon intensity: "block" fetches the 24h forecast and generation mix once per
+# half hour and serves current values from it; "live" asks the API every cycle
+ENERGY_FETCH_MODE = "block"
+
+# Open-Meteo hourly forecasts for every monitored location (see data_sources/weather.py)
+WEATHER_REFRESH_INTERVAL = 60 * 60  # seconds
+WEATHER_FORECAST_DAYS = 2
+
+# Parse the TfE vehicle/stop feeds record by record as they stream in, rather
+# than loading the whole response (see data_sources/json_stream.py)
+TFE_STREAMING_PARSE = True
+
+# JSON encoder for API responses and WebSocket broadcasts: "orjson" (falls back
+# to "json" if orjson isn't installed) or "json"
+JSON_SERIALIZER = "orjson"
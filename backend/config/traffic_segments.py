@@ -0,0 +1,45 @@
+"""
+Registry of monitored traffic segments, loaded from traffic_segments.json.
+Add a road by adding an entry there; the fetcher, snapshot, API route,
+prediction engine and risk index all pick it up.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+SEGMENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traffic_segments.json")
+
+
+@dataclass(frozen=True)
+class TrafficSegment:
+    key: str           # Snapshot key, e.g. "princes_street_traffic"
+    slug: str          # Route: /api/traffic/{slug}
+    name: str
+    lat: float
+    lon: float
+    road_class: str    # RAS0301 labels, used by road_risk.py
+    speed_limit: str
+
+
+def load_segments(path: str = SEGMENTS_PATH) -> List[TrafficSegment]:
+    with open(path) as f:
+        entries = json.load(f)["segments"]
+    segments = [TrafficSegment(**entry) for entry in entries]
+
+    for field in ("key", "slug"):
+        values = [getattr(s, field) for s in segments]
+        duplicates = {v for v in values if values.count(v) > 1}
+        if duplicates:
+            raise ValueError(f"Duplicate traffic segment {field}s in {path}: {sorted(duplicates)}")
+    # The prediction engine and backtests find traffic readings by key
+    bad_keys = [s.key for s in segments if "traffic" not in s.key]
+    if bad_keys:
+        raise ValueError(f"Traffic segment keys must contain 'traffic': {bad_keys}")
+    return segments
+
+
+SEGMENTS: List[TrafficSegment] = load_segments()
+SEGMENTS_BY_SLUG: Dict[str, TrafficSegment] = {s.slug: s for s in SEGMENTS}
+SEGMENT_ROAD_TYPES: Dict[str, Tuple[str, str]] = {s.key: (s.road_class, s.speed_limit) for s in SEGMENTS}
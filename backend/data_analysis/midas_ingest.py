@@ -0,0 +1,223 @@
+"""
+Ingestion for MIDAS-Open hourly weather CSVs.
+Reads only the columns the model uses, with explicit dtypes and the real
+`ob_time` timestamps. stream_midas_aggregates() reduces many files to
+daily/hourly means in chunks across a process pool; each file's partial
+sums/counts are cached as Parquet keyed by the file's hash, so repeat training
+runs skip CSV parsing entirely.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+# Bump when the parsing below changes, so stale caches are ignored
+CACHE_VERSION = 2
+
+WEATHER_COLUMNS = ["air_temperature", "dewpoint", "wetb_temp", "rltv_hum", "wind_speed", "wind_direction",
+                   "visibility", "msl_pressure", "stn_pres"]
+TIME_COLUMN = "ob_time"
+STATION_COLUMN = "src_id"
+# Month first, with day and hour not always zero-padded: "1/13/2023 0:00", "02/03/2023 08:00" (3 Feb)
+OB_TIME_FORMAT = "%m/%d/%Y %H:%M"
+# MIDAS files end with this row in place of a timestamp
+END_MARKER = "end data"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(source_hash: str, spec: dict, cache_dir: str) -> str:
+    spec = json.dumps({"version": CACHE_VERSION, **spec}, sort_keys=True)
+    spec_hash = hashlib.sha256(spec.encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, f"midas-{source_hash[:16]}-{spec_hash}.parquet")
+
+
+def read_midas_csv(path: str, columns=WEATHER_COLUMNS, **read_csv_kwargs):
+    """
+    Parses a MIDAS CSV keeping just `ob_time`, `src_id` and whichever of `columns` exist.
+    Extra keyword arguments go to pd.read_csv (e.g. chunksize).
+    """
+    header = [c.strip() for c in pd.read_csv(path, nrows=0).columns]
+    wanted = [c for c in columns if c in header]
+    keep = {TIME_COLUMN, STATION_COLUMN, *wanted}
+    dtypes = {c: "float64" for c in wanted}
+    dtypes[STATION_COLUMN] = "Int64"
+    dtypes[TIME_COLUMN] = "string"
+    return pd.read_csv(
+        path,
+        usecols=lambda c: c.strip() in keep,
+        dtype=dtypes,
+        na_values=["NA", ""],
+        keep_default_na=False,
+        **read_csv_kwargs,
+    )
+
+
+def clean_midas_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Strips column names and turns `ob_time` into a proper `timestamp` column.
+    Raises ValueError on any timestamp that doesn't parse, or if a station's rows
+    go back in time (the files are chronological, so that means a misread date).
+    """
+    frame.columns = frame.columns.str.strip()
+    ob_time = frame.pop(TIME_COLUMN).str.strip()
+    frame = frame[ob_time != END_MARKER].copy()
+    ob_time = ob_time[ob_time != END_MARKER]
+
+    frame["timestamp"] = pd.to_datetime(ob_time, format=OB_TIME_FORMAT, errors="coerce")
+    bad = ob_time[frame["timestamp"].isna()]
+    if len(bad):
+        raise ValueError(f"{len(bad)} ob_time values don't match {OB_TIME_FORMAT!r}, e.g. {bad.iloc[0]!r}")
+
+    backwards = frame.groupby(STATION_COLUMN)["timestamp"].diff() < pd.Timedelta(0)
+    if backwards.any():
+        row = frame.index[backwards.to_numpy()][0]
+        raise ValueError(f"ob_time goes backwards at row {row} ({frame.at[row, 'timestamp']}); "
+                         f"expected month-first dates")
+    return frame
+
+
+# ==================== MULTI-FILE STREAMING ====================
+
+# MIDAS src_id of stations to train on. 19260 is Edinburgh Gogarbank; add
+# other stations around the city here (or pass station_ids explicitly).
+EDINBURGH_STATION_IDS = (19260,)
+
+CHUNK_ROWS = 200_000
+
+
+def find_midas_files(patterns) -> list:
+    """Expands glob patterns (e.g. "midas/*/qc-version-1/*.csv") into a sorted file list."""
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    return sorted({path for pattern in patterns for path in glob.glob(pattern, recursive=True)})
+
+
+def _aggregate_chunks(path: str, station_ids: set, columns: list, freq: str, complete_rows_only: bool,
+                      chunksize: int):
+    totals = None
+    for chunk in read_midas_csv(path, columns, chunksize=chunksize):
+        chunk.columns = chunk.columns.str.strip()
+        chunk = chunk[chunk[STATION_COLUMN].isin(station_ids)]
+        if chunk.empty:
+            continue
+        chunk = clean_midas_frame(chunk)
+        present = [c for c in columns if c in chunk.columns]
+        if complete_rows_only:
+            # Only hours with every measurement count, as in the original resample path
+            chunk = chunk.dropna(subset=["timestamp"] + present)
+        chunk = chunk.reindex(columns=[STATION_COLUMN, "timestamp"] + columns)
+        chunk["timestamp"] = chunk["timestamp"].dt.floor(freq)
+
+        grouped = chunk.groupby([STATION_COLUMN, "timestamp"])[columns]
+        partial = pd.concat({"sum": grouped.sum(), "count": grouped.count()}, axis=1)
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+    return totals
+
+
+def _write_partials(totals: pd.DataFrame, cache_path: str):
+    # Parquet wants flat string column names: ("sum", "dewpoint") -> "sum:dewpoint"
+    flat = totals.set_axis([f"{kind}:{column}" for kind, column in totals.columns], axis=1)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    flat.to_parquet(tmp_path)
+    os.replace(tmp_path, cache_path)
+
+
+def _read_partials(cache_path: str) -> pd.DataFrame:
+    flat = pd.read_parquet(cache_path)
+    return flat.set_axis(pd.MultiIndex.from_tuples([tuple(c.split(":", 1)) for c in flat.columns]), axis=1)
+
+
+def aggregate_midas_file(path: str, station_ids=EDINBURGH_STATION_IDS, columns=WEATHER_COLUMNS,
+                         freq: str = "D", complete_rows_only: bool = True,
+                         chunksize: int = CHUNK_ROWS, cache_dir: str = CACHE_DIR,
+                         use_cache: bool = True) -> pd.DataFrame:
+    """
+    Streams one MIDAS CSV in chunks and returns per-(src_id, period) partial sums
+    and counts for each column. Only one chunk of raw rows is in memory at a time.
+    Rows from other stations are dropped as each chunk comes off the parser.
+
+    The result is cached under `cache_dir`, keyed by the file's SHA-256 and the
+    arguments, so an unchanged file is never parsed twice.
+    """
+    station_ids = sorted(set(station_ids))
+    columns = list(columns)
+    start = time.perf_counter()
+    cache_path = None
+    if use_cache:
+        spec = {"stations": station_ids, "columns": columns, "freq": freq, "complete_rows_only": complete_rows_only}
+        cache_path = _cache_path(file_sha256(path), spec, cache_dir)
+        if os.path.exists(cache_path):
+            totals = _read_partials(cache_path)
+            logger.info("⚡ Loaded cached %s in %.0f ms", os.path.basename(path), (time.perf_counter() - start) * 1000)
+            return totals
+
+    totals = _aggregate_chunks(path, set(station_ids), columns, freq, complete_rows_only, chunksize)
+    logger.info("📂 Parsed %s in %.0f ms", os.path.basename(path), (time.perf_counter() - start) * 1000)
+
+    if cache_path and totals is not None:
+        try:
+            _write_partials(totals, cache_path)
+        except ImportError as e:
+            # Parquet needs pyarrow (or fastparquet); training still works without the cache
+            logger.warning("⚠️ Not caching %s: %s", os.path.basename(path), e)
+    return totals
+
+
+def _aggregate_job(args) -> pd.DataFrame:
+    return aggregate_midas_file(*args)
+
+
+def stream_midas_aggregates(paths, station_ids=EDINBURGH_STATION_IDS, columns=WEATHER_COLUMNS,
+                            freq: str = "D", combine_stations: bool = True,
+                            complete_rows_only: bool = True, workers: int | None = None,
+                            use_cache: bool = True) -> pd.DataFrame:
+    """
+    Period means ("D" daily, "h" hourly) across many MIDAS files, one file per
+    worker process (workers=1: one after another in this process). Partial
+    sums/counts are merged as files finish, so neither the raw rows nor all
+    files' partials have to be held at once.
+
+    With `combine_stations`, stations are pooled into one city-wide series per
+    period; otherwise `src_id` is kept as a column.
+    """
+    columns = list(columns)
+    jobs = [(path, tuple(station_ids), columns, freq, complete_rows_only, CHUNK_ROWS, CACHE_DIR, use_cache)
+            for path in paths]
+    totals = None
+    # workers=1 runs in this process, e.g. when the caller is already a pool worker
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        partials = pool.map(_aggregate_job, jobs) if pool else map(_aggregate_job, jobs)
+        for path, partial in zip(paths, partials):
+            logger.info("  📄 %s: %d station-periods", os.path.basename(path), 0 if partial is None else len(partial))
+            if partial is None:
+                continue
+            if combine_stations:
+                partial = partial.groupby(level="timestamp").sum()
+            totals = partial if totals is None else totals.add(partial, fill_value=0)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    if totals is None:
+        return pd.DataFrame(columns=["timestamp"] + columns)
+    means = totals["sum"] / totals["count"].where(totals["count"] > 0)
+    return means.sort_index().reset_index()
@@ -0,0 +1,281 @@
+"""
+Hyperparameter search for the PM2.5 model.
+
+Every candidate in SEARCH_SPACE (RandomForest and XGBoost) is cross-validated
+in a process pool, with early stopping on tree count for both families. The
+best few of each family are refitted, timed for single-row inference, and
+written to the model registry (model_registry.py). The one with the lowest
+accuracy/latency objective on the holdout split is promoted if it also beats
+the model currently being served on that same holdout.
+
+    python model_search.py --weather 'midas/**/*.csv' --stations 19260 --search-workers 8
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import KFold, train_test_split
+from xgboost import XGBRegressor
+
+# model_registry and flat_forest live in the backend package one level up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from flat_forest import FlatForest, export_forest
+from model_registry import ModelRegistry
+from train_air_quality_model import add_data_args, load_training_set
+
+SEARCH_SPACE = {
+    "random_forest": {
+        "max_depth": [None, 8, 16],
+        "min_samples_leaf": [1, 3, 5],
+        "max_features": [1.0, 0.5],
+    },
+    "xgboost": {
+        "learning_rate": [0.03, 0.1],
+        "max_depth": [3, 6],
+        "subsample": [0.8, 1.0],
+        "min_child_weight": [1, 5],
+    },
+}
+
+CV_FOLDS = 5
+EARLY_STOPPING_FRACTION = 0.15  # Of each training fold, held back to decide when to stop adding trees
+
+# Forests grow RF_TREE_STEP trees at a time until validation MAE improves by less than RF_MIN_GAIN
+RF_TREE_STEP = 50
+RF_MAX_TREES = 500
+RF_MIN_GAIN = 0.005
+XGB_MAX_ROUNDS = 2000
+XGB_EARLY_STOPPING_ROUNDS = 50
+
+FINALISTS_PER_FAMILY = 2
+
+# MAE (µg/m³) we'd give up to save 1 ms of single-row inference latency
+LATENCY_PENALTY = 0.5
+
+RANDOM_STATE = 42
+
+
+def candidates(families=tuple(SEARCH_SPACE)) -> list:
+    result = []
+    for family in families:
+        space = SEARCH_SPACE[family]
+        for values in itertools.product(*space.values()):
+            result.append({"family": family, "params": dict(zip(space, values))})
+    return result
+
+
+def objective(mae: float, latency_ms: float) -> float:
+    """Lower is better."""
+    return mae + LATENCY_PENALTY * latency_ms
+
+
+def make_model(family: str, params: dict, n_estimators: int):
+    if family == "random_forest":
+        return RandomForestRegressor(n_estimators=n_estimators, random_state=RANDOM_STATE, n_jobs=1, **params)
+    return XGBRegressor(n_estimators=n_estimators, random_state=RANDOM_STATE, n_jobs=1, **params)
+
+
+def fit_with_early_stopping(family: str, params: dict, X_train, y_train, X_val, y_val):
+    """Fits on (X_train, y_train), adding trees while (X_val, y_val) keeps improving. Returns (model, n_estimators)."""
+    if family == "random_forest":
+        model = RandomForestRegressor(n_estimators=0, warm_start=True, random_state=RANDOM_STATE, n_jobs=1, **params)
+        best_mae, best_n = np.inf, RF_TREE_STEP
+        while model.n_estimators < RF_MAX_TREES:
+            model.n_estimators += RF_TREE_STEP
+            model.fit(X_train, y_train)
+            mae = mean_absolute_error(y_val, model.predict(X_val))
+            if mae < best_mae * (1 - RF_MIN_GAIN):
+                best_mae, best_n = mae, model.n_estimators
+            else:
+                break
+        return model, best_n
+
+    model = XGBRegressor(n_estimators=XGB_MAX_ROUNDS, early_stopping_rounds=XGB_EARLY_STOPPING_ROUNDS,
+                         eval_metric="mae", random_state=RANDOM_STATE, n_jobs=1, **params)
+    model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+    return model, int(model.best_iteration) + 1
+
+
+# ==================== CROSS-VALIDATION (worker processes) ====================
+
+_X = None
+_y = None
+
+
+def _init_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+
+
+def evaluate_candidate(candidate: dict) -> dict:
+    """K-fold CV of one candidate on the worker's training set."""
+    family, params = candidate["family"], candidate["params"]
+    maes, r2s, trees, fit_seconds = [], [], [], []
+    for fold_train, fold_test in KFold(CV_FOLDS, shuffle=True, random_state=RANDOM_STATE).split(_X):
+        X_fit, X_val, y_fit, y_val = train_test_split(_X[fold_train], _y[fold_train],
+                                                      test_size=EARLY_STOPPING_FRACTION, random_state=RANDOM_STATE)
+        start = time.perf_counter()
+        model, n_estimators = fit_with_early_stopping(family, params, X_fit, y_fit, X_val, y_val)
+        fit_seconds.append(time.perf_counter() - start)
+        y_pred = model.predict(_X[fold_test])
+        maes.append(mean_absolute_error(_y[fold_test], y_pred))
+        r2s.append(r2_score(_y[fold_test], y_pred))
+        trees.append(n_estimators)
+
+    return dict(candidate,
+                cv_mae=float(np.mean(maes)),
+                cv_mae_std=float(np.std(maes)),
+                cv_r2=float(np.mean(r2s)),
+                n_estimators=int(np.median(trees)),
+                fit_seconds=float(np.mean(fit_seconds)))
+
+
+# ==================== FINALISTS ====================
+
+def served_latency_ms(model, X: np.ndarray, repeats: int = 200) -> dict:
+    """Median single-row and 64-row predict time, using the form the server would load."""
+    tmp_dir = None
+    if isinstance(model, RandomForestRegressor):
+        tmp_dir = tempfile.mkdtemp()
+        model = FlatForest.load(export_forest(model, os.path.join(tmp_dir, "model.forest")))
+    try:
+        row, batch = X[:1], X[np.arange(64) % len(X)]
+        model.predict(row)  # Warm-up
+        timings = {}
+        for name, sample in (("single_row_ms", row), ("batch_64_ms", batch)):
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                model.predict(sample)
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[name] = float(np.median(samples))
+        return timings
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def pick_finalists(results: list, per_family: int = FINALISTS_PER_FAMILY) -> list:
+    finalists = []
+    for family in SEARCH_SPACE:
+        ranked = sorted((r for r in results if r["family"] == family), key=lambda r: r["cv_mae"])
+        finalists.extend(ranked[:per_family])
+    return finalists
+
+
+def current_objective(registry: ModelRegistry, feature_names: list, X_test, y_test):
+    """Objective of the promoted model on this run's holdout, or None if it can't be compared."""
+    version = registry.current()
+    if version is None:
+        return None, None
+    meta = registry.metadata(version)
+    if meta.get("feature_names") != feature_names or "latency" not in meta:
+        print(f"⚠️ Current model {version} uses different features; not comparing")
+        return version, None
+    import joblib
+    model = joblib.load(os.path.join(registry.path(version), "model.pkl"))
+    mae = mean_absolute_error(y_test, model.predict(X_test))
+    return version, objective(mae, meta["latency"]["single_row_ms"])
+
+
+def run_search(X, y, families=tuple(SEARCH_SPACE), workers=None, registry: ModelRegistry = None,
+               promote: bool = True, data_info: dict = None) -> dict:
+    registry = registry or ModelRegistry()
+    feature_names = list(X.columns)
+    X_train, X_test, y_train, y_test = train_test_split(X.to_numpy(np.float64), y.to_numpy(np.float64),
+                                                        test_size=0.2, random_state=RANDOM_STATE)
+
+    # 1. Cross-validate every candidate in parallel
+    pending = candidates(families)
+    print(f"\n🔍 Cross-validating {len(pending)} candidates ({CV_FOLDS} folds each)...")
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X_train, y_train)) as pool:
+        futures = [pool.submit(evaluate_candidate, c) for c in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"  {result['family']:<14} MAE {result['cv_mae']:.3f} ±{result['cv_mae_std']:.3f} "
+                  f"({result['n_estimators']} trees) {result['params']}")
+    print(f"⏱️ Search took {time.perf_counter() - start:.1f}s")
+
+    # 2. Refit the best of each family on the whole training split, then time them one at a time
+    print("\n🏁 Finalists:")
+    finalists = []
+    for result in pick_finalists(results):
+        model = make_model(result["family"], result["params"], result["n_estimators"])
+        fit_start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - fit_start
+        y_pred = model.predict(X_test)
+        latency = served_latency_ms(model, X_test)
+        holdout_mae = float(mean_absolute_error(y_test, y_pred))
+        record = dict(result,
+                      holdout_mae=holdout_mae,
+                      holdout_r2=float(r2_score(y_test, y_pred)),
+                      final_fit_seconds=fit_seconds,
+                      latency=latency,
+                      # The same holdout score promotion compares against the current model
+                      objective=objective(holdout_mae, latency["single_row_ms"]))
+        record["version"] = registry.register(model, dict(record, data=data_info or {}), feature_names)
+        finalists.append(record)
+        print(f"  {record['version']} {record['family']:<14} CV MAE {record['cv_mae']:.3f}, "
+              f"holdout MAE {record['holdout_mae']:.3f}, {latency['single_row_ms']:.3f} ms/row "
+              f"-> objective {record['objective']:.3f}")
+
+    best = min(finalists, key=lambda r: r["objective"])
+
+    # 3. Promote if it beats what's being served, judged on the same holdout
+    current_version, current_score = current_objective(registry, feature_names, X_test, y_test)
+    best_score = best["objective"]
+    promoted = promote and (current_score is None or best_score < current_score)
+    if promoted:
+        registry.promote(best["version"])
+        print(f"\n🚀 Promoted {best['version']} ({best['family']}), replacing {current_version or 'nothing'}")
+    else:
+        print(f"\n⏸️ Kept {current_version} (holdout objective {current_score:.3f} vs {best_score:.3f})"
+              if current_score is not None else f"\n⏸️ Not promoting {best['version']}")
+
+    run = {
+        "finished_at": datetime.now().isoformat(),
+        "data": data_info or {},
+        "best": best["version"],
+        "promoted": promoted,
+        "previous": current_version,
+        "candidates": sorted(results, key=lambda r: r["cv_mae"]),
+        "finalists": finalists,
+    }
+    registry.record_run(run)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validated model search with a versioned registry")
+    add_data_args(parser)
+    parser.add_argument("--families", nargs="+", choices=list(SEARCH_SPACE), default=list(SEARCH_SPACE))
+    parser.add_argument("--search-workers", type=int, default=None, help="CV worker processes (default: CPU count)")
+    parser.add_argument("--no-promote", action="store_true", help="Register finalists without promoting any")
+    args = parser.parse_args()
+    # The data loading reports through logging
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    X, y = load_training_set(args.weather, args.stations, args.pollutant, args.workers)
+    data_info = {"weather": args.weather, "stations": args.stations, "pollutant": args.pollutant, "rows": len(X)}
+    run = run_search(X, y, args.families, args.search_workers, promote=not args.no_promote, data_info=data_info)
+    print(json.dumps({k: run[k] for k in ("best", "promoted", "previous")}))
+
+
+if __name__ == "__main__":
+    main()
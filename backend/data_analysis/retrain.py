@@ -0,0 +1,153 @@
+"""
+Refits the promoted air quality model on the latest stored data.
+Run by the server's ModelRetrainer in a worker process, or by hand:
+
+    python retrain.py --weather 'midas/**/*.csv' --pollutant 'pollutant-*.csv'
+
+The candidate reuses the promoted version's family and hyperparameters (see
+model_search.py for the full search). It is registered, validated against the
+model being served (the bundled one if nothing is promoted) on the same holdout,
+and promoted only if it passes. If the matched files are byte-for-byte the data
+the latest registered version was trained on, nothing is retrained.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from flat_forest import FlatForest
+from model_registry import ModelRegistry
+from midas_ingest import file_sha256, find_midas_files
+from model_search import RANDOM_STATE, make_model, objective, served_latency_ms
+from train_air_quality_model import add_data_args, load_training_set
+
+logger = logging.getLogger(__name__)
+
+# What the server serves while nothing is promoted
+BUNDLED_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "air_quality_model.pkl")
+
+# Used when nothing has been promoted yet (same as train_air_quality_model.py)
+DEFAULT_CONFIG = {"family": "random_forest", "params": {}, "n_estimators": 200}
+
+# A candidate may be at most this much worse (relative MAE) than the serving model
+MAX_MAE_REGRESSION = 0.05
+
+
+def _validate(registry: ModelRegistry, version: str, model, X_test, y_test, baseline_mae, max_regression):
+    """Returns None if `version` is fit to serve, otherwise the reason it isn't."""
+    y_pred = model.predict(X_test)
+    if not np.all(np.isfinite(y_pred)):
+        return "non-finite predictions"
+    # The server loads the flat export for forests; it must agree with the fitted model
+    artifact = registry.artifact(version)
+    if os.path.isdir(artifact):
+        diff = np.max(np.abs(FlatForest.load(artifact).predict(X_test) - y_pred))
+        if diff > 1e-9:
+            return f"flat export differs from the fitted model by {diff:g}"
+    mae = mean_absolute_error(y_test, y_pred)
+    if baseline_mae is not None and mae > baseline_mae * (1 + max_regression):
+        return f"holdout MAE {mae:.3f} is worse than the serving model's {baseline_mae:.3f}"
+    return None
+
+
+def data_fingerprint(weather_patterns, stations, pollutant_patterns) -> dict:
+    """Content hashes of the files a run would train on, so unchanged data can be recognised."""
+    return {
+        "weather": sorted(file_sha256(path) for path in find_midas_files(weather_patterns)),
+        "pollutant": sorted(file_sha256(path) for path in find_midas_files(pollutant_patterns)),
+        "stations": sorted(stations),
+    }
+
+
+def _baseline_mae(registry: ModelRegistry, parent, parent_meta, feature_names, X_test, y_test):
+    """Holdout MAE of the model being served: the promoted version, or else the bundled one."""
+    import joblib
+    if parent:
+        if parent_meta.get("feature_names") != feature_names:
+            return None
+        baseline = joblib.load(os.path.join(registry.path(parent), "model.pkl"))
+    else:
+        if not os.path.exists(BUNDLED_MODEL_PATH):
+            return None
+        baseline = joblib.load(BUNDLED_MODEL_PATH)
+        if list(getattr(baseline, "feature_names_in_", [])) != feature_names:
+            return None
+    y_pred = baseline.predict(pd.DataFrame(X_test, columns=feature_names))
+    return float(mean_absolute_error(y_test, y_pred))
+
+
+def retrain(weather_patterns, stations, pollutant_patterns, registry_root=None, max_regression=MAX_MAE_REGRESSION,
+            workers=None) -> dict:
+    """Fits, registers and (if it validates) promotes a fresh model. Returns a small report."""
+    registry = ModelRegistry(registry_root) if registry_root else ModelRegistry()
+    parent = registry.current()
+
+    fingerprint = data_fingerprint(weather_patterns, stations, pollutant_patterns)
+    versions = registry.versions()
+    latest = versions[-1] if versions else None
+    if latest and registry.metadata(latest).get("data_fingerprint") == fingerprint:
+        logger.info("⏭️ No new data since %s; not retraining", latest)
+        return {"version": None, "promoted": False, "skipped": True, "rejection": f"no new data since {latest}",
+                "previous": parent, "holdout_mae": None, "baseline_mae": None, "rows": None}
+
+    X, y = load_training_set(weather_patterns, stations, pollutant_patterns, workers)
+    feature_names = list(X.columns)
+    X_train, X_test, y_train, y_test = train_test_split(X.to_numpy(np.float64), y.to_numpy(np.float64),
+                                                        test_size=0.2, random_state=RANDOM_STATE)
+
+    parent_meta = registry.metadata(parent) if parent else {}
+    config = parent_meta if "family" in parent_meta else DEFAULT_CONFIG
+    baseline_mae = _baseline_mae(registry, parent, parent_meta, feature_names, X_test, y_test)
+
+    model = make_model(config["family"], config["params"], config["n_estimators"])
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    latency = served_latency_ms(model, X_test)
+    holdout_mae = float(mean_absolute_error(y_test, y_pred))
+    record = {
+        "family": config["family"],
+        "params": config["params"],
+        "n_estimators": config["n_estimators"],
+        "holdout_mae": holdout_mae,
+        "holdout_r2": float(r2_score(y_test, y_pred)),
+        "latency": latency,
+        "objective": objective(holdout_mae, latency["single_row_ms"]),
+        "retrained_from": parent,
+        "data": {"weather": list(weather_patterns), "stations": list(stations),
+                 "pollutant": list(find_midas_files(pollutant_patterns)), "rows": len(X)},
+        "data_fingerprint": fingerprint,
+    }
+    version = registry.register(model, record, feature_names)
+
+    rejection = _validate(registry, version, model, X_test, y_test, baseline_mae, max_regression)
+    if rejection is None:
+        registry.promote(version)
+        logger.info("🚀 Promoted retrained %s (holdout MAE %.3f, previous %s)", version, holdout_mae,
+                    parent or "bundled model")
+    else:
+        logger.info("⏸️ Not promoting %s: %s", version, rejection)
+    return {"version": version, "promoted": rejection is None, "skipped": False, "rejection": rejection,
+            "previous": parent, "holdout_mae": holdout_mae, "baseline_mae": baseline_mae, "rows": len(X)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refit the promoted air quality model on the latest data")
+    add_data_args(parser)
+    parser.add_argument("--max-regression", type=float, default=MAX_MAE_REGRESSION)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    report = retrain(args.weather, args.stations, args.pollutant, max_regression=args.max_regression,
+                     workers=args.workers)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,11 @@
 Train an air-quality prediction model using historical weather + pollutant data.
 """
 
+import argparse
+import logging
+import os
+import sys
+
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
@@ -10,131 +15,160 @@ import joblib
 from xgboost import XGBRegressor
 from xgboost import plot_importance
 
-print("📂 Loading data...")
-
-# Load weather data with low_memory=False to handle mixed types
-weather = pd.read_csv("midas-open_uk-hourly-weather-2023.csv")
-weather.columns = weather.columns.str.strip()  # Clean column names
-
-print(f"Weather columns: {weather.columns.tolist()}")
-
-if "timestamp" not in weather.columns:
-    weather["timestamp"] = pd.date_range(start="2023-01-01", periods=len(weather), freq="h")
-
-weather["timestamp"] = pd.to_datetime(weather["timestamp"], errors="coerce")
-
-# Check which columns exist BEFORE resampling
-required_cols = ["air_temperature", "dewpoint", "wetb_temp", "rltv_hum", "wind_speed", "wind_direction", "visibility", "msl_pressre",
-                 "stn_pres"]
-available_cols = [col for col in required_cols if col in weather.columns]
-print(f"Available weather columns: {available_cols}")
-
-# Select only the columns you need (including timestamp)
-weather = weather[["timestamp"] + available_cols].copy()
-
-# Convert all weather columns to numeric (in case they're stored as strings)
-for col in available_cols:
-    weather[col] = pd.to_numeric(weather[col], errors='coerce')
-
-# Drop rows with NaN in required columns
-weather = weather.dropna()
-
-print(f"Weather data shape after cleaning: {weather.shape}")
-
-# Set timestamp as index for resampling
-weather = weather.set_index('timestamp')
-daily_weather = weather.resample('D').mean().reset_index()  # 'D' = daily frequency
-daily_weather = daily_weather.rename(columns={'timestamp': 'date'})
-daily_weather["date"] = pd.to_datetime(daily_weather["date"], format="%Y-%m-%d", errors="coerce")
-
-
-print(f"\nDaily weather shape: {daily_weather.shape}")
-print(daily_weather.head())
-
-# Load pollutant data
-pollutant = pd.read_csv("pollutant-2023.csv")
-pollutant.columns = pollutant.columns.str.strip()
-target_col = "PM2.5 particulate matter (Hourly measured)"
-pollutant["date"] = pd.to_datetime(pollutant["date"], format="%d/%m/%Y", errors="coerce")
-print(pollutant.head())
-
-# Find timestamp column
-time_cols = [c for c in pollutant.columns if "time" in c.lower() or "date" in c.lower()]
-print(f"Found time columns: {time_cols}")
-
-if len(time_cols) > 0:
-    pollutant["timestamp"] = pd.to_datetime(pollutant[time_cols[0]], errors="coerce")
-else:
-    raise ValueError("No timestamp column found in pollutant data!")
-
-if target_col not in pollutant.columns:
-    print(f"\n❌ Target column '{target_col}' not found!")
-    print("Available pollutant columns:", pollutant.columns.tolist())
-    raise ValueError(f"Column '{target_col}' not in dataset")
-
-# Convert target to numeric
-pollutant[target_col] = pd.to_numeric(pollutant[target_col], errors='coerce')
-
-# Keep only what you need
-print(f"\nPollutant missing values before dropna:")
-print(pollutant[["timestamp", target_col]].isna().sum())
-print(f"Pollutant data shape before cleaning: {pollutant.shape}")
-
-pollutant = pollutant[["timestamp", target_col]].dropna()
-print(f"Pollutant data shape after cleaning: {pollutant.shape}")
-
-# Aggregate pollutant to daily as well
-pollutant['date'] = pollutant['timestamp'].dt.date
-daily_pollutant = pollutant.groupby('date')[target_col].mean().reset_index()
-daily_pollutant['date'] = pd.to_datetime(daily_pollutant['date'])
-
-print(f"Daily pollutant shape: {daily_pollutant.shape}")
-
-# Merge daily data
-print("\n🔗 Merging datasets...")
-merged = pd.merge(
-    daily_weather,
-    daily_pollutant,
-    on="date",
-    how="inner"  # Use inner to keep only matching dates
-)
-
-print(f"Merged shape: {merged.shape}")
-print(f"Missing values:\n{merged.isna().sum()}")
-
-if len(merged) == 0:
-    raise ValueError("No data after merge! Check date ranges overlap.")
-
-# Split data
-X = merged[available_cols]
-y = merged[target_col]
+# flat_forest and feature_pipeline live in the backend package one level up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from feature_pipeline import compile_pipeline
+from flat_forest import FlatForest, export_forest
+from midas_ingest import EDINBURGH_STATION_IDS, find_midas_files, stream_midas_aggregates
 
-print(f"\n✅ Final dataset: {len(merged)} rows")
-print(f"X shape: {X.shape}, y shape: {y.shape}")
+logger = logging.getLogger(__name__)
 
-# Train model
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-print("\n🤖 Training model...")
-print("\n Random Forest")
-model = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=-1)
-model.fit(X_train, y_train)
+def add_data_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--weather", nargs="+", default=["midas-open_uk-hourly-weather-2023.csv"],
+                        help="MIDAS CSV files or glob patterns, e.g. 'midas/*/qc-version-1/*.csv'")
+    parser.add_argument("--stations", type=int, nargs="+", default=list(EDINBURGH_STATION_IDS),
+                        help="MIDAS src_id values to keep (pooled into one daily series)")
+    parser.add_argument("--pollutant", nargs="+", default=["pollutant-2023.csv"],
+                        help="Pollutant CSV files or glob patterns (concatenated)")
+    parser.add_argument("--workers", type=int, default=None, help="Ingestion worker processes (default: CPU count)")
 
-print("\nGradient Boosting")
-model1 = XGBRegressor(n_estimators=500, learning_rate=0.05, max_depth=6)
-model1.fit(X_train, y_train)
-
-# Evaluate
-y_pred = model.predict(X_test)
-print("\n📊 Model performance:")
-print(f"  R²:  {r2_score(y_test, y_pred):.3f}")
-print(f"  MAE: {mean_absolute_error(y_test, y_pred):.3f}")
-
-y_pred_XGB = model1.predict(X_test)
-print("\n📊 XGB Model performance:")
-print(f"  R²:  {r2_score(y_test, y_pred_XGB):.3f}")
-print(f"  MAE: {mean_absolute_error(y_test, y_pred_XGB):.3f}")
-
-# Save model
-joblib.dump(model, "air_quality_model.pkl")
-print("\n📦 Model saved as air_quality_model.pkl")
\ No newline at end of file
+
+def load_training_set(weather_patterns, stations=EDINBURGH_STATION_IDS, pollutant_patterns="pollutant-2023.csv",
+                      workers=None):
+    """Daily weather features (X) and mean PM2.5 (y) for every day present in both datasets."""
+    logger.info("📂 Loading data...")
+
+    # The MIDAS columns the feature pipeline needs (the same definition the server uses)
+    features = compile_pipeline("midas")
+    required_cols = features.input_fields
+
+    weather_files = find_midas_files(weather_patterns)
+    if not weather_files:
+        raise ValueError(f"No MIDAS files match {weather_patterns}")
+    logger.info("Weather files: %d, stations: %s", len(weather_files), list(stations))
+
+    # Streamed in chunks across a process pool, straight to daily means pooled over the stations
+    daily_weather = stream_midas_aggregates(weather_files, stations, required_cols, freq="D", workers=workers)
+
+    # Columns missing from every file come back all-NaN
+    missing_cols = [col for col in required_cols if not daily_weather[col].notna().any()]
+    if missing_cols:
+        raise ValueError(f"Weather data has no values for {missing_cols}")
+
+    daily_weather = daily_weather[["timestamp"] + required_cols].dropna(how="all", subset=required_cols)
+    daily_weather = daily_weather.rename(columns={'timestamp': 'date'})
+    daily_weather["date"] = pd.to_datetime(daily_weather["date"], format="%Y-%m-%d", errors="coerce")
+
+
+    logger.info("Daily weather shape: %s\n%s", daily_weather.shape, daily_weather.head())
+
+    # Load pollutant data
+    pollutant_files = find_midas_files(pollutant_patterns)
+    if not pollutant_files:
+        raise ValueError(f"No pollutant files match {pollutant_patterns}")
+    pollutant = pd.concat([pd.read_csv(path) for path in pollutant_files], ignore_index=True)
+    pollutant.columns = pollutant.columns.str.strip()
+    target_col = "PM2.5 particulate matter (Hourly measured)"
+    pollutant["date"] = pd.to_datetime(pollutant["date"], format="%d/%m/%Y", errors="coerce")
+    logger.info("%s", pollutant.head())
+
+    # Find timestamp column
+    time_cols = [c for c in pollutant.columns if "time" in c.lower() or "date" in c.lower()]
+    logger.info("Found time columns: %s", time_cols)
+
+    if len(time_cols) > 0:
+        pollutant["timestamp"] = pd.to_datetime(pollutant[time_cols[0]], errors="coerce")
+    else:
+        raise ValueError("No timestamp column found in pollutant data!")
+
+    if target_col not in pollutant.columns:
+        logger.error("❌ Target column '%s' not found! Available pollutant columns: %s",
+                     target_col, pollutant.columns.tolist())
+        raise ValueError(f"Column '{target_col}' not in dataset")
+
+    # Convert target to numeric
+    pollutant[target_col] = pd.to_numeric(pollutant[target_col], errors='coerce')
+
+    # Keep only what you need
+    logger.info("Pollutant missing values before dropna:\n%s", pollutant[["timestamp", target_col]].isna().sum())
+    logger.info("Pollutant data shape before cleaning: %s", pollutant.shape)
+
+    pollutant = pollutant[["timestamp", target_col]].dropna()
+    logger.info("Pollutant data shape after cleaning: %s", pollutant.shape)
+
+    # Aggregate pollutant to daily as well
+    pollutant['date'] = pollutant['timestamp'].dt.date
+    daily_pollutant = pollutant.groupby('date')[target_col].mean().reset_index()
+    daily_pollutant['date'] = pd.to_datetime(daily_pollutant['date'])
+
+    logger.info("Daily pollutant shape: %s", daily_pollutant.shape)
+
+    # Merge daily data
+    logger.info("🔗 Merging datasets...")
+    merged = pd.merge(
+        daily_weather,
+        daily_pollutant,
+        on="date",
+        how="inner"  # Use inner to keep only matching dates
+    )
+
+    logger.info("Merged shape: %s", merged.shape)
+    logger.info("Missing values:\n%s", merged.isna().sum())
+
+    if len(merged) == 0:
+        raise ValueError("No data after merge! Check date ranges overlap.")
+
+    # Split data
+    X = features.transform_frame(merged)
+    y = merged[target_col]
+
+    logger.info("✅ Final dataset: %d rows", len(merged))
+    logger.info("X shape: %s, y shape: %s", X.shape, y.shape)
+    return X, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the PM2.5 model from MIDAS weather and pollutant data")
+    add_data_args(parser)
+    args = parser.parse_args()
+    # The data loading reports through logging
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    X, y = load_training_set(args.weather, args.stations, args.pollutant, args.workers)
+    available_cols = X.columns.tolist()
+
+    # Train model
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    print("\n🤖 Training model...")
+    print("\n Random Forest")
+    model = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=-1)
+    model.fit(X_train, y_train)
+
+    print("\nGradient Boosting")
+    model1 = XGBRegressor(n_estimators=500, learning_rate=0.05, max_depth=6)
+    model1.fit(X_train, y_train)
+
+    # Evaluate
+    y_pred = model.predict(X_test)
+    print("\n📊 Model performance:")
+    print(f"  R²:  {r2_score(y_test, y_pred):.3f}")
+    print(f"  MAE: {mean_absolute_error(y_test, y_pred):.3f}")
+
+    y_pred_XGB = model1.predict(X_test)
+    print("\n📊 XGB Model performance:")
+    print(f"  R²:  {r2_score(y_test, y_pred_XGB):.3f}")
+    print(f"  MAE: {mean_absolute_error(y_test, y_pred_XGB):.3f}")
+
+    # Save model
+    joblib.dump(model, "air_quality_model.pkl")
+    print("\n📦 Model saved as air_quality_model.pkl")
+
+    # Flat-array copy for the server: memory-mapped at startup, vectorized predict
+    export_forest(model, "air_quality_model.forest", feature_names=available_cols)
+    flat_max_diff = abs(FlatForest.load("air_quality_model.forest").predict(X_test.to_numpy()) - y_pred).max()
+    print(f"📦 Flat export saved as air_quality_model.forest (max |diff| vs sklearn: {flat_max_diff:g})")
+
+
+if __name__ == "__main__":
+    main()
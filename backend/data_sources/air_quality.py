@@ -1,65 +1,225 @@
 '''
-Module for fetching air quality data from an external API.
+Module for fetching air quality data from the OpenAQ v3 API.
+
+Location/sensor metadata changes rarely, so it is cached for METADATA_TTL and
+only the latest readings are polled: one request per location (not per sensor),
+a few at a time, over one shared session. Readings land in a PollutantTable,
+which keeps one set of parallel NumPy arrays per pollutant.
 '''
 from dotenv import load_dotenv
 import os
 import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
 import aiohttp
+import numpy as np
 
 
 load_dotenv()
 API_KEY = os.getenv("AIR_QUALITY_API_KEY")
 
-class AirQualityFetcher:
+METADATA_TTL = 6 * 60 * 60   # Locations and their sensors
+LATEST_TTL = 5 * 60          # OpenAQ readings are mostly hourly; no point asking every cycle
+MAX_CONCURRENT_REQUESTS = 4
+SEARCH_RADIUS_M = 15000      # 15 km around the city centre (the API's maximum is 25 km)
+
+
+class PollutantTable:
+    """Latest reading per sensor, stored column-wise per pollutant (e.g. "pm25", "no2")."""
+
     def __init__(self):
-        self.base_url = "https://api.openaq.org/v3/locations"  # or whatever your URL is
-        self.coordinates = "55.9533,-3.1883"  # Edinburgh coordinates
+        self.pollutants: Dict[str, Dict[str, np.ndarray]] = {}
+        self.units: Dict[str, str] = {}
+        self.location_names: Dict[int, str] = {}
+        self._where: Dict[int, Tuple[str, int]] = {}  # sensor id -> (pollutant, row)
+
+    def rebuild(self, locations: List[Dict]):
+        """Lays out rows for every sensor in `locations`, keeping readings for sensors we already had."""
+        rows: Dict[str, List[Tuple]] = {}
+        self.location_names = {}
+        for location in locations:
+            coords = location.get("coordinates") or {}
+            self.location_names[location["id"]] = location.get("name")
+            for sensor in location.get("sensors", []):
+                parameter = sensor.get("parameter") or {}
+                name = parameter.get("name")
+                if not name:
+                    continue
+                self.units[name] = parameter.get("units")
+                value, updated = self.get(sensor["id"])
+                rows.setdefault(name, []).append((sensor["id"], location["id"], coords.get("latitude", np.nan),
+                                                  coords.get("longitude", np.nan), value, updated))
+
+        self.pollutants, self._where = {}, {}
+        for name, entries in rows.items():
+            sensor_ids, location_ids, lats, lons, values, updated = zip(*entries)
+            self.pollutants[name] = {
+                "sensor_id": np.array(sensor_ids, dtype=np.int64),
+                "location_id": np.array(location_ids, dtype=np.int64),
+                "lat": np.array(lats, dtype=np.float64),
+                "lon": np.array(lons, dtype=np.float64),
+                "value": np.array(values, dtype=np.float64),
+                "updated": np.array(updated, dtype=np.float64),  # Unix time of the reading
+            }
+            for row, sensor_id in enumerate(sensor_ids):
+                self._where[sensor_id] = (name, row)
+
+    def get(self, sensor_id: int) -> Tuple[float, float]:
+        where = self._where.get(sensor_id)
+        if where is None:
+            return np.nan, np.nan
+        columns = self.pollutants[where[0]]
+        return columns["value"][where[1]], columns["updated"][where[1]]
+
+    def update(self, sensor_id: int, value: float, updated: float) -> bool:
+        where = self._where.get(sensor_id)
+        if where is None:
+            return False
+        columns = self.pollutants[where[0]]
+        columns["value"][where[1]] = value
+        columns["updated"][where[1]] = updated
+        return True
+
+    def sensor_count(self) -> int:
+        return len(self._where)
+
+    def summary(self, max_age: Optional[float] = None) -> Dict:
+        """Per pollutant: unit, how many sensors have a reading, and their mean/min/max."""
+        now = time.time()
+        result = {}
+        for name, columns in self.pollutants.items():
+            fresh = ~np.isnan(columns["value"])
+            if max_age is not None:
+                fresh &= (now - columns["updated"]) <= max_age
+            values = columns["value"][fresh]
+            result[name] = {
+                "unit": self.units.get(name),
+                "sensors": int(len(columns["value"])),
+                "reporting": int(fresh.sum()),
+                "mean": round(float(values.mean()), 2) if len(values) else None,
+                "min": round(float(values.min()), 2) if len(values) else None,
+                "max": round(float(values.max()), 2) if len(values) else None,
+            }
+        return result
+
+    def readings(self, pollutant: str) -> List[Dict]:
+        columns = self.pollutants.get(pollutant)
+        if columns is None:
+            return []
+        return [
+            {
+                "sensor_id": int(columns["sensor_id"][i]),
+                "location": self.location_names.get(int(columns["location_id"][i])),
+                "lat": float(columns["lat"][i]),
+                "lon": float(columns["lon"][i]),
+                "value": float(columns["value"][i]),
+                "updated": datetime.fromtimestamp(columns["updated"][i], timezone.utc).isoformat(),
+            }
+            for i in np.flatnonzero(~np.isnan(columns["value"]))
+        ]
 
 
-    async def fetch_air_quality(self):  # Add 'async' here
-        """Fetch current air quality data from OpenAQ API"""
-        params = {
+class AirQualityFetcher:
+    def __init__(self, coordinates: str = "55.9533,-3.1883"):  # Edinburgh coordinates
+        self.base_url = "https://api.openaq.org/v3"
+        self.coordinates = coordinates
+        self.table = PollutantTable()
+        self.locations: List[Dict] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self._metadata_fetched_at = 0.0
+        self._latest_fetched_at = 0.0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # One session (and connection pool) for the life of the fetcher
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"x-api-key": API_KEY or ""},
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+        return self._session
+
+    async def _get(self, path: str, params: Optional[Dict] = None) -> Dict:
+        async with self._semaphore:
+            async with self._get_session().get(f"{self.base_url}{path}", params=params) as response:
+                response.raise_for_status()
+                return await response.json()
+
+    async def refresh_metadata(self, force: bool = False):
+        """Locations within SEARCH_RADIUS_M and their sensors; re-fetched once METADATA_TTL has passed."""
+        if not force and time.monotonic() - self._metadata_fetched_at < METADATA_TTL and self.locations:
+            return
+        data = await self._get("/locations", {
             "coordinates": self.coordinates,
-            "radius": 15000  # 15 km radius
-            #"parameters[]": ["pm25", "pm10", "no2", "o3", "so2", "co"],
-            #"limit": 10
+            "radius": SEARCH_RADIUS_M,
+            "limit": 1000,
+        })
+        self.locations = data.get("results", [])
+        self.table.rebuild(self.locations)
+        self._metadata_fetched_at = time.monotonic()
+
+    async def _fetch_location_latest(self, location_id: int) -> int:
+        data = await self._get(f"/locations/{location_id}/latest")
+        updated = 0
+        for reading in data.get("results", []):
+            value = reading.get("value")
+            when = (reading.get("datetime") or {}).get("utc")
+            if value is None or not when:
+                continue
+            timestamp = datetime.fromisoformat(when.replace("Z", "+00:00")).timestamp()
+            updated += self.table.update(reading.get("sensorsId"), float(value), timestamp)
+        return updated
+
+    async def fetch_latest(self, force: bool = False) -> PollutantTable:
+        """Refreshes the table's latest readings (at most once per LATEST_TTL unless forced)."""
+        await self.refresh_metadata()
+        if not force and time.monotonic() - self._latest_fetched_at < LATEST_TTL:
+            return self.table
+        results = await asyncio.gather(
+            *(self._fetch_location_latest(location["id"]) for location in self.locations),
+            return_exceptions=True,
+        )
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures and len(failures) == len(results):
+            raise failures[0]
+        self._latest_fetched_at = time.monotonic()
+        return self.table
+
+    async def fetch_air_quality(self) -> Dict:
+        """Fetch current air quality readings around Edinburgh from the OpenAQ API"""
+        if not API_KEY:
+            raise ValueError("AIR_QUALITY_API_KEY not found in environment variables.")
+        table = await self.fetch_latest()
+        return {
+            "locations": len(self.locations),
+            "sensors": table.sensor_count(),
+            "pollutants": table.summary(),
         }
-        headers = {"x-api-key": API_KEY}
-
-        # Use aiohttp instead of requests
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.base_url, params=params, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()  # Note: await here
-                    results = []
-
-                    for air_quality in data.get("results", []):
-                        results.append({
-                            "id": air_quality.get("id"),
-                            "name": air_quality.get("name"),
-                            "locality": air_quality.get("locality"),
-                            "parameters": air_quality.get("parameters", [])
-                        })
-                    return results
-                else:
-                    text = await response.text()  # Note: await here too
-                    print(f"Error: {response.status} - {text}")
-                    return []
-
-async def main():  # Removed async
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def main():
     print("🌍 Edinburgh Air Quality Data Test")
 
     fetcher = AirQualityFetcher()
     print("🔄 Fetching air quality data...")
 
-    air_quality_list = await fetcher.fetch_air_quality()
-
-    print("\n✅ Success!\n")
-    print("Data sample (first result):\n")
-
-    print(air_quality_list)
+    try:
+        summary = await fetcher.fetch_air_quality()
+        print("\n✅ Success!\n")
+        print(summary)
+        print("\nPM2.5 readings:\n")
+        print(fetcher.table.readings("pm25"))
+    finally:
+        await fetcher.close()
 
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
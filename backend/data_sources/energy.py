@@ -6,51 +6,164 @@ This data serves as a proxy for Edinburgh's energy metabolism.
 API Docs: https://carbon-intensity.github.io/api-definitions/
 """
 
+import asyncio
+import logging
+import time
 import httpx
-from datetime import datetime
-from typing import Dict, List, Any
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+
+from config.settings import ENERGY_FETCH_MODE
+
+logger = logging.getLogger(__name__)
+
+HALF_HOUR = 30 * 60
+PUBLISH_DELAY = 60    # seconds after a half-hour boundary before the next block is requested
+RETRY_INTERVAL = 5 * 60  # After a failed refresh, while the cached block still covers now
 
 class EnergyFetcher:
-    """Fetches electricity carbon intensity and generation mix for GB."""
+    """Fetches electricity carbon intensity and generation mix for GB.
 
-    def __init__(self):
+    In "block" mode (ENERGY_FETCH_MODE) the 24h forward forecast and the current
+    generation mix are fetched together once per half hour; "current" values are
+    read from the cached block between refreshes (see intensity_at). "live" mode asks
+    for /intensity and /generation on every call.
+    """
+
+    def __init__(self, mode: str = ENERGY_FETCH_MODE):
         self.base_url = "https://api.carbonintensity.org.uk"
+        self.mode = mode
+        self._client: Optional[httpx.AsyncClient] = None
+        self._block: Optional[Dict[str, Any]] = None
+        self._next_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=10)
+        return self._client
+
+    async def _get(self, path: str):
+        response = await self._get_client().get(f"{self.base_url}{path}")
+        response.raise_for_status()  # Raise an exception for bad responses
+        return response.json()['data']
 
     async def fetch_intensity(self) -> Dict[str, Any]:
         """Fetches the current carbon intensity."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}/intensity", timeout=10)
-            response.raise_for_status()  # Raise an exception for bad responses
-            # The API returns an array, we want the first (and only) element
-            return response.json()['data'][0]
+        # The API returns an array, we want the first (and only) element
+        return (await self._get("/intensity"))[0]
 
     async def fetch_generation_mix(self) -> List[Dict[str, Any]]:
         """Fetches the current electricity generation mix."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}/generation", timeout=10)
-            response.raise_for_status()
-            return response.json()['data']['generationmix']
+        return (await self._get("/generation"))['generationmix']
+
+    async def fetch_forecast(self, start: datetime) -> List[Dict[str, Any]]:
+        """Half-hourly intensity periods for the 24h from `start` (UTC)."""
+        return await self._get(f"/intensity/{start.strftime('%Y-%m-%dT%H:%MZ')}/fw24h")
+
+    # ==================== FORECAST BLOCK ====================
+
+    async def refresh_block(self):
+        """Fetches the forward forecast and the current mix in one concurrent burst."""
+        now = time.time()
+        period_start = datetime.fromtimestamp(now - now % HALF_HOUR, timezone.utc)
+        periods, generation_mix = await asyncio.gather(self.fetch_forecast(period_start), self.fetch_generation_mix())
+        if not periods:
+            raise ValueError("Carbon intensity forecast came back empty")
+
+        def parse(stamp: str) -> float:
+            return datetime.strptime(stamp, "%Y-%m-%dT%H:%MZ").replace(tzinfo=timezone.utc).timestamp()
+
+        self._block = {
+            'fetched_at': now,
+            'start': np.array([parse(p['from']) for p in periods]),
+            'end': np.array([parse(p['to']) for p in periods]),
+            'forecast': np.array([p['intensity']['forecast'] for p in periods], dtype=np.float64),
+            'actual': np.array([p['intensity']['actual'] for p in periods], dtype=np.float64),  # None -> nan
+            'index': [p['intensity']['index'] for p in periods],
+            'generation_mix': generation_mix,
+        }
+        # The next half-hour's figures are published just after the boundary
+        self._next_refresh = now - now % HALF_HOUR + HALF_HOUR + PUBLISH_DELAY
+
+    def _covers(self, now: float) -> bool:
+        # The API may start the block at the next period; the first one is close enough until then
+        return self._block is not None and self._block['start'][0] - HALF_HOUR <= now < self._block['end'][-1]
+
+    async def _current_block(self) -> Dict[str, Any]:
+        async with self._refresh_lock:  # One refresh even if the route and the cycle ask at once
+            now = time.time()
+            if now >= self._next_refresh or not self._covers(now):
+                try:
+                    await self.refresh_block()
+                except Exception as e:
+                    if not self._covers(now):
+                        raise
+                    logger.warning("Energy forecast refresh failed, serving the cached block: %s", e)
+                    self._next_refresh = now + RETRY_INTERVAL
+            return self._block
+
+    def intensity_at(self, when: float) -> Dict[str, Any]:
+        """Carbon intensity at `when` from the cached block. `carbon_intensity` is the
+        published actual for that half hour, or else its forecast, held for the whole
+        period like the actuals (what the spike detector watches). `intensity_forecast`
+        is the forecast interpolated between half-hour midpoints, for display."""
+        block = self._block
+        period = int(np.clip(np.searchsorted(block['start'], when, side='right') - 1, 0, len(block['start']) - 1))
+        midpoints = (block['start'] + block['end']) / 2
+        forecast = float(np.interp(when, midpoints, block['forecast']))
+        actual = block['actual'][period]
+        return {
+            'carbon_intensity': round(float(actual if not np.isnan(actual) else block['forecast'][period])),
+            'intensity_forecast': round(forecast),
+            'intensity_index': block['index'][period],
+        }
+
+    def forecast_curve(self) -> List[Dict[str, Any]]:
+        """The cached 24h forecast, one entry per half hour (no requests)."""
+        if self._block is None:
+            return []
+        block = self._block
+        return [
+            {'from': datetime.fromtimestamp(start, timezone.utc).isoformat(), 'forecast': forecast, 'index': index}
+            for start, forecast, index in zip(block['start'].tolist(), block['forecast'].tolist(), block['index'])
+        ]
 
     async def fetch(self) -> Dict[str, Any]:
         """
         Fetches both intensity and generation data and combines them.
         """
-        intensity_data = await self.fetch_intensity()
-        generation_mix = await self.fetch_generation_mix()
+        if self.mode == "block":
+            block = await self._current_block()
+            intensity = self.intensity_at(time.time())
+            generation_mix = block['generation_mix']
+        else:
+            intensity_data, generation_mix = await asyncio.gather(self.fetch_intensity(), self.fetch_generation_mix())
+            actual = intensity_data['intensity']['actual']
+            intensity = {
+                # Same series as block mode: the forecast stands in until the actual is published
+                'carbon_intensity': actual if actual is not None else intensity_data['intensity']['forecast'],
+                'intensity_forecast': intensity_data['intensity']['forecast'],
+                'intensity_index': intensity_data['intensity']['index'],  # e.g., "low", "moderate"
+            }
 
         # Find the dominant fuel source
         dominant_fuel = max(generation_mix, key=lambda x: x['perc'])
 
         return {
             'timestamp': datetime.now().isoformat(),
-            'carbon_intensity': intensity_data['intensity']['actual'],
-            'intensity_forecast': intensity_data['intensity']['forecast'],
-            'intensity_index': intensity_data['intensity']['index'], # e.g., "low", "moderate"
+            **intensity,
             'generation_mix': generation_mix,
             'dominant_fuel': dominant_fuel['fuel'],
             'dominant_fuel_percentage': dominant_fuel['perc']
         }
 
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
     def calculate_score(self, energy_data: Dict[str, Any]) -> float:
         """
         Converts carbon intensity to a 0-100 score.
@@ -3,14 +3,131 @@
 """
 Fetches live flight data for Edinburgh Airport using the OpenSky Network API.
 API Docs: https://openskynetwork.github.io/opensky-api/rest.html
+
+The `states` rows are decoded column-wise with NumPy, and every aircraft seen
+gets a short track (a fixed-size ring buffer per icao24) so landings and
+takeoffs can be spotted from on_ground changes.
 """
 
 import httpx
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+import numpy as np
 
 # Import the bounding box from your settings
-from config.settings import EDINBURGH_AIRPORT_BBOX
+from config.settings import EDINBURGH_AIRPORT_BBOX, FLIGHT_TRACK_AIRCRAFT, FLIGHT_TRACK_POINTS
+
+# State vector indices (https://openskynetwork.github.io/opensky-api/rest.html#response)
+ICAO24, CALLSIGN, LAST_CONTACT, LONGITUDE, LATITUDE, BARO_ALTITUDE, ON_GROUND, TRUE_TRACK, VERTICAL_RATE = \
+    0, 1, 4, 5, 6, 7, 8, 10, 11
+
+CLIMB_RATE = 0.5  # m/s; slower vertical movement counts as en route
+TRACK_EXPIRY = 15 * 60  # Aircraft not seen for this long (s) give up their track
+EVENT_WINDOW = 30 * 60  # Landings/takeoffs in the last this-many seconds count towards activity
+
+# Track point fields
+T, LAT, LON, ALT, GROUND = range(5)
+
+
+def _json_number(value: float) -> Optional[float]:
+    return None if value != value else value  # NaN -> None, as OpenSky sent it
+
+
+def decode_states(states: List[list]) -> Dict[str, np.ndarray]:
+    """OpenSky `states` rows -> one array per field used (missing numbers become NaN)."""
+    if not states:
+        empty = np.empty(0)
+        return {"icao24": np.empty(0, dtype=object), "callsign": np.empty(0, dtype=object), "time": empty,
+                "latitude": empty, "longitude": empty, "altitude": empty, "on_ground": np.empty(0, dtype=bool),
+                "heading": empty, "vertical_rate": empty}
+    rows = np.array(states, dtype=object)
+
+    def numeric(index):
+        return rows[:, index].astype(np.float64)  # None -> nan
+
+    return {
+        "icao24": rows[:, ICAO24],
+        "callsign": rows[:, CALLSIGN],
+        "time": numeric(LAST_CONTACT),
+        "latitude": numeric(LATITUDE),
+        "longitude": numeric(LONGITUDE),
+        "altitude": numeric(BARO_ALTITUDE),
+        "on_ground": rows[:, ON_GROUND].astype(bool),
+        "heading": numeric(TRUE_TRACK),
+        "vertical_rate": np.nan_to_num(numeric(VERTICAL_RATE)),
+    }
+
+
+class FlightTracks:
+    """Last `length` positions of up to `max_aircraft` aircraft, in one preallocated array."""
+
+    def __init__(self, max_aircraft: int = FLIGHT_TRACK_AIRCRAFT, length: int = FLIGHT_TRACK_POINTS):
+        self.length = length
+        self.points = np.full((max_aircraft, length, 5), np.nan)  # time, lat, lon, altitude, on_ground
+        self.head = np.zeros(max_aircraft, dtype=np.intp)         # Next write position per slot
+        self.count = np.zeros(max_aircraft, dtype=np.intp)
+        self.last_seen = np.full(max_aircraft, -np.inf)
+        self.slots: Dict[str, int] = {}
+        self._owners: List[Optional[str]] = [None] * max_aircraft
+        self.events = deque(maxlen=1000)  # (time, "landing" | "takeoff", icao24)
+
+    def _release(self, slot: int):
+        del self.slots[self._owners[slot]]
+        self._owners[slot] = None
+        self.head[slot] = self.count[slot] = 0
+        self.last_seen[slot] = -np.inf
+
+    def _slot(self, icao24: str, now: float) -> int:
+        slot = self.slots.get(icao24)
+        if slot is None:
+            # A free slot, or else the aircraft seen longest ago
+            slot = int(np.argmin(self.last_seen))
+            if self._owners[slot] is not None:
+                self._release(slot)
+            self.slots[icao24] = slot
+            self._owners[slot] = icao24
+        self.last_seen[slot] = now
+        return slot
+
+    def update(self, decoded: Dict[str, np.ndarray], now: float):
+        for slot in np.flatnonzero(now - self.last_seen > TRACK_EXPIRY):
+            if self._owners[slot] is not None:
+                self._release(slot)
+
+        icao24 = decoded["icao24"]
+        if not len(icao24):
+            return
+        _, first = np.unique(icao24.astype(str), return_index=True)
+        rows = np.array([self._slot(code, now) for code in icao24[first]], dtype=np.intp)
+        times = np.where(np.isnan(decoded["time"][first]), now, decoded["time"][first])
+        on_ground = decoded["on_ground"][first].astype(np.float64)
+
+        # on_ground flips since each aircraft's previous point are landings / takeoffs
+        seen = self.count[rows] > 0
+        previous = self.points[rows, (self.head[rows] - 1) % self.length, GROUND]
+        for i in np.flatnonzero(seen & (previous != on_ground)):
+            self.events.append((float(times[i]), "landing" if on_ground[i] else "takeoff", str(icao24[first][i])))
+
+        self.points[rows, self.head[rows]] = np.column_stack([
+            times, decoded["latitude"][first], decoded["longitude"][first], decoded["altitude"][first], on_ground])
+        self.head[rows] = (self.head[rows] + 1) % self.length
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.length)
+
+    def track(self, icao24: str) -> List[Dict[str, Any]]:
+        """Oldest-first positions of one aircraft."""
+        slot = self.slots.get(icao24)
+        if slot is None:
+            return []
+        order = (self.head[slot] - self.count[slot] + np.arange(self.count[slot])) % self.length
+        return [{"time": p[T], "latitude": _json_number(p[LAT]), "longitude": _json_number(p[LON]),
+                 "altitude": _json_number(p[ALT]), "on_ground": bool(p[GROUND])}
+                for p in self.points[slot, order].tolist()]
+
+    def recent_events(self, kind: str, since: float) -> int:
+        return sum(1 for t, k, _ in self.events if k == kind and t >= since)
+
 
 class FlightFetcher:
     """Fetches real-time aircraft state vectors within a given bounding box."""
@@ -18,6 +135,13 @@ class FlightFetcher:
     def __init__(self):
         self.base_url = "https://opensky-network.org/api/states/all"
         self.bbox = EDINBURGH_AIRPORT_BBOX
+        self.tracks = FlightTracks()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=15)
+        return self._client
 
     async def fetch(self) -> Dict[str, Any]:
         """
@@ -30,60 +154,49 @@ class FlightFetcher:
             'lomax': self.bbox[3],
         }
 
-        arriving_flights = []
-        departing_flights = []
-        en_route_flights = []
-        on_ground_count = 0
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.base_url, params=params, timeout=15)
-            response.raise_for_status()
-            data = response.json()
+        response = await self._get_client().get(self.base_url, params=params)
+        response.raise_for_status()
+        data = response.json()
 
         # The 'states' field can be null if no aircraft are in the area
-        if not data or not data['states']:
-            return {
-                'timestamp': datetime.now().isoformat(),
-                'arriving': [],
-                'departing': [],
-                'en_route': [],
-                'on_ground_count': 0,
-                'total_in_air': 0,
-            }
-            
-        # State vector indices used:
-        # 0: icao24, 1: callsign, 5: longitude, 6: latitude, 
-        # 8: on_ground, 10: true_track, 11: vertical_rate
-        for state in data['states']:
-            is_on_ground = state[8]
-            vertical_rate = state[11] if state[11] is not None else 0
-            
-            if is_on_ground:
-                on_ground_count += 1
-                continue # Skip further processing for on-ground planes
-
-            flight_info = {
-                'callsign': state[1].strip() if state[1] else 'N/A',
-                'longitude': state[5],
-                'latitude': state[6],
-                'vertical_rate': vertical_rate,
-                'heading': state[10]
-            }
-
-            if vertical_rate < -0.5: # Descending (m/s)
-                arriving_flights.append(flight_info)
-            elif vertical_rate > 0.5: # Climbing (m/s)
-                departing_flights.append(flight_info)
-            else:
-                en_route_flights.append(flight_info)
+        now = float((data or {}).get('time') or datetime.now().timestamp())
+        states = decode_states((data or {}).get('states') or [])
+        self.tracks.update(states, now)
+
+        airborne = ~states['on_ground']
+        vertical_rate = states['vertical_rate']
+        groups = {
+            'arriving': airborne & (vertical_rate < -CLIMB_RATE),  # Descending (m/s)
+            'departing': airborne & (vertical_rate > CLIMB_RATE),  # Climbing (m/s)
+            'en_route': airborne & (np.abs(vertical_rate) <= CLIMB_RATE),
+        }
+        flights = {}
+        for name, mask in groups.items():
+            rows = np.flatnonzero(mask)
+            flights[name] = [
+                {
+                    'icao24': icao24,
+                    'callsign': callsign.strip() if callsign else 'N/A',
+                    'longitude': _json_number(longitude),
+                    'latitude': _json_number(latitude),
+                    'vertical_rate': rate,
+                    'heading': _json_number(heading),
+                }
+                for icao24, callsign, longitude, latitude, rate, heading in zip(
+                    states['icao24'][rows].tolist(), states['callsign'][rows].tolist(),
+                    states['longitude'][rows].tolist(), states['latitude'][rows].tolist(),
+                    vertical_rate[rows].tolist(), states['heading'][rows].tolist())
+            ]
 
         return {
             'timestamp': datetime.now().isoformat(),
-            'arriving': arriving_flights,
-            'departing': departing_flights,
-            'en_route': en_route_flights,
-            'on_ground_count': on_ground_count,
-            'total_in_air': len(arriving_flights) + len(departing_flights) + len(en_route_flights)
+            'arriving': flights['arriving'],
+            'departing': flights['departing'],
+            'en_route': flights['en_route'],
+            'on_ground_count': int(states['on_ground'].sum()),
+            'total_in_air': int(airborne.sum()),
+            'recent_landings': self.tracks.recent_events('landing', now - EVENT_WINDOW),
+            'recent_takeoffs': self.tracks.recent_events('takeoff', now - EVENT_WINDOW),
         }
 
     def calculate_score(self, flight_data: Dict[str, Any]) -> float:
@@ -91,10 +204,16 @@ class FlightFetcher:
         Calculates a 0-100 activity score based on takeoffs and landings.
         """
         # More weight for active takeoffs/landings
-        activity = (len(flight_data['arriving']) * 10 + 
+        activity = (len(flight_data['arriving']) * 10 +
                     len(flight_data['departing']) * 10 +
-                    len(flight_data['en_route']) * 2)
-        
+                    len(flight_data['en_route']) * 2 +
+                    (flight_data.get('recent_landings', 0) + flight_data.get('recent_takeoffs', 0)) * 5)
+
         # Normalize to a 0-100 score, capping at a reasonable number (e.g., 10 planes is high activity)
         score = min(100, activity)
-        return round(score, 1)
\ No newline at end of file
+        return round(score, 1)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
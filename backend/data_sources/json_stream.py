@@ -0,0 +1,113 @@
+"""
+Incremental parsing of one array inside a streamed JSON object.
+
+For feeds shaped like {"last_updated": ..., "vehicles": [{...}, {...}, ...]},
+iter_array_items() yields the array's elements one at a time as the bytes
+arrive, so only the current element (plus an unparsed tail of at most one
+chunk) is ever in memory, never the whole document. It uses the standard
+library decoder (json.JSONDecoder.raw_decode) on a sliding text buffer.
+"""
+
+import codecs
+import json
+from typing import Any, AsyncIterator, Callable, Optional
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+class _Buffer:
+    """Decoded text not yet consumed, refilled from the byte stream on demand."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.exhausted = False
+
+    async def fill(self) -> bool:
+        """Appends the next chunk (dropping consumed text); False once the stream has ended."""
+        if self.exhausted:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self.exhausted = True
+            chunk, final = b"", True
+        else:
+            final = False
+        self.text = self.text[self.pos:] + self._utf8.decode(chunk, final)
+        self.pos = 0
+        return True
+
+    async def peek(self) -> str:
+        """The next non-whitespace character (without consuming it), or "" at the end."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not await self.fill():
+                return ""
+
+    async def expect(self, char: str):
+        if await self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of the JSON stream")
+        self.pos += 1
+
+    async def value(self) -> Any:
+        """Decodes the next complete JSON value, reading more of the stream until it is."""
+        await self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not await self.fill():
+                    raise
+                continue
+            # A value running to the end of the buffer may be cut short, and so may a number
+            # followed only by what could still be more of it (raw_decode reads "55." as 55)
+            number = isinstance(value, (int, float)) and not isinstance(value, bool)
+            cut_short = end == len(self.text) or (number and _NUMBER_CHARS.issuperset(self.text[end:]))
+            if self.exhausted or not cut_short:
+                self.pos = end
+                return value
+            await self.fill()
+
+
+async def iter_array_items(chunks: AsyncIterator[bytes], key: str,
+                           project: Optional[Callable[[Any], Any]] = None) -> AsyncIterator[Any]:
+    """
+    Yields the elements of the top-level object's `key` array from a byte stream,
+    passed through `project` (elements it maps to None are skipped). Other
+    top-level members are parsed and discarded.
+    """
+    buffer = _Buffer(chunks)
+    await buffer.expect("{")
+    if await buffer.peek() == "}":
+        return
+    while True:
+        name = await buffer.value()
+        await buffer.expect(":")
+        if name != key:
+            await buffer.value()
+        else:
+            await buffer.expect("[")
+            if await buffer.peek() == "]":
+                buffer.pos += 1
+            else:
+                while True:
+                    item = await buffer.value()
+                    if project is not None:
+                        item = project(item)
+                    if item is not None:
+                        yield item
+                    if await buffer.peek() == "]":
+                        buffer.pos += 1
+                        break
+                    await buffer.expect(",")
+        if await buffer.peek() == "}":
+            return
+        await buffer.expect(",")
@@ -3,45 +3,60 @@ Fetches live vehicle location data from TFE Open Data API.
 '''
 import httpx
 import asyncio
+from typing import Dict, List, Optional
+
+from config.settings import TFE_STREAMING_PARSE
+from data_sources.json_stream import iter_array_items
+
+
+def project_vehicle(vehicle: Dict) -> Optional[Dict]:
+    """The fields we keep for one vehicle (None for vehicles not in service)"""
+    destination = vehicle.get("destination")
+    if not destination:
+        return None
+    return {
+        "vehicle_id": vehicle.get("vehicle_id"),
+        "latitude": vehicle.get("latitude"),
+        "longitude": vehicle.get("longitude"),
+        "speed": vehicle.get("speed"),
+        "destination": destination,
+        "journey_id": vehicle.get("journey_id"),
+        "vehicle_type": vehicle.get("vehicle_type"),
+        "heading": vehicle.get("heading"),
+        "ineo_gps_fix": vehicle.get("ineo_gps_fix")
+    }
+
 
 class LiveVehicleLocationFetcher:
 
-    def __init__(self):
+    def __init__(self, streaming: bool = TFE_STREAMING_PARSE):
         self.base_url = "https://tfe-opendata.com/api/v1/vehicle_locations"
+        self.streaming = streaming
+        self._client: Optional[httpx.AsyncClient] = None
 
-    async def fetch_transport(self):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.base_url, timeout=10)
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=10)
+        return self._client
+
+    async def fetch_transport(self) -> List[Dict]:
+        if not self.streaming:
+            response = await self._get_client().get(self.base_url)
+            response.raise_for_status()
             data = response.json()
+            return [v for v in map(project_vehicle, data.get("vehicles", [])) if v is not None]
+
+        # Records are projected as they arrive; the full document is never built
+        async with self._get_client().stream("GET", self.base_url) as response:
+            response.raise_for_status()
+            return [v async for v in iter_array_items(response.aiter_bytes(), "vehicles", project_vehicle)]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
 
-            results = []
-
-            for vehicle in data.get("vehicles", []):
-                destination = vehicle.get("destination")
-                if not destination:
-                    continue
-                vehicle_id = vehicle.get("vehicle_id")
-                latitude = vehicle.get("latitude")
-                longitude = vehicle.get("longitude")
-                speed = vehicle.get("speed")
-                journey_id = vehicle.get("journey_id")
-                vehicle_type = vehicle.get("vehicle_type")
-                heading = vehicle.get("heading")
-                ineo_gps_fix = vehicle.get("ineo_gps_fix")
-
-                results.append({
-                    "vehicle_id": vehicle_id,
-                    "latitude": latitude,
-                    "longitude": longitude,
-                    "speed": speed,
-                    "destination": destination,
-                    "journey_id": journey_id,
-                    "vehicle_type": vehicle_type,
-                    "heading": heading,
-                    "ineo_gps_fix": ineo_gps_fix
-                })
-
-            return results
 async def main():
 
     # test
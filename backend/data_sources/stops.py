@@ -3,54 +3,63 @@ Fetches bus stop data for Edinburgh from the TFE Open Data API.
 '''
 import httpx
 import asyncio
+from typing import Dict, List, Optional
+
+from config.settings import TFE_STREAMING_PARSE
+from data_sources.json_stream import iter_array_items
+
+
+def project_stop(stop: Dict) -> Dict:
+    """The fields we keep for one stop"""
+    return {
+        "stop_id": stop.get("stop_id"),
+        "atco_code": stop.get("atco_code"),
+        "name": stop.get("name"),
+        "identifier": stop.get("identifier"),
+        "locality": stop.get("locality"),
+        "orientation": stop.get("orientation"),
+        "direction": stop.get("direction"),
+        "latitude": stop.get("latitude"),
+        "longitude": stop.get("longitude"),
+        "service_type": stop.get("service_type"),
+        "atco_longitude": stop.get("atco_longitude"),
+        "atco_latitude": stop.get("atco_latitude"),
+        "destination": stop.get("destination", []),
+        "services": stop.get("services", [])
+    }
+
 
 class BusStopFetcher:
     """Fetches bus stop data for Edinburgh"""
 
-    def __init__(self):
+    def __init__(self, streaming: bool = TFE_STREAMING_PARSE):
         self.base_url = "https://tfe-opendata.com/api/v1/stops"
+        self.streaming = streaming
+        self._client: Optional[httpx.AsyncClient] = None
 
-    async def fetch_stops(self):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.base_url, timeout=10)
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=10)
+        return self._client
+
+    async def fetch_stops(self) -> List[Dict]:
+        if not self.streaming:
+            response = await self._get_client().get(self.base_url)
+            response.raise_for_status()
             data = response.json()
+            return [project_stop(stop) for stop in data.get("stops", [])]
+
+        # Records are projected as they arrive; the full document is never built
+        async with self._get_client().stream("GET", self.base_url) as response:
+            response.raise_for_status()
+            return [stop async for stop in iter_array_items(response.aiter_bytes(), "stops", project_stop)]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
 
-            results = []
-
-            for vehicle in data.get("stops", []):
-                destination = vehicle.get("destination", [])
-                stop_id = vehicle.get("stop_id")
-                atco_code = vehicle.get("atco_code")
-                name = vehicle.get("name")
-                identifier = vehicle.get("identifier")
-                locality = vehicle.get("locality")
-                orientation = vehicle.get("orientation")
-                direction = vehicle.get("direction")
-                latitude = vehicle.get("latitude")
-                longitude = vehicle.get("longitude")
-                service_type = vehicle.get("service_type")
-                atco_longitude = vehicle.get("atco_longitude")
-                atco_latitude = vehicle.get("atco_latitude")
-                services = vehicle.get("services", [])
-
-                results.append({
-                    "stop_id": stop_id,
-                    "atco_code": atco_code,
-                    "name": name,
-                    "identifier": identifier,
-                    "locality": locality,
-                    "orientation": orientation,
-                    "direction": direction,
-                    "latitude": latitude,
-                    "longitude": longitude,
-                    "service_type": service_type,
-                    "atco_longitude": atco_longitude,
-                    "atco_latitude": atco_latitude,
-                    "destination": destination,
-                    "services": services
-                })
-
-            return results
 async def main():
 
     # test
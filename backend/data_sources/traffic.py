@@ -0,0 +1,112 @@
+"""
+Real-time Traffic Data Fetcher for any number of Edinburgh road segments
+Using TomTom Traffic API (flowSegmentData), one shared client, a bounded number of requests in flight
+"""
+
+import httpx
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from config.settings import TRAFFIC_MAX_CONCURRENCY
+from config.traffic_segments import SEGMENTS, TrafficSegment
+
+
+class TrafficFetcher:
+    """Fetches real-time traffic data for registered segments (see config/traffic_segments.json)"""
+
+    def __init__(self, api_key: str, max_concurrency: int = TRAFFIC_MAX_CONCURRENCY):
+        self.api_key = api_key
+        self.base_url = "https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # One connection pool for every segment, instead of a new client per request
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10,
+                limits=httpx.Limits(max_connections=self.max_concurrency),
+            )
+        return self._client
+
+    async def fetch_segment(self, segment: TrafficSegment) -> Dict:
+        """Fetch current traffic data for one segment from TomTom API"""
+        params = {
+            "point": f"{segment.lat},{segment.lon}",
+            "unit": "KMPH",
+            "key": self.api_key
+        }
+
+        async with self._semaphore:
+            response = await self._get_client().get(self.base_url, params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        flow = data["flowSegmentData"]
+
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "current_speed": flow["currentSpeed"],
+            "free_flow_speed": flow["freeFlowSpeed"],
+            "current_travel_time": flow["currentTravelTime"],
+            "free_flow_travel_time": flow["freeFlowTravelTime"],
+            "confidence": flow["confidence"],
+            "road_closure": flow["roadClosure"]
+        }
+
+    async def fetch_many(self, segments: Iterable[TrafficSegment]) -> Dict[str, object]:
+        """Polls all `segments` concurrently (at most max_concurrency at once).
+        Returns {segment key: traffic dict, or the exception that request raised}."""
+        segments = list(segments)
+        results = await asyncio.gather(*(self.fetch_segment(s) for s in segments), return_exceptions=True)
+        return {segment.key: result for segment, result in zip(segments, results)}
+
+    def calculate_score(self, traffic):
+        """Convert traffic data to 0–100 score (higher = smoother traffic)"""
+        if traffic["road_closure"]:
+            return 0  # full closure = 0 score
+
+        current = traffic["current_speed"]
+        free = traffic["free_flow_speed"]
+
+        # Basic ratio of flow efficiency
+        ratio = current / free if free > 0 else 0
+        ratio = min(max(ratio, 0), 1)
+
+        # Add confidence weighting
+        score = ratio * 100 * traffic["confidence"]
+        return round(score, 1)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def main():
+    print("🚦 Edinburgh Traffic Test")
+    print("=" * 50)
+
+    import os
+    from dotenv import load_dotenv
+    load_dotenv()
+    fetcher = TrafficFetcher(os.getenv("TOMTOM_API_KEY"))
+
+    print(f"🔄 Fetching real-time traffic data for {len(SEGMENTS)} segments...")
+    results = await fetcher.fetch_many(SEGMENTS)
+    await fetcher.close()
+
+    print("\n✅ Done!\n")
+    for segment in SEGMENTS:
+        traffic = results[segment.key]
+        if isinstance(traffic, Exception):
+            print(f"❌ {segment.name}: {traffic}")
+            continue
+        print(f"🚗 {segment.name}: {traffic['current_speed']}/{traffic['free_flow_speed']} km/h, "
+              f"closed: {traffic['road_closure']}, score {fetcher.calculate_score(traffic)}/100")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
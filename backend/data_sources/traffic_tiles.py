@@ -0,0 +1,430 @@
+"""
+City-wide traffic flow from TomTom vector flow tiles.
+
+Instead of one flowSegmentData request per point, the tiles covering
+TRAFFIC_TILE_BBOX are fetched (30 requests at zoom 12) and decoded in
+bulk into a SegmentSpeedTable: every road line in the tiles, with its speed.
+Registered segments (config/traffic_segments.json) are then read from the
+table by finding the nearest road line to their point.
+
+Two styles are fetched per tile: "absolute" (traffic_level is the current speed
+in km/h) and "relative0" (traffic_level is current / free-flow speed, 0 when
+closed). Decoded tiles are cached per (style, zoom, x, y) for TRAFFIC_TILE_TTL.
+
+TrafficTileFetcher has the same fetch_segment / fetch_many / calculate_score /
+close interface as TrafficFetcher, so the aggregator can use either.
+"""
+
+import asyncio
+import math
+import struct
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from config.settings import TRAFFIC_MAX_CONCURRENCY, TRAFFIC_TILE_BBOX, TRAFFIC_TILE_TTL, TRAFFIC_TILE_ZOOM
+from config.traffic_segments import SEGMENTS, TrafficSegment
+
+FLOW_LAYER = "Traffic flow"
+ABSOLUTE_STYLE = "absolute"
+RELATIVE_STYLE = "relative0"
+
+# A registered point further than this from every road line in the tiles has no reading
+MATCH_RADIUS_M = 50
+CONGESTED_RELATIVE_SPEED = 0.5
+
+METRES_PER_DEGREE_LAT = 110540
+METRES_PER_DEGREE_LON = 111320  # At the equator; scaled by cos(latitude)
+
+
+# ==================== MVT DECODING ====================
+
+def _varint(buf, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf):
+    """(field number, wire type, value) for each protobuf field; length-delimited values are memoryviews"""
+    pos, end = 0, len(buf)
+    while pos < end:
+        key, pos = _varint(buf, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _varint(buf, pos)
+        elif wire == 2:
+            length, pos = _varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+        elif wire == 1:
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire == 5:
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield field, wire, value
+
+
+def _packed(buf) -> List[int]:
+    values, pos, end = [], 0, len(buf)
+    while pos < end:
+        value, pos = _varint(buf, pos)
+        values.append(value)
+    return values
+
+
+def _zigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def _value(buf):
+    """An MVT Value message as a Python scalar"""
+    for field, wire, value in _fields(buf):
+        if field == 1:
+            return bytes(value).decode("utf-8")
+        if field == 2:
+            return struct.unpack("<f", value)[0]
+        if field == 3:
+            return struct.unpack("<d", value)[0]
+        if field in (4, 5):
+            return value if value < 1 << 63 else value - (1 << 64)
+        if field == 6:
+            return _zigzag(value)
+        if field == 7:
+            return bool(value)
+    return None
+
+
+def decode_flow_tile(data: bytes, z: int, x: int, y: int, layer_name: str = FLOW_LAYER) -> Dict[str, np.ndarray]:
+    """
+    The line features of one flow tile as arrays: vertex lon/lat, line offsets
+    (vertices of line i are offsets[i]:offsets[i + 1]), the feature each line
+    belongs to, and per-feature traffic_level / road_closure / road_type.
+    """
+    px: List[int] = []
+    py: List[int] = []
+    offsets = [0]
+    line_feature: List[int] = []
+    levels: List[float] = []
+    closures: List[bool] = []
+    road_types: List[Optional[str]] = []
+    extent = 4096
+
+    buf = memoryview(data)
+    for field, _, layer in _fields(buf):
+        if field != 3:
+            continue
+        name, keys, values, features = None, [], [], []
+        for lf, _, lv in _fields(layer):
+            if lf == 1:
+                name = bytes(lv).decode("utf-8")
+            elif lf == 2:
+                features.append(lv)
+            elif lf == 3:
+                keys.append(bytes(lv).decode("utf-8"))
+            elif lf == 4:
+                values.append(_value(lv))
+            elif lf == 5:
+                extent = lv
+        if name != layer_name:
+            continue
+
+        for feature in features:
+            tags, geometry, geom_type = [], [], 0
+            for ff, _, fv in _fields(feature):
+                if ff == 2:
+                    tags = _packed(fv)
+                elif ff == 3:
+                    geom_type = fv
+                elif ff == 4:
+                    geometry = _packed(fv)
+            if geom_type != 2:  # LINESTRING
+                continue
+            props = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags) - 1, 2)}
+            level = props.get("traffic_level")
+            if level is None:
+                continue
+
+            feature_index = len(levels)
+            levels.append(float(level))
+            closures.append(bool(props.get("road_closure", False)))
+            road_types.append(props.get("road_type"))
+
+            # Command stream: MoveTo starts a line, LineTo extends it; coordinates are zigzag deltas
+            cx = cy = 0
+            i = 0
+            while i < len(geometry):
+                command, count = geometry[i] & 7, geometry[i] >> 3
+                i += 1
+                if command == 7:  # ClosePath (not used by lines)
+                    continue
+                for _ in range(count):
+                    cx += _zigzag(geometry[i])
+                    cy += _zigzag(geometry[i + 1])
+                    i += 2
+                    if command == 1 and len(px) > offsets[-1]:
+                        offsets.append(len(px))
+                    if command == 1:
+                        line_feature.append(feature_index)
+                    px.append(cx)
+                    py.append(cy)
+        break
+
+    if len(px) > offsets[-1]:
+        offsets.append(len(px))
+
+    # Tile pixels -> lon/lat (Web Mercator)
+    scale = extent * (1 << z)
+    lon = (x * extent + np.asarray(px, dtype=np.float64)) / scale * 360.0 - 180.0
+    merc_y = (y * extent + np.asarray(py, dtype=np.float64)) / scale
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * merc_y))))
+    return {
+        "lon": lon,
+        "lat": lat,
+        "offsets": np.asarray(offsets, dtype=np.int64),
+        "line_feature": np.asarray(line_feature, dtype=np.int64),
+        "level": np.asarray(levels, dtype=np.float64),
+        "closure": np.asarray(closures, dtype=bool),
+        "road_type": np.asarray(road_types, dtype=object),
+    }
+
+
+def tiles_for_bbox(bbox, zoom: int) -> List[Tuple[int, int]]:
+    """(x, y) of every tile at `zoom` touching bbox [S, W, N, E]"""
+    south, west, north, east = bbox
+    n = 1 << zoom
+
+    def tile_x(lon):
+        return min(n - 1, int((lon + 180.0) / 360.0 * n))
+
+    def tile_y(lat):
+        rad = math.radians(lat)
+        return min(n - 1, int((1 - math.asinh(math.tan(rad)) / math.pi) / 2 * n))
+
+    return [(x, y) for x in range(tile_x(west), tile_x(east) + 1) for y in range(tile_y(north), tile_y(south) + 1)]
+
+
+# ==================== SEGMENT-SPEED TABLE ====================
+
+class SegmentSpeedTable:
+    """Every road line from a set of decoded tiles, as edges (vertex pairs) for nearest-line lookups."""
+
+    def __init__(self, tiles: List[Dict[str, np.ndarray]]):
+        lons, lats, edge_features = [], [], []
+        levels, closures, road_types = [], [], []
+        vertex_base = feature_base = 0
+        for tile in tiles:
+            offsets = tile["offsets"]
+            vertex_count = len(tile["lon"])
+            if vertex_count:
+                # Edge i joins vertex i and i + 1, except across the start of the next line
+                keep = np.ones(vertex_count - 1, dtype=bool)
+                keep[offsets[1:-1] - 1] = False
+                vertex_feature = np.repeat(tile["line_feature"], np.diff(offsets))
+                starts = np.flatnonzero(keep)
+                lons.append(tile["lon"])
+                lats.append(tile["lat"])
+                edge_features.append((starts + vertex_base, vertex_feature[starts] + feature_base))
+            levels.append(tile["level"])
+            closures.append(tile["closure"])
+            road_types.append(tile["road_type"])
+            vertex_base += vertex_count
+            feature_base += len(tile["level"])
+
+        lon = np.concatenate(lons) if lons else np.empty(0)
+        lat = np.concatenate(lats) if lats else np.empty(0)
+        starts = np.concatenate([s for s, _ in edge_features]) if edge_features else np.empty(0, dtype=np.int64)
+        self.edge_feature = np.concatenate([f for _, f in edge_features]) if edge_features else np.empty(0, dtype=np.int64)
+        self.level = np.concatenate(levels) if levels else np.empty(0)
+        self.closure = np.concatenate(closures) if closures else np.empty(0, dtype=bool)
+        self.road_type = np.concatenate(road_types) if road_types else np.empty(0, dtype=object)
+
+        self._a_lon, self._a_lat = lon[starts], lat[starts]
+        self._b_lon, self._b_lat = lon[starts + 1], lat[starts + 1]
+
+        # Edge lengths (local equirectangular projection is plenty at city scale)
+        lon_scale = METRES_PER_DEGREE_LON * np.cos(np.radians((self._a_lat + self._b_lat) / 2))
+        edge_length = np.hypot((self._b_lon - self._a_lon) * lon_scale, (self._b_lat - self._a_lat) * METRES_PER_DEGREE_LAT)
+        self.length_m = np.bincount(self.edge_feature, weights=edge_length, minlength=len(self.level))
+
+    def __len__(self) -> int:
+        return len(self.level)
+
+    def nearest(self, lat: float, lon: float, max_distance_m: float = MATCH_RADIUS_M) -> Tuple[int, float]:
+        """(feature index, distance in metres) of the closest road line, or (-1, inf) if none is within range"""
+        if not len(self._a_lon):
+            return -1, math.inf
+        lon_scale = METRES_PER_DEGREE_LON * math.cos(math.radians(lat))
+        ax = (self._a_lon - lon) * lon_scale
+        ay = (self._a_lat - lat) * METRES_PER_DEGREE_LAT
+        dx = (self._b_lon - self._a_lon) * lon_scale
+        dy = (self._b_lat - self._a_lat) * METRES_PER_DEGREE_LAT
+        # Closest point on each edge to the origin (the query point)
+        length_sq = dx * dx + dy * dy
+        t = np.clip(-(ax * dx + ay * dy) / np.where(length_sq > 0, length_sq, 1), 0, 1)
+        distance = np.hypot(ax + t * dx, ay + t * dy)
+        edge = int(np.argmin(distance))
+        if distance[edge] > max_distance_m:
+            return -1, math.inf
+        return int(self.edge_feature[edge]), float(distance[edge])
+
+    def summary(self) -> Dict:
+        """Length-weighted view of the whole network (meaningful for the relative style)"""
+        total = float(self.length_m.sum())
+        congested = (self.level < CONGESTED_RELATIVE_SPEED) & ~self.closure
+        return {
+            "road_lines": len(self),
+            "road_km": round(total / 1000, 1),
+            "mean_relative_speed": round(float((self.level * self.length_m).sum() / total), 3) if total else None,
+            "congested_km": round(float(self.length_m[congested].sum()) / 1000, 1),
+            "closed_km": round(float(self.length_m[self.closure].sum()) / 1000, 1),
+        }
+
+
+# ==================== FETCHER ====================
+
+class TrafficTileFetcher:
+    """Reads registered segments (and the whole bbox) from cached TomTom vector flow tiles"""
+
+    def __init__(self, api_key: str, bbox=TRAFFIC_TILE_BBOX, zoom: int = TRAFFIC_TILE_ZOOM, ttl: float = TRAFFIC_TILE_TTL,
+                 max_concurrency: int = TRAFFIC_MAX_CONCURRENCY,
+                 base_url: str = "https://api.tomtom.com/traffic/map/4/tile/flow"):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.zoom = zoom
+        self.ttl = ttl
+        self.tiles = tiles_for_bbox(bbox, zoom)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: Dict[Tuple[str, int, int, int], Tuple[float, Dict[str, np.ndarray]]] = {}
+        # Built tables, kept until one of their tiles is re-fetched
+        self._tables: Dict[str, Tuple[tuple, SegmentSpeedTable]] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10,
+                limits=httpx.Limits(max_connections=self.max_concurrency),
+            )
+        return self._client
+
+    async def _fetch_tile(self, style: str, x: int, y: int) -> Dict[str, np.ndarray]:
+        key = (style, self.zoom, x, y)
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        async with self._semaphore:
+            response = await self._get_client().get(f"{self.base_url}/{style}/{self.zoom}/{x}/{y}.pbf",
+                                                    params={"key": self.api_key})
+        response.raise_for_status()
+        # Decoding is pure Python; keep it off the event loop
+        tile = await asyncio.get_running_loop().run_in_executor(
+            None, decode_flow_tile, response.content, self.zoom, x, y)
+        self._cache[key] = (time.monotonic(), tile)
+        return tile
+
+    async def fetch_table(self, style: str) -> SegmentSpeedTable:
+        """Every tile of `style` over the bbox (cached ones reused) as one table"""
+        tiles = await asyncio.gather(*(self._fetch_tile(style, x, y) for x, y in self.tiles))
+        identity = tuple(id(tile) for tile in tiles)
+        built = self._tables.get(style)
+        if built is None or built[0] != identity:
+            built = (identity, SegmentSpeedTable(tiles))
+            self._tables[style] = built
+        return built[1]
+
+    async def fetch_tables(self) -> Tuple[SegmentSpeedTable, SegmentSpeedTable]:
+        """(absolute, relative) tables"""
+        return await asyncio.gather(self.fetch_table(ABSOLUTE_STYLE), self.fetch_table(RELATIVE_STYLE))
+
+    def _read_segment(self, segment: TrafficSegment, absolute: SegmentSpeedTable, relative: SegmentSpeedTable) -> Dict:
+        speed_line, distance = absolute.nearest(segment.lat, segment.lon)
+        ratio_line, _ = relative.nearest(segment.lat, segment.lon)
+        if speed_line < 0 or ratio_line < 0:
+            raise LookupError(f"No flow tile road within {MATCH_RADIUS_M} m of {segment.name}")
+
+        current_speed = float(absolute.level[speed_line])
+        relative_speed = float(relative.level[ratio_line])
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "current_speed": current_speed,
+            "free_flow_speed": round(current_speed / relative_speed, 1) if relative_speed > 0 else None,
+            "relative_speed": relative_speed,
+            "road_closure": bool(absolute.closure[speed_line] or relative.closure[ratio_line]),
+            "road_type": absolute.road_type[speed_line],
+            "match_distance_m": round(distance, 1),
+        }
+
+    async def fetch_segment(self, segment: TrafficSegment) -> Dict:
+        """Current traffic for one segment, read from the tile tables"""
+        absolute, relative = await self.fetch_tables()
+        return self._read_segment(segment, absolute, relative)
+
+    async def fetch_many(self, segments: Iterable[TrafficSegment]) -> Dict[str, object]:
+        """Same contract as TrafficFetcher.fetch_many: {segment key: traffic dict, or the exception}"""
+        segments = list(segments)
+        try:
+            absolute, relative = await self.fetch_tables()
+        except Exception as e:
+            return {segment.key: e for segment in segments}
+        results = {}
+        for segment in segments:
+            try:
+                results[segment.key] = self._read_segment(segment, absolute, relative)
+            except LookupError as e:
+                results[segment.key] = e
+        return results
+
+    async def flow_summary(self) -> Dict:
+        """Network-wide congestion over the bbox (from the relative tiles)"""
+        table = await self.fetch_table(RELATIVE_STYLE)
+        return dict(table.summary(), tiles=len(self.tiles), zoom=self.zoom)
+
+    def calculate_score(self, traffic):
+        """Convert traffic data to 0–100 score (higher = smoother traffic)"""
+        if traffic["road_closure"]:
+            return 0
+        return round(min(max(traffic["relative_speed"], 0), 1) * 100, 1)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def main():
+    import os
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    fetcher = TrafficTileFetcher(os.getenv("TOMTOM_API_KEY"))
+    print(f"🗺️ Fetching {len(fetcher.tiles) * 2} flow tiles at zoom {fetcher.zoom}...")
+    try:
+        start = time.perf_counter()
+        results = await fetcher.fetch_many(SEGMENTS)
+        print(f"✅ Done in {time.perf_counter() - start:.1f}s\n")
+        for segment in SEGMENTS:
+            result = results[segment.key]
+            if isinstance(result, Exception):
+                print(f"❌ {segment.name}: {result}")
+            else:
+                print(f"🚦 {segment.name}: {result['current_speed']} km/h, score {fetcher.calculate_score(result)}")
+        print(f"\n{await fetcher.flow_summary()}")
+    finally:
+        await fetcher.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
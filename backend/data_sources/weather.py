@@ -1,57 +1,172 @@
 """
 Weather data fetcher for Edinburgh using Open-Meteo API
 
+Every monitored location (the city centre, the airport and each traffic
+segment) is fetched in one request per hour: Open-Meteo takes a list of
+coordinates and returns hourly forecasts for each. The hourly arrays are kept
+in one (location, hour, variable) array, and "current" or near-future weather
+is a lookup into it, so per-location weather costs nothing per cycle.
 """
 
 import httpx
 import asyncio
+import logging
+import time
 from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from config.settings import EDINBURGH_AIRPORT_BBOX, EDINBURGH_LAT, EDINBURGH_LON, WEATHER_FORECAST_DAYS, WEATHER_REFRESH_INTERVAL
+from config.traffic_segments import SEGMENTS
+
+logger = logging.getLogger(__name__)
+
+# Output field -> Open-Meteo hourly variable
+HOURLY_VARIABLES = {
+    'temperature': 'temperature_2m',
+    'feels_like': 'apparent_temperature',
+    'humidity': 'relative_humidity_2m',
+    'weather_code': 'weather_code',
+    'wind_speed': 'wind_speed_10m',
+    'cloudiness': 'cloud_cover',
+    # Extra fields used by the air quality model
+    'dewpoint': 'dew_point_2m',
+    'wind_direction': 'wind_direction_10m',
+    'visibility': 'visibility',
+    'pressure': 'surface_pressure',
+}
+FIELDS = list(HOURLY_VARIABLES)
+# Taken from the hour containing the time asked for; everything else is interpolated between hours
+STEPPED_FIELDS = {'weather_code', 'wind_direction'}
+
+RETRY_INTERVAL = 5 * 60  # After a failed refresh, while the cached hours still cover now
+
+# Map weather codes to descriptions
+WEATHER_DESCRIPTIONS = {
+    0: 'Clear sky', 1: 'Mainly clear', 2: 'Partly cloudy',
+    3: 'Overcast', 45: 'Foggy', 51: 'Light drizzle',
+    61: 'Light rain', 63: 'Rain', 65: 'Heavy rain',
+    71: 'Light snow', 95: 'Thunderstorm'
+}
+
+
+class WeatherLocation(NamedTuple):
+    key: str
+    lat: float
+    lon: float
+
+
+CITY_CENTRE = "edinburgh"
+
+
+def monitored_locations() -> List[WeatherLocation]:
+    """The city centre, the middle of the airport bbox, and every traffic segment."""
+    south, west, north, east = EDINBURGH_AIRPORT_BBOX
+    return ([WeatherLocation(CITY_CENTRE, EDINBURGH_LAT, EDINBURGH_LON),
+             WeatherLocation("airport", (south + north) / 2, (west + east) / 2)]
+            + [WeatherLocation(segment.key, segment.lat, segment.lon) for segment in SEGMENTS])
 
 
 class WeatherFetcher:
     """Fetches weather data for Edinburgh"""
     
-    def __init__(self):
+    def __init__(self, locations: Optional[List[WeatherLocation]] = None):
         self.base_url = "https://api.open-meteo.com/v1/forecast"
-        self.lat = 55.9533  # Edinburgh coords
-        self.lon = -3.1883
-    
-    async def fetch_weather(self):
-        # get current weather data
+        self.locations = locations or monitored_locations()
+        self._rows = {location.key: i for i, location in enumerate(self.locations)}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh_lock = asyncio.Lock()
+        self.times: Optional[np.ndarray] = None   # Unix time of each hour
+        self.values: Optional[np.ndarray] = None  # (location, hour, field)
+        self.fetched_at = 0.0
+        self._next_refresh = 0.0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=10)
+        return self._client
+
+    async def refresh(self):
+        """Hourly forecasts for every location in one request."""
         params = {
-            'latitude': self.lat,
-            'longitude': self.lon,
-            'current': 'temperature_2m,relative_humidity_2m,apparent_temperature,weather_code,cloud_cover,wind_speed_10m',
-            'timezone': 'Europe/London'
+            'latitude': ",".join(str(location.lat) for location in self.locations),
+            'longitude': ",".join(str(location.lon) for location in self.locations),
+            'hourly': ",".join(HOURLY_VARIABLES.values()),
+            'past_hours': 1,
+            'forecast_days': WEATHER_FORECAST_DAYS,
+            'timeformat': 'unixtime',
+            'timezone': 'GMT',
         }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.base_url, params=params, timeout=10)
-            data = response.json()
-            
-            current = data['current']
-            
-            # Map weather codes to descriptions
-            weather_map = {
-                0: 'Clear sky', 1: 'Mainly clear', 2: 'Partly cloudy',
-                3: 'Overcast', 45: 'Foggy', 51: 'Light drizzle',
-                61: 'Light rain', 63: 'Rain', 65: 'Heavy rain',
-                71: 'Light snow', 95: 'Thunderstorm'
-            }
-            
-            weather_code = current['weather_code']
-            description = weather_map.get(weather_code, 'Unknown')
-            
-            return {
-                'timestamp': datetime.now().isoformat(),
-                'temperature': current['temperature_2m'],
-                'feels_like': current['apparent_temperature'],
-                'humidity': current['relative_humidity_2m'],
-                'description': description,
-                'wind_speed': current['wind_speed_10m'],
-                'cloudiness': current['cloud_cover']
-            }
-    
+        response = await self._get_client().get(self.base_url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        results = data if isinstance(data, list) else [data]  # A single location isn't wrapped in a list
+        if len(results) != len(self.locations):
+            raise ValueError(f"Open-Meteo returned {len(results)} locations, expected {len(self.locations)}")
+
+        self.times = np.asarray(results[0]['hourly']['time'], dtype=np.float64)
+        self.values = np.array([[result['hourly'][HOURLY_VARIABLES[field]] for field in FIELDS] for result in results],
+                               dtype=np.float64).transpose(0, 2, 1)  # None -> nan
+        self.fetched_at = time.time()
+        self._next_refresh = self.fetched_at + WEATHER_REFRESH_INTERVAL
+
+    def _covers(self, when: float) -> bool:
+        return self.times is not None and self.times[0] <= when <= self.times[-1]
+
+    async def ensure_fresh(self):
+        async with self._refresh_lock:  # One refresh even if several callers ask at once
+            now = time.time()
+            if now < self._next_refresh and self._covers(now):
+                return
+            try:
+                await self.refresh()
+            except Exception as e:
+                if not self._covers(now):
+                    raise
+                logger.warning("Weather refresh failed, serving cached hours: %s", e)
+                self._next_refresh = now + RETRY_INTERVAL
+
+    def lookup(self, key: str = CITY_CENTRE, when: Optional[float] = None) -> Dict:
+        """Weather at one location from the cached hours (no request)."""
+        when = time.time() if when is None else when
+        hours = self.values[self._rows[key]]
+        hour = int(np.clip(np.searchsorted(self.times, when, side='right') - 1, 0, len(self.times) - 1))
+        fields = {}
+        for i, field in enumerate(FIELDS):
+            value = hours[hour, i] if field in STEPPED_FIELDS else np.interp(when, self.times, hours[:, i])
+            fields[field] = None if np.isnan(value) else round(float(value), 1)
+
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'valid_for': datetime.fromtimestamp(when).isoformat(),
+            'temperature': fields['temperature'],
+            'feels_like': fields['feels_like'],
+            'humidity': fields['humidity'],
+            'description': WEATHER_DESCRIPTIONS.get(fields['weather_code'], 'Unknown'),
+            'wind_speed': fields['wind_speed'],
+            'cloudiness': fields['cloudiness'],
+            'dewpoint': fields['dewpoint'],
+            'wind_direction': fields['wind_direction'],
+            'visibility': fields['visibility'],
+            'pressure': fields['pressure']
+        }
+
+    async def fetch_weather(self, key: str = CITY_CENTRE):
+        """Current weather at one monitored location (the city centre by default)"""
+        await self.ensure_fresh()
+        return self.lookup(key)
+
+    async def fetch_all(self, when: Optional[float] = None) -> Dict[str, Dict]:
+        """Weather at every monitored location, keyed like the snapshot (segments by their snapshot key)"""
+        await self.ensure_fresh()
+        return {location.key: self.lookup(location.key, when) for location in self.locations}
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
     def calculate_score(self, weather):
         """Convert weather to 0-100 score"""
         temp = weather['temperature']
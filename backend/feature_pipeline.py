@@ -0,0 +1,107 @@
+"""
+One definition of the air quality model's features, for training and serving.
+
+FEATURE_COLUMNS is what the model sees (MIDAS hourly weather columns and units).
+SOURCES says how to get each feature from a given kind of input: MIDAS
+observations are used as-is, while live Open-Meteo weather is renamed,
+converted to MIDAS units, and has its wet-bulb temperature derived.
+
+compile_pipeline(source) turns one source into a FeaturePipeline with two entry
+points that share the same NumPy kernel, so they produce identical bits:
+  - transform_frame(df):      batched, for training (pandas is imported only here)
+  - transform_record(record): one dict into a reused buffer, for serving
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Feature order the model is trained and served with
+FEATURE_COLUMNS = ["air_temperature", "dewpoint", "wetb_temp", "rltv_hum", "wind_speed",
+                   "wind_direction", "visibility", "stn_pres"]
+
+KMH_PER_KNOT = 1.852
+METRES_PER_DECAMETRE = 10
+
+
+class Step(NamedTuple):
+    inputs: Tuple[str, ...]
+    fn: Optional[Callable] = None  # Elementwise NumPy function of the input columns; None copies the one input
+
+
+def wet_bulb(temp_c, rh):
+    """Stull (2011) wet-bulb temperature from air temperature (°C) and relative humidity (%)."""
+    return (temp_c * np.arctan(0.151977 * np.sqrt(rh + 8.313659))
+            + np.arctan(temp_c + rh) - np.arctan(rh - 1.676331)
+            + 0.00391838 * rh ** 1.5 * np.arctan(0.023101 * rh) - 4.686035)
+
+
+SOURCES: Dict[str, Dict[str, Step]] = {
+    # MIDAS-Open hourly observations (or daily means of them): already in model units
+    "midas": {name: Step((name,)) for name in FEATURE_COLUMNS},
+    # WeatherFetcher.fetch_weather() output
+    "open_meteo": {
+        "air_temperature": Step(("temperature",)),
+        "dewpoint": Step(("dewpoint",)),
+        "wetb_temp": Step(("temperature", "humidity"), wet_bulb),
+        "rltv_hum": Step(("humidity",)),
+        "wind_speed": Step(("wind_speed",), lambda kmh: kmh / KMH_PER_KNOT),     # MIDAS wind speed is in knots
+        "wind_direction": Step(("wind_direction",)),
+        "visibility": Step(("visibility",), lambda m: m / METRES_PER_DECAMETRE),  # MIDAS visibility is in decametres
+        "stn_pres": Step(("pressure",)),
+    },
+}
+
+
+class FeaturePipeline:
+    """A source's steps compiled against column indexes. Build with compile_pipeline()."""
+
+    def __init__(self, source: str, steps: Dict[str, Step]):
+        self.source = source
+        self.input_fields: List[str] = list(dict.fromkeys(f for name in FEATURE_COLUMNS for f in steps[name].inputs))
+        index = {field: i for i, field in enumerate(self.input_fields)}
+        # Plain copies are done in one fancy-indexed assignment; only derived features need a call each
+        copies = [(i, index[steps[name].inputs[0]]) for i, name in enumerate(FEATURE_COLUMNS) if steps[name].fn is None]
+        self._copy_out = np.array([i for i, _ in copies], dtype=np.intp)
+        self._copy_in = np.array([j for _, j in copies], dtype=np.intp)
+        self._derived = [(i, tuple(index[f] for f in steps[name].inputs), steps[name].fn)
+                         for i, name in enumerate(FEATURE_COLUMNS) if steps[name].fn is not None]
+        # Reused by transform_record
+        self._raw = np.empty((1, len(self.input_fields)))
+        self._row = np.empty((1, len(FEATURE_COLUMNS)))
+
+    def transform(self, raw: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """(n, len(input_fields)) float64 inputs -> (n, len(FEATURE_COLUMNS)) features. Both paths end up here."""
+        if out is None:
+            out = np.empty((len(raw), len(FEATURE_COLUMNS)))
+        out[:, self._copy_out] = raw[:, self._copy_in]
+        for i, inputs, fn in self._derived:
+            out[:, i] = fn(*(raw[:, j] for j in inputs))
+        return out
+
+    def transform_frame(self, frame):
+        """Training path: a DataFrame with the source's input columns -> a DataFrame of FEATURE_COLUMNS."""
+        import pandas as pd
+
+        missing = [f for f in self.input_fields if f not in frame.columns]
+        if missing:
+            raise KeyError(f"{self.source} data is missing columns: {missing}")
+        raw = frame[self.input_fields].to_numpy(dtype=np.float64)
+        return pd.DataFrame(self.transform(raw), columns=FEATURE_COLUMNS, index=frame.index)
+
+    def transform_record(self, record: Dict) -> Optional[np.ndarray]:
+        """
+        Serving path: one input dict -> feature vector, or None if a field is missing.
+        The result is a view of an internal buffer that the next call overwrites.
+        """
+        raw = self._raw[0]
+        try:
+            for i, field in enumerate(self.input_fields):
+                raw[i] = float(record[field])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return self.transform(self._raw, out=self._row)[0]
+
+
+def compile_pipeline(source: str) -> FeaturePipeline:
+    return FeaturePipeline(source, SOURCES[source])
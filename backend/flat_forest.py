@@ -0,0 +1,151 @@
+"""
+Flat-array export of tree ensembles, and a matching vectorized predictor.
+Every tree's nodes go into shared contiguous arrays (feature, threshold,
+children, value) saved as .npy files, which the server memory-maps at startup
+instead of unpickling hundreds of sklearn objects.
+
+Convert an existing pickle with:
+    python flat_forest.py data_analysis/air_quality_model.pkl
+"""
+
+import json
+import os
+import shutil
+import sys
+from typing import List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+_ARRAYS = ("feature", "threshold", "left", "right", "missing_left", "value", "roots")
+
+
+def export_forest(model, path: str, feature_names: Optional[List[str]] = None) -> str:
+    """
+    Writes a fitted forest regressor (e.g. RandomForestRegressor) to the directory `path`.
+
+    Leaves point their children at themselves with an infinite threshold, so
+    prediction can walk every tree a fixed number of steps without any masking.
+    """
+    features, thresholds, lefts, rights, missing_lefts, values, roots = [], [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        index = np.arange(tree.node_count) + offset
+        leaf = tree.children_left == -1
+        features.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold).astype(np.float64))
+        lefts.append(np.where(leaf, index, tree.children_left + offset).astype(np.int32))
+        rights.append(np.where(leaf, index, tree.children_right + offset).astype(np.int32))
+        # Where NaN inputs go at each split (sklearn >= 1.3); older trees send them right
+        missing = getattr(tree, "missing_go_to_left", None)
+        missing_lefts.append(np.zeros(tree.node_count, dtype=bool) if missing is None else np.asarray(missing, dtype=bool))
+        values.append(tree.value[:, 0, 0].astype(np.float64))
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    if feature_names is None and hasattr(model, "feature_names_in_"):
+        feature_names = [str(name) for name in model.feature_names_in_]
+
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "missing_left": np.concatenate(missing_lefts),
+        "value": np.concatenate(values),
+        "roots": np.array(roots, dtype=np.int32),
+    }
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "n_trees": len(roots),
+        "n_nodes": offset,
+        "n_features": int(model.n_features_in_),
+        "max_depth": int(max_depth),
+        "feature_names": feature_names,
+    }
+
+    # Write next to the target, then swap in, so a reader never sees half a model
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class FlatForest:
+    """Memory-mapped flat forest; `predict` matches the sklearn model it was exported from."""
+
+    def __init__(self, arrays: dict, meta: dict):
+        self.meta = meta
+        self.n_trees = meta["n_trees"]
+        self.n_features = meta["n_features"]
+        self.max_depth = meta["max_depth"]
+        self.feature_names = meta.get("feature_names")
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.missing_left = arrays["missing_left"]
+        self.value = arrays["value"]
+        self.roots = np.asarray(arrays["roots"], dtype=np.intp)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "FlatForest":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported flat forest format: {meta.get('format_version')}")
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in _ARRAYS}
+        return cls(arrays, meta)
+
+    def predict(self, X) -> np.ndarray:
+        """Mean of all trees' leaf values for each row of X."""
+        # sklearn splits on float32 inputs, so round the same way before comparing
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.missing_left[node], x <= self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        # cumsum adds the trees in order, exactly like sklearn's running total
+        return np.cumsum(self.value[node], axis=1)[:, -1] / self.n_trees
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python flat_forest.py <model.pkl> [output_dir]")
+        sys.exit(1)
+
+    import joblib
+
+    pkl_path = sys.argv[1]
+    out_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(pkl_path)[0] + ".forest"
+    model = joblib.load(pkl_path)
+    export_forest(model, out_path)
+
+    # Check the export reproduces the original on random inputs around the split points
+    flat = FlatForest.load(out_path)
+    rng = np.random.default_rng(0)
+    X = rng.choice(flat.threshold[np.isfinite(flat.threshold)], size=(1000, flat.n_features))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    max_diff = np.max(np.abs(flat.predict(X) - model.predict(X)))
+    print(f"📦 Exported {flat.n_trees} trees ({flat.meta['n_nodes']} nodes) to {out_path}; max |diff| = {max_diff:g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Background polling for OpenSky flights.
+
+OpenSky is slow (15 s timeout) and rationed, so flights are not fetched in the
+snapshot cycle. FlightPoller runs its own loop, spending tokens from a
+TokenBucket sized to the daily allowance, and keeps the latest result;
+fetch_all_data only reads it.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from config.settings import FLIGHT_BURST, FLIGHT_MAX_AGE, FLIGHT_MIN_INTERVAL, FLIGHT_REQUESTS_PER_DAY
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class FlightPoller:
+    def __init__(self, fetch: Callable[[], Awaitable[Optional[Dict]]],
+                 requests_per_day: float = FLIGHT_REQUESTS_PER_DAY, burst: float = FLIGHT_BURST,
+                 min_interval: float = FLIGHT_MIN_INTERVAL, max_age: float = FLIGHT_MAX_AGE):
+        self.fetch = fetch  # Returns the snapshot entry, or None if the poll failed
+        self.bucket = TokenBucket(requests_per_day / (24 * 60 * 60), burst)
+        self.min_interval = min_interval
+        self.max_age = max_age
+        self._latest: Optional[Dict] = None
+        self._latest_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            await self.bucket.acquire()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error("❌ Flight polling failed: %s", e)
+            await asyncio.sleep(self.min_interval)
+
+    async def poll_once(self) -> Optional[Dict]:
+        result = await self.fetch()
+        if result is not None:
+            self._latest, self._latest_at = result, time.monotonic()
+        return result
+
+    @property
+    def latest(self) -> Optional[Dict]:
+        """The last successful poll, unless it is older than max_age."""
+        if self._latest is None or time.monotonic() - self._latest_at > self.max_age:
+            return None
+        return self._latest
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
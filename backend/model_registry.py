@@ -0,0 +1,109 @@
+"""
+Versioned on-disk registry for trained air quality models.
+
+    data_analysis/models/
+        v0001/  model.pkl, model.forest/ (forests only), meta.json
+        v0002/  ...
+        CURRENT     <- name of the promoted version
+        runs/       <- one JSON report per search run, covering every candidate
+
+Versions are never modified once written; promoting one just rewrites the
+CURRENT pointer (atomically), so the server can always follow it.
+"""
+
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+from typing import Dict, List, Optional
+
+REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_analysis", "models")
+
+_VERSION_RE = re.compile(r"^v(\d{4,})$")
+
+
+class ModelRegistry:
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+
+    # ---------- versions ----------
+
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted((name for name in os.listdir(self.root) if _VERSION_RE.match(name)),
+                      key=lambda name: int(name[1:]))
+
+    def path(self, version: str) -> str:
+        return os.path.join(self.root, version)
+
+    def metadata(self, version: str) -> Dict:
+        with open(os.path.join(self.path(version), "meta.json")) as f:
+            return json.load(f)
+
+    def _allocate(self) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        versions = self.versions()
+        number = int(versions[-1][1:]) + 1 if versions else 1
+        while True:
+            version = f"v{number:04d}"
+            try:
+                os.mkdir(self.path(version))  # Atomic, so concurrent runs never share a version
+                return version
+            except FileExistsError:
+                number += 1
+
+    def register(self, model, metadata: Dict, feature_names: List[str]) -> str:
+        """Stores a fitted model with its metadata and returns the new version name."""
+        import joblib
+        from flat_forest import export_forest
+
+        version = self._allocate()
+        path = self.path(version)
+        try:
+            joblib.dump(model, os.path.join(path, "model.pkl"))
+            # Forests also get the flat memory-mapped copy the server prefers
+            if hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in model.estimators_):
+                export_forest(model, os.path.join(path, "model.forest"), feature_names=feature_names)
+            meta = dict(metadata, version=version, feature_names=list(feature_names),
+                        registered_at=datetime.now().isoformat())
+            with open(os.path.join(path, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        return version
+
+    # ---------- promotion ----------
+
+    def current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, "CURRENT")) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version if os.path.isdir(self.path(version)) else None
+
+    def promote(self, version: str):
+        if not os.path.isfile(os.path.join(self.path(version), "meta.json")):
+            raise ValueError(f"Unknown model version: {version}")
+        tmp_path = os.path.join(self.root, "CURRENT.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp_path, os.path.join(self.root, "CURRENT"))
+
+    def artifact(self, version: str) -> str:
+        """Path the server should load for `version`: the flat forest if there is one, else the pickle."""
+        flat_path = os.path.join(self.path(version), "model.forest")
+        return flat_path if os.path.isdir(flat_path) else os.path.join(self.path(version), "model.pkl")
+
+    # ---------- search runs ----------
+
+    def record_run(self, report: Dict) -> str:
+        runs_dir = os.path.join(self.root, "runs")
+        os.makedirs(runs_dir, exist_ok=True)
+        path = os.path.join(runs_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        return path
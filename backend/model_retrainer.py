@@ -0,0 +1,91 @@
+"""
+Scheduled background retraining for the air quality model.
+Each run happens in its own worker process (data_analysis/retrain.py), so the
+event loop only ever awaits a future. When a new version is promoted, the
+AirQualityPredictor loads it off-loop and swaps it in between batches.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from config.logging_config import setup_worker_logging, worker_log_queue
+from config.settings import (
+    AIR_QUALITY_RETRAIN_INTERVAL,
+    AIR_QUALITY_RETRAIN_POLLUTANT,
+    AIR_QUALITY_RETRAIN_STATIONS,
+    AIR_QUALITY_RETRAIN_WEATHER,
+)
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_ANALYSIS_DIR = os.path.join(BACKEND_DIR, "data_analysis")
+
+
+def _run_retrain(weather, stations, pollutant, registry_root) -> Dict:
+    """Runs in the worker process; the training stack is only imported there."""
+    sys.path.insert(0, DATA_ANALYSIS_DIR)
+    from retrain import retrain
+    # Already in a worker process, so ingestion runs here rather than in a pool of its own
+    return retrain(weather, stations, pollutant, registry_root=registry_root, workers=1)
+
+
+class ModelRetrainer:
+    def __init__(self, predictor, interval: Optional[float] = AIR_QUALITY_RETRAIN_INTERVAL,
+                 weather=AIR_QUALITY_RETRAIN_WEATHER, stations=AIR_QUALITY_RETRAIN_STATIONS,
+                 pollutant=AIR_QUALITY_RETRAIN_POLLUTANT):
+        self.predictor = predictor
+        self.interval = interval
+        self.weather = [os.path.join(BACKEND_DIR, pattern) for pattern in weather]
+        self.stations = list(stations)
+        self.pollutant = [os.path.join(BACKEND_DIR, pattern) for pattern in pollutant]
+        self.last_report: Optional[Dict] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.retrain_once()
+            except Exception as e:
+                logger.error("❌ Air quality retraining failed: %s", e)
+
+    async def retrain_once(self) -> Dict:
+        """Retrains in a fresh worker process, then hot-swaps the model if a new version was promoted."""
+        logger.info("🧠 Retraining air quality model...")
+        loop = asyncio.get_running_loop()
+        # A new process per run, so the training memory is handed back afterwards
+        self._executor = ProcessPoolExecutor(max_workers=1, initializer=setup_worker_logging,
+                                             initargs=(worker_log_queue(),))
+        try:
+            report = await loop.run_in_executor(self._executor, _run_retrain, self.weather, self.stations,
+                                                self.pollutant, self.predictor.registry.root)
+        finally:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.last_report = report
+        if report["skipped"]:
+            logger.info("🧠 Skipped retraining: %s", report["rejection"])
+            return report
+        logger.info("🧠 Retrained %s: promoted=%s (%s)", report["version"], report["promoted"],
+                    report["rejection"] or f"holdout MAE {report['holdout_mae']:.3f}")
+
+        if self.predictor.registry.current() != self.predictor.model_version:
+            await self.predictor.reload()
+        return report
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
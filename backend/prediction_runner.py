@@ -0,0 +1,62 @@
+"""
+Runs the prediction engine off the event loop.
+The aggregator hands over a projected private copy of each snapshot and gets the
+predictions and forecasts back, so a slow cycle never holds up /ws delivery.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional
+
+import predictor_engine
+from config.logging_config import setup_worker_logging, worker_log_queue
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_MODES = ("inline", "thread", "process")
+
+
+class PredictionRunner:
+    """
+    Executes predictor_engine cycles in one of three modes:
+      - "inline":  on the calling (event loop) thread, as before
+      - "thread":  on a single dedicated worker thread
+      - "process": in a single worker process, which then owns the engine's state
+    There is exactly one worker, so cycles stay strictly ordered.
+    """
+
+    def __init__(self, mode: str = "thread"):
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown prediction execution mode: {mode!r}")
+        self.mode = mode
+        self._executor: Optional[Executor] = None
+        # Latest payloads; in process mode the engine's own state lives in the worker
+        self.latest: Dict = predictor_engine.get_live_predictions_and_stats()
+        self.latest_forecast: Dict = predictor_engine.get_traffic_forecast()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predictor")
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=1, initializer=setup_worker_logging,
+                                                     initargs=(worker_log_queue(),))
+        return self._executor
+
+    async def run(self, snapshot: Dict) -> Dict:
+        """Runs one cycle on `snapshot` and returns the predictions/stats payload."""
+        handoff = predictor_engine.project_snapshot(snapshot)
+        if self.mode == "inline":
+            report = predictor_engine.run_cycle_and_report(handoff)
+        else:
+            loop = asyncio.get_running_loop()
+            report = await loop.run_in_executor(self._get_executor(), predictor_engine.run_cycle_and_report, handoff)
+        self.latest = report["predictions"]
+        self.latest_forecast = report["traffic_forecast"]
+        return self.latest
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
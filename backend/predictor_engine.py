@@ -1,99 +1,316 @@
 # In predictor_engine.py
 
 from datetime import datetime, timezone, timedelta
-from collections import deque
+import logging
 import uuid
-from statistics import mean, stdev
+
+from rolling_stats import MetricHistory, RollingMedianMAD
+from traffic_forecast import TrafficForecaster
+
+logger = logging.getLogger(__name__)
 
 # --- State Management for our Engine ---
 _predictions: dict[str, dict] = {}
 _stats = {"total_validated": 0, "total_correct": 0}
-
-# This is our "live historical model". It will store the last ~hour of traffic scores.
-_historical_traffic_scores: dict[str, deque] = {}
+# The same counts split by detector name, e.g. {"traffic": {"total_validated": 3, "total_correct": 2}}
+_detector_stats: dict[str, dict] = {}
 
 # --- Prediction Model Configuration ---
-HISTORY_LENGTH = 120 # Store 60 minutes of data (120 readings at 30s intervals)
+HISTORY_LENGTH = 120 # Readings kept per metric: 60 minutes at one per 30s cycle
+HISTORY_SECONDS = 60 * 60 # Baselines cover the last hour, however often a metric is read
 PREDICTION_WINDOW_MINUTES = 10
 ANOMALY_THRESHOLD_STD_DEV = 2 # Trigger if traffic is 2 standard deviations from the mean
 
 MIN_STD_DEV_TO_PREDICT = 1.0
+VALIDATION_GRACE = timedelta(minutes=15) # How long a due prediction waits for a fresh reading
+
+# Baseline statistics per detector:
+#   "mean"   - rolling mean and standard deviation
+#   "robust" - rolling median and MAD (scaled to a std dev), which road closures
+#              (score 0) can't drag around the way they drag the mean
+DETECTOR_BASELINES = {"traffic": "mean"}
+
+# This is our "live historical model": the last ~hour of every watched metric,
+# one row per (snapshot key, field), shared by all detectors.
+_history = MetricHistory(HISTORY_LENGTH, max_age=HISTORY_SECONDS)
+
+# snapshot key -> [(detector, history row)], worked out the first time a key is seen
+_routes: dict[str, list] = {}
+# Short-term score forecasts for each traffic segment, fed from the same readings
+_traffic_forecaster = TrafficForecaster()
+
+# snapshot key -> fields any detector reads from it, used to build handoff copies
+_projected_fields: dict[str, tuple] = {}
 
 
 _cycle_counter = 0
 
+# Source of "now" for the engine. The backtest harness swaps in a virtual clock.
+_clock = lambda: datetime.now(timezone.utc)
+
+
+def set_clock(clock=None):
+    """Use `clock()` (returning an aware datetime) as the engine's time source; None restores wall time."""
+    global _clock
+    _clock = clock if clock is not None else (lambda: datetime.now(timezone.utc))
+
+
+# ==================== DETECTORS ====================
+
+class Detector:
+    """
+    One anomaly detector.
+    Declares the snapshot field it consumes (from which keys), which direction is
+    anomalous, its baseline state and how its predictions are validated.
+    """
+
+    def __init__(self, name: str, event_type: str, field: str, keys=(), key_contains: str | None = None,
+                 direction: str = "low", label: str | None = None,
+                 text_template: str = "Potential {severity} Anomaly in {label}",
+                 target_template: str = "Value to remain {relation} {threshold:.0f}",
+                 threshold_std_dev: float | None = None, min_std_dev: float | None = None):
+        self.name = name
+        self.event_type = event_type
+        self.field = field
+        self.keys = set(keys)
+        self.key_contains = key_contains
+        self.direction = direction  # "low" = a drop is anomalous, "high" = a spike is
+        self.label = label
+        self.text_template = text_template
+        self.target_template = target_template
+        # None = follow the module-wide setting, so backtest sweeps still apply
+        self.threshold_std_dev = threshold_std_dev
+        self.min_std_dev = min_std_dev
+        # Sorted windows, only kept while this detector uses the robust baseline
+        self.robust_windows: dict[str, RollingMedianMAD] = {}
+
+    def matches(self, key: str) -> bool:
+        return key in self.keys or (self.key_contains is not None and self.key_contains in key)
+
+    @property
+    def baseline_method(self) -> str:
+        return DETECTOR_BASELINES.get(self.name, "mean")
+
+    @property
+    def trigger_std_devs(self) -> float:
+        return ANOMALY_THRESHOLD_STD_DEV if self.threshold_std_dev is None else self.threshold_std_dev
+
+    @property
+    def min_spread(self) -> float:
+        return MIN_STD_DEV_TO_PREDICT if self.min_std_dev is None else self.min_std_dev
+
+    def display_name(self, key: str) -> str:
+        if self.label:
+            return self.label
+        return key.replace(f'_{self.key_contains}', '').replace('_', ' ').title()
+
+    def push_robust(self, key: str, value: float, now: float):
+        if key not in self.robust_windows:
+            self.robust_windows[key] = RollingMedianMAD(HISTORY_LENGTH, max_age=HISTORY_SECONDS)
+        self.robust_windows[key].push(value, now)
+
+    def robust_baseline(self, key: str, now: float) -> (float | None, float | None):
+        """Median and MAD-based spread, read straight off the sorted window."""
+        window = self.robust_windows.get(key)
+        if window is not None:
+            window.expire(now)
+        if window is None or len(window) <= 10:
+            return None, None
+        return window.median(), window.robust_std_dev()
+
+    def std_devs_away(self, value: float, avg: float, std_dev: float) -> float:
+        """How far `value` sits from the baseline in the anomalous direction."""
+        if std_dev <= 0:
+            return 0
+        return (avg - value) / std_dev if self.direction == "low" else (value - avg) / std_dev
+
+    def trigger_threshold(self, avg: float, std_dev: float) -> float:
+        offset = self.trigger_std_devs * std_dev
+        return avg - offset if self.direction == "low" else avg + offset
+
+    def validation_threshold(self, avg: float, std_dev: float) -> float:
+        return avg - std_dev if self.direction == "low" else avg + std_dev
+
+    def is_beyond(self, value: float, threshold: float) -> bool:
+        return value < threshold if self.direction == "low" else value > threshold
+
+    def validate(self, prediction: dict, agg_data: dict) -> str:
+        """Validates if the metric stayed on the anomalous side of the validation threshold."""
+        location_key = prediction['validation_data']['location_key']
+        validation_threshold = prediction['validation_data']['validation_threshold']
+
+        final_value = (agg_data.get(location_key) or {}).get(self.field)
+
+        if final_value is None:
+            return "incorrect" # Can't validate if data is missing
+
+        relation = "<" if self.direction == "low" else ">"
+        logger.info("VALIDATION: %s. Target was %s %.1f. Actual was %.1f.",
+                    location_key, relation, validation_threshold, final_value)
+
+        return "correct" if self.is_beyond(final_value, validation_threshold) else "incorrect"
+
+    def reset(self):
+        self.robust_windows.clear()
+
+
+DETECTORS: dict[str, Detector] = {}
+
+
+def register_detector(detector: Detector):
+    """Adds (or replaces) a detector; snapshot keys are re-routed on the next cycle."""
+    DETECTORS[detector.name] = detector
+    _routes.clear()
+    _projected_fields.clear()
+
+
+register_detector(Detector(
+    "traffic", "TRAFFIC_CONGESTION_EVENT", "score", key_contains="traffic",
+    text_template="Potential {severity} Congestion on {label}",
+    target_template="Score to remain {relation} {threshold:.0f}",
+))
+register_detector(Detector(
+    "carbon_intensity", "CARBON_INTENSITY_SPIKE", "carbon_intensity", keys=["energy"],
+    direction="high", label="the GB Grid", min_std_dev=5.0,
+    text_template="Potential {severity} Carbon Intensity Spike on {label}",
+    target_template="Carbon intensity to remain {relation} {threshold:.0f} gCO2/kWh",
+))
+register_detector(Detector(
+    "weather", "WEATHER_DETERIORATION_EVENT", "score", keys=["weather"],
+    label="Edinburgh",
+    text_template="Potential {severity} Weather Deterioration in {label}",
+    target_template="Weather score to remain {relation} {threshold:.0f}",
+))
+register_detector(Detector(
+    "vehicle_count", "TRANSPORT_SERVICE_DROP", "vehicle_count", keys=["live_transport"],
+    label="Live Buses and Trams", min_std_dev=5.0,
+    text_template="Potential {severity} Drop in {label}",
+    target_template="Vehicle count to remain {relation} {threshold:.0f}",
+))
+register_detector(Detector(
+    "flights", "FLIGHT_ACTIVITY_SURGE", "total_in_air", keys=["flights"],
+    direction="high", label="Edinburgh Airport",
+    text_template="Potential {severity} Surge in Flights around {label}",
+    target_template="Aircraft in the air to remain {relation} {threshold:.0f}",
+))
+
 
-def _calculate_dynamic_confidence(current_score: float, avg: float, std_dev: float) -> float:
+def reset_state():
+    """Forgets all history, predictions and stats (used between backtest runs)."""
+    global _cycle_counter
+    _predictions.clear()
+    _stats["total_validated"] = 0
+    _stats["total_correct"] = 0
+    _detector_stats.clear()
+    _history.clear()
+    _routes.clear()
+    _projected_fields.clear()
+    _traffic_forecaster.reset()
+    for detector in DETECTORS.values():
+        detector.reset()
+    _cycle_counter = 0
+
+
+# ==================== ENGINE ====================
+
+def _calculate_dynamic_confidence(num_std_devs_away: float, trigger_std_devs: float) -> float:
     """Calculates a confidence score based on the severity of the anomaly."""
-    if std_dev == 0:
+    if num_std_devs_away == 0:
         return 50.0 # Default confidence if there's no variation
 
-    num_std_devs_away = (avg - current_score) / std_dev
-    
     # Start with a base confidence at our trigger threshold
     base_confidence = 60.0
-    
+
     # Add confidence for every standard deviation beyond the trigger
     # This formula adds ~15 points for each extra standard deviation of severity
-    extra_confidence = (num_std_devs_away - ANOMALY_THRESHOLD_STD_DEV) * 15.0
-    
+    extra_confidence = (num_std_devs_away - trigger_std_devs) * 15.0
+
     confidence = base_confidence + extra_confidence
-    
+
     # Clamp the value between 50% and 99% for realism
     return max(50.0, min(99.0, confidence))
 
 
+def _route(key: str) -> list:
+    routes = [(detector, _history.row((key, detector.field)))
+              for detector in DETECTORS.values() if detector.matches(key)]
+    _routes[key] = routes
+    return routes
 
-def _update_historical_data(agg_data: dict):
-    """Updates our live in-memory historical model with the latest traffic scores."""
+
+def _update_historical_data(agg_data: dict) -> list:
+    """
+    Single pass over the snapshot: pulls every watched field into the shared history.
+    Returns this cycle's readings as (detector, snapshot key, history row, value).
+    """
+    readings = []
+    latest = {}  # history row -> value; detectors sharing a metric share a row
+    now = _clock().timestamp()
+    _history.expire(now)
     for key, value in agg_data.items():
-        if "traffic" in key and isinstance(value, dict) and "score" in value:
-            if key not in _historical_traffic_scores:
-                _historical_traffic_scores[key] = deque(maxlen=HISTORY_LENGTH)
-            _historical_traffic_scores[key].append(value['score'])
-
-def _get_historical_average(location_key: str) -> (float | None, float | None):
-    if location_key in _historical_traffic_scores and len(_historical_traffic_scores[location_key]) > 10:
-        scores = list(_historical_traffic_scores[location_key])
-        # stdev requires at least 2 points. This prevents a rare crash.
-        if len(scores) < 2:
-            return mean(scores), 0.0
-        return mean(scores), stdev(scores)
-    return None, None
-
-def generate_traffic_anomaly_prediction(agg_data: dict) -> dict | None:
+        routes = _routes.get(key)
+        if routes is None:
+            routes = _route(key)
+        if not routes or not isinstance(value, dict):
+            continue
+        for detector, row in routes:
+            reading = value.get(detector.field)
+            if isinstance(reading, bool) or not isinstance(reading, (int, float)):
+                continue
+            latest[row] = reading
+            readings.append((detector, key, row, reading))
+            if detector.baseline_method == "robust":
+                detector.push_robust(key, reading, now)
+    _history.push(list(latest), list(latest.values()), now)
+    return readings
+
+
+def generate_anomaly_predictions(readings: list) -> list:
+    """Checks this cycle's readings against their baselines; at most one new prediction per detector."""
     global _cycle_counter
     # (Debug logging is unchanged)
-    if _cycle_counter % 4 == 0:
-        print(f"\n----- PREDICTION ENGINE STATUS (Cycle #{_cycle_counter}) -----")
-        for loc, hist in _historical_traffic_scores.items():
-            road_name = loc.replace('_traffic', '').replace('_', ' ').title()
-            print(f"  - {road_name}: Stored {len(hist)} historical readings.")
-        print("--------------------------------------------------\n")
-
-    for location_key, traffic_data in agg_data.items():
-        if "traffic" not in location_key or not isinstance(traffic_data, dict): continue
-        current_score = traffic_data.get('score')
-        if current_score is None: continue
-            
-        avg, std_dev = _get_historical_average(location_key)
-
-        road_name_debug = location_key.replace('_traffic', '').replace('_',' ').title()
+    if _cycle_counter % 4 == 0 and logger.isEnabledFor(logging.DEBUG):
+        lines = [f"  - {key.replace('_traffic', '').replace('_', ' ').title()} ({field}): "
+                 f"Stored {_history.count((key, field))} historical readings."
+                 for key, field in _history.metric_ids()]
+        logger.debug("PREDICTION ENGINE STATUS (Cycle #%d)\n%s", _cycle_counter, "\n".join(lines))
+
+    # Baselines for every metric in one vectorized pass
+    means, std_devs, counts = _history.mean_std()
+    now = _clock().timestamp()
+    active = {(p['validation_data'].get('detector', 'traffic'), p['validation_data']['location_key'])
+              for p in _predictions.values() if p['status'] == 'active'}
+
+    new_predictions = []
+    fired = set()
+    for detector, location_key, row, current_value in readings:
+        if detector.name in fired:
+            continue
+
+        if detector.baseline_method == "robust":
+            avg, std_dev = detector.robust_baseline(location_key, now)
+        elif counts[row] > 10:
+            avg, std_dev = float(means[row]), float(std_devs[row])
+        else:
+            avg, std_dev = None, None
+
+        name_debug = detector.display_name(location_key)
         if avg is None or std_dev is None:
-            if _cycle_counter % 4 == 0: print(f"DEBUG [{road_name_debug}]: Waiting for more historical data...")
+            if _cycle_counter % 4 == 0: logger.debug("[%s] Waiting for more historical data...", name_debug)
             continue
-        
-        anomaly_threshold_value = avg - (ANOMALY_THRESHOLD_STD_DEV * std_dev)
-        if _cycle_counter % 2 == 0: print(f"DEBUG [{road_name_debug}]: Current={current_score:.1f} | Avg={avg:.1f} | StdDev={std_dev:.1f} | Trigger Threshold: < {anomaly_threshold_value:.1f}")
-
-        if std_dev < MIN_STD_DEV_TO_PREDICT: continue
-
-        if current_score < anomaly_threshold_value:
-            if any(p['validation_data']['location_key'] == location_key for p in _predictions.values() if p['status'] == 'active'): continue
-            
-            num_std_devs_away = (avg - current_score) / std_dev if std_dev > 0 else 0
-            
-            
+
+        anomaly_threshold_value = detector.trigger_threshold(avg, std_dev)
+        relation = "<" if detector.direction == "low" else ">"
+        if _cycle_counter % 2 == 0: logger.debug("[%s] Current=%.1f | Avg=%.1f | StdDev=%.1f | Trigger Threshold: %s %.1f",
+                                                 name_debug, current_value, avg, std_dev, relation, anomaly_threshold_value)
+
+        if std_dev < detector.min_spread: continue
+
+        if detector.is_beyond(current_value, anomaly_threshold_value):
+            if (detector.name, location_key) in active: continue
+
+            num_std_devs_away = detector.std_devs_away(current_value, avg, std_dev)
+
             # 1. Classify Severity and set duration
             if num_std_devs_away > 3.5:
                 severity = "Major"
@@ -103,75 +320,118 @@ def generate_traffic_anomaly_prediction(agg_data: dict) -> dict | None:
                 predicted_duration_mins = 15
 
             # 2. Calculate the dynamic confidence score independently
-            confidence = _calculate_dynamic_confidence(current_score, avg, std_dev)
-            
-            road_name = location_key.replace('_traffic', '').replace('_', ' ').title()
-            
-            return {
-                "id": f"traffic-anomaly-{uuid.uuid4()}",
-                "type": "TRAFFIC_CONGESTION_EVENT",
+            confidence = _calculate_dynamic_confidence(num_std_devs_away, detector.trigger_std_devs)
+
+            validation_threshold = detector.validation_threshold(avg, std_dev)
+            now_utc = _clock()
+            new_predictions.append({
+                "id": f"{detector.name}-anomaly-{uuid.uuid4()}",
+                "type": detector.event_type,
                 "status": "active",
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "validate_at": (datetime.now(timezone.utc) + timedelta(minutes=predicted_duration_mins)).isoformat(),
-                "prediction_text": f"Potential {severity} Congestion on {road_name}",
+                "created_at": now_utc.isoformat(),
+                "validate_at": (now_utc + timedelta(minutes=predicted_duration_mins)).isoformat(),
+                "prediction_text": detector.text_template.format(severity=severity, label=detector.display_name(location_key)),
                 "confidence": round(confidence), # DYNAMIC value
                 "severity": severity,           # "Minor" or "Major"
                 "predicted_duration_mins": predicted_duration_mins,
-                "target_value": f"Score to remain below {avg - std_dev:.0f}",
-                "validation_data": { "location_key": location_key, "triggering_score": current_score, "historical_avg_at_prediction": avg, "validation_threshold": avg - std_dev }
-            }
-    return None
-
-def validate_traffic_anomaly_prediction(prediction: dict, agg_data: dict) -> str:
-    """Validates if the traffic score remained low."""
-    location_key = prediction['validation_data']['location_key']
-    validation_threshold = prediction['validation_data']['validation_threshold']
-    
-    final_score = agg_data.get(location_key, {}).get('score')
-    
-    if final_score is None:
-        return "incorrect" # Can't validate if data is missing
-
-    print(f"VALIDATION: {location_key}. Target was < {validation_threshold:.1f}. Actual was {final_score:.1f}.")
-
-    if final_score < validation_threshold:
-        return "correct"
-    else:
-        return "incorrect"
+                "target_value": detector.target_template.format(
+                    relation="below" if detector.direction == "low" else "above", threshold=validation_threshold),
+                "validation_data": { "detector": detector.name, "location_key": location_key, "field": detector.field, "triggering_score": current_value, "historical_avg_at_prediction": avg, "validation_threshold": validation_threshold }
+            })
+            fired.add(detector.name)
+    return new_predictions
+
+def validate_prediction(prediction: dict, agg_data: dict) -> str:
+    """Hands a finished prediction to the detector that made it."""
+    detector = DETECTORS.get(prediction['validation_data'].get('detector', 'traffic'))
+    if detector is None:
+        return "incorrect" # Detector was unregistered since
+    return detector.validate(prediction, agg_data)
 
 def run_prediction_cycle(agg_data: dict):
-    """The main loop: update history, validate old, generate new."""
-    _update_historical_data(agg_data)
+    """The main loop: update history, validate old, generate new. Returns the new predictions."""
+    global _cycle_counter
+    readings = _update_historical_data(agg_data)
+    _traffic_forecaster.update(
+        {key: value for detector, key, row, value in readings if detector.name == "traffic"}, _clock())
 
     # 1. Validate finished predictions
-    now_utc = datetime.now(timezone.utc)
+    now_utc = _clock()
     for pred in list(_predictions.values()): # Use list to allow modification during iteration
         if pred['status'] == 'active' and datetime.fromisoformat(pred['validate_at']) <= now_utc:
-            result = validate_traffic_anomaly_prediction(pred, agg_data)
+            # Wait a while for a fresh reading rather than score the prediction on nothing
+            if (not agg_data.get(pred['validation_data']['location_key'])
+                    and datetime.fromisoformat(pred['validate_at']) + VALIDATION_GRACE > now_utc):
+                continue
+            result = validate_prediction(pred, agg_data)
             pred['status'] = result # Update status
-            _stats['total_validated'] += 1
-            if result == 'correct':
-                _stats['total_correct'] += 1
+            detector_stats = _detector_stats.setdefault(
+                pred['validation_data'].get('detector', 'traffic'), {"total_validated": 0, "total_correct": 0})
+            for counts in (_stats, detector_stats):
+                counts['total_validated'] += 1
+                if result == 'correct':
+                    counts['total_correct'] += 1
+            # Only active predictions are ever served, and the outcome now lives in
+            # _stats, so drop it rather than let the dict grow for the server's lifetime.
+            del _predictions[pred['id']]
 
     # 2. Generate new predictions
-    if len([p for p in _predictions.values() if p['status'] == 'active']) < 12:
-        new_prediction = generate_traffic_anomaly_prediction(agg_data)
-        if new_prediction:
-            print(f"Generated new prediction: {new_prediction['prediction_text']}")
+    new_predictions = []
+    open_slots = 12 - len([p for p in _predictions.values() if p['status'] == 'active'])
+    if open_slots > 0:
+        for new_prediction in generate_anomaly_predictions(readings)[:open_slots]:
+            logger.info("Generated new prediction: %s", new_prediction['prediction_text'])
             _predictions[new_prediction['id']] = new_prediction
+            new_predictions.append(new_prediction)
+    _cycle_counter += 1
+    return new_predictions
 
-def get_live_predictions_and_stats():
-    """Returns all data needed for the frontend dashboard."""
-    if _stats['total_validated'] == 0:
+def project_snapshot(agg_data: dict) -> dict:
+    """
+    Private copy of just the snapshot fields detectors read (plus the timestamp).
+    This is what gets handed to the engine when it runs off the event loop, so the
+    worker never shares mutable state with the aggregator. Entries marked stale
+    (a source's reused reading) are left out so the same value isn't learned twice.
+    """
+    projected = {'timestamp': agg_data.get('timestamp')}
+    for key, value in agg_data.items():
+        fields = _projected_fields.get(key)
+        if fields is None:
+            fields = _projected_fields[key] = tuple(
+                {detector.field for detector in DETECTORS.values() if detector.matches(key)})
+        if fields and isinstance(value, dict) and not value.get('stale'):
+            projected[key] = {field: value[field] for field in fields if field in value}
+    return projected
+
+def run_cycle_and_report(agg_data: dict) -> dict:
+    """One full cycle followed by everything it publishes; the unit of work for the prediction runner."""
+    run_prediction_cycle(agg_data)
+    return {
+        "predictions": get_live_predictions_and_stats(),
+        "traffic_forecast": get_traffic_forecast(),
+    }
+
+def get_traffic_forecast():
+    """Cached per-segment score forecasts for the next 15-60 minutes."""
+    return _traffic_forecaster.get_forecast()
+
+def _summarise_stats(counts: dict) -> dict:
+    if counts['total_validated'] == 0:
         accuracy = 100.0
     else:
-        accuracy = (_stats['total_correct'] / _stats['total_validated']) * 100
-        
+        accuracy = (counts['total_correct'] / counts['total_validated']) * 100
+    return {
+        "accuracy_percent": round(accuracy, 2),
+        "correct_count": counts['total_correct'],
+        "validated_count": counts['total_validated']
+    }
+
+def get_live_predictions_and_stats():
+    """Returns all data needed for the frontend dashboard."""
     return {
         "predictions": [p for p in _predictions.values() if p['status'] == 'active'],
         "stats": {
-            "accuracy_percent": round(accuracy, 2),
-            "correct_count": _stats['total_correct'],
-            "validated_count": _stats['total_validated']
+            **_summarise_stats(_stats),
+            "by_detector": {name: _summarise_stats(counts) for name, counts in _detector_stats.items()}
         }
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,109 @@
+"""
+Per-segment road risk index (0-100, higher = riskier).
+
+    risk = 100 * (BASELINE_WEIGHT * baseline + CONGESTION_WEIGHT * congestion + WEATHER_WEIGHT * weather)
+
+  - baseline:   share of GB collisions that were fatal or serious (RAS0301, adjusted) on roads
+                of the segment's class and speed limit (config/traffic_segments.json), over the
+                last BASELINE_YEARS, scaled so the worst road type is 1. Precomputed once into a
+                (road class x speed limit) lookup.
+  - congestion: 1 - current_speed / free_flow_speed (1 for a closed road); a reused (stale)
+                reading counts as no reading, so no risk is given until a fresh one arrives.
+  - weather:    1 - weather score / 100, at the segment where there is a reading
+                ('segment_weather'), otherwise city-wide.
+
+Each cycle gathers the live speeds into arrays and does the lookup join and
+the blend in a handful of vectorized operations, whatever the segment count.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config.traffic_segments import SEGMENT_ROAD_TYPES
+from road_safety import NOT_APPLICABLE, SUPPRESSED, RoadSafetyTable
+
+BASELINE_YEARS = 5
+BASELINE_WEIGHT = 0.5
+CONGESTION_WEIGHT = 0.3
+WEATHER_WEIGHT = 0.2
+
+DEFAULT_WEATHER_SCORE = 50
+
+
+def build_baseline_lookup(table: RoadSafetyTable, years: int = BASELINE_YEARS) -> np.ndarray:
+    """(road class, speed limit) -> FSC share of collisions, scaled to 0-1; NaN where RAS0301 has no row."""
+    records = table.records
+    recent = sorted(table.categories["year"])[-years:]
+    rows = np.isin(records["year"], [table.code("year", y) for y in recent])
+    rows &= records["dataset"] == table.code("dataset", "speed_limit")
+    rows &= (records["road_class"] != NOT_APPLICABLE) & (records["count"] != SUPPRESSED)
+
+    shape = (len(table.categories["road_class"]), len(table.categories["speed_limit"]))
+    totals = {}
+    for severity in ("FSC (adjusted)", "All collisions"):
+        selected = records[rows & (records["severity"] == table.code("severity", severity))]
+        total = np.zeros(shape)
+        np.add.at(total, (selected["road_class"], selected["speed_limit"]), selected["count"])
+        totals[severity] = total
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(totals["All collisions"] > 0, totals["FSC (adjusted)"] / totals["All collisions"], np.nan)
+    return share / np.nanmax(share)
+
+
+class RoadRiskIndex:
+    def __init__(self, table: RoadSafetyTable, segment_road_types: Dict[str, Tuple[str, str]] = SEGMENT_ROAD_TYPES):
+        self.baseline_lookup = build_baseline_lookup(table)
+        self.segments = list(segment_road_types)
+        self._road_type_list = list(segment_road_types.values())
+        self._class_codes = np.array([table.code("road_class", c) for c, _ in segment_road_types.values()], dtype=np.intp)
+        self._speed_codes = np.array([table.code("speed_limit", s) for _, s in segment_road_types.values()], dtype=np.intp)
+        # Road types RAS0301 doesn't split by speed fall back to the class's "All speeds" row
+        all_speeds = table.code("speed_limit", "All speeds")
+        missing = np.isnan(self.baseline_lookup[self._class_codes, self._speed_codes])
+        self._speed_codes[missing] = all_speeds
+
+    def compute(self, snapshot: Dict) -> Dict:
+        readings = [snapshot.get(key) or {} for key in self.segments]
+        readings = [{} if r.get('stale') else r for r in readings]
+        # None (no or stale reading) becomes NaN, and stays NaN through to the risk
+        current = np.array([r.get('current_speed') for r in readings], dtype=np.float64)
+        free = np.array([r.get('free_flow_speed') for r in readings], dtype=np.float64)
+        closed = np.array([bool(r.get('road_closure')) for r in readings], dtype=bool)
+
+        city_score = (snapshot.get('weather') or {}).get('score')
+        city_weather = 1 - (DEFAULT_WEATHER_SCORE if city_score is None else city_score) / 100
+        segment_weather = snapshot.get('segment_weather') or {}
+        weather = np.array([(segment_weather.get(key) or {}).get('score') for key in self.segments], dtype=np.float64)
+        weather = np.where(np.isnan(weather), city_weather, 1 - weather / 100)
+
+        baseline = self.baseline_lookup[self._class_codes, self._speed_codes]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            congestion = np.clip(1 - current / free, 0, 1)
+        congestion[closed] = 1.0
+        risk = 100 * (BASELINE_WEIGHT * baseline + CONGESTION_WEIGHT * congestion + WEATHER_WEIGHT * weather)
+
+        risks = [None if v != v else v for v in np.round(risk, 1).tolist()]
+        congestions = [None if v != v else v for v in np.round(congestion, 3).tolist()]
+        segments = {
+            key: {
+                'risk': r,
+                'baseline': b,
+                'congestion': c,
+                'weather': w,
+                'road_class': road_class,
+                'speed_limit': speed_limit,
+            }
+            for key, r, b, c, w, (road_class, speed_limit)
+            in zip(self.segments, risks, np.round(baseline, 3).tolist(), congestions, np.round(weather, 3).tolist(),
+                   self._road_type_list)
+        }
+        highest = np.nanargmax(risk) if not np.isnan(risk).all() else None
+        return {
+            'generated_at': snapshot.get('timestamp') or datetime.now(timezone.utc).isoformat(),
+            'weather_factor': round(float(city_weather), 3),
+            'highest_risk': None if highest is None else self.segments[highest],
+            'segments': segments,
+        }
@@ -0,0 +1,253 @@
+"""
+GB road-safety statistics (DfT tables RAS0301 and RAS0701) as a compact,
+memory-mapped table.
+
+The CSVs in dataset/ are spreadsheet exports with title rows, notes, quoted
+thousands and "[x]" cells, so they are parsed once by the build step:
+
+    python road_safety.py build
+
+which writes dataset/road_safety.table/: one structured .npy of typed rows
+(categorical columns as int16 codes, -1 where a column doesn't apply), a CSR
+row index per column, and meta.json with the category labels. The server
+memory-maps that directory and answers queries from the indexes.
+"""
+
+import csv
+import json
+import os
+import shutil
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset")
+SPEED_LIMIT_CSV = os.path.join(DATASET_DIR, "ras0301_speed_limit_collisions.csv")
+FACTORS_CSV = os.path.join(DATASET_DIR, "ras0701_collision_number_factors.csv")
+TABLE_PATH = os.path.join(DATASET_DIR, "road_safety.table")
+
+FORMAT_VERSION = 1
+
+# "speed_limit": RAS0301 (severity by road class and speed limit)
+# "factors":     RAS0701 (collisions by road safety factor)
+DATASETS = ["speed_limit", "factors"]
+
+# Categorical columns; each gets a row index
+INDEXED_COLUMNS = ["dataset", "road_class", "speed_limit", "section", "factor", "method", "severity", "year"]
+
+RECORD_DTYPE = np.dtype([(name, np.int16) for name in INDEXED_COLUMNS] + [("count", np.int32)])
+
+NOT_APPLICABLE = -1
+SUPPRESSED = -1  # "[x]" in the source: not available
+
+# The tables carry their own subtotal rows, and every section of RAS0701 has an
+# "Any ... RSF" factor. Summing across them counts collisions more than once.
+SUBTOTAL_LABELS = {"road_class": ("All road types",), "speed_limit": ("All speeds",), "section": ("Any RSF",)}
+SUBTOTAL_PREFIXES = {"factor": "Any "}
+
+
+def _is_subtotal(column: str, label: str) -> bool:
+    return label in SUBTOTAL_LABELS.get(column, ()) or label.startswith(SUBTOTAL_PREFIXES.get(column, "\0"))
+
+
+def _parse_count(cell: str) -> int:
+    cell = cell.strip().replace(",", "")
+    if not cell or cell.startswith("["):
+        return SUPPRESSED
+    return int(cell)
+
+
+def _read_csv(path: str) -> List[List[str]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.reader(f))
+
+
+def _data_rows(rows: List[List[str]], header_index: int):
+    """Rows after the header, up to the first blank row (note rows follow it)."""
+    for row in rows[header_index + 1:]:
+        if not any(cell.strip() for cell in row):
+            return
+        yield [cell.strip() for cell in row]
+
+
+class _Encoder:
+    """Builds category lists as labels are seen."""
+
+    def __init__(self):
+        self.categories: Dict[str, List[str]] = {name: [] for name in INDEXED_COLUMNS}
+        self._codes: Dict[str, Dict[str, int]] = {name: {} for name in INDEXED_COLUMNS}
+
+    def code(self, column: str, label: Optional[str]) -> int:
+        if label is None:
+            return NOT_APPLICABLE
+        codes = self._codes[column]
+        if label not in codes:
+            codes[label] = len(self.categories[column])
+            self.categories[column].append(label)
+        return codes[label]
+
+
+def parse_sources(speed_limit_csv: str = SPEED_LIMIT_CSV, factors_csv: str = FACTORS_CSV):
+    """Both CSVs as one list of record tuples (RECORD_DTYPE order) plus the category labels."""
+    encoder = _Encoder()
+    for name in DATASETS:
+        encoder.code("dataset", name)
+    records = []
+
+    def add(dataset, road_class, speed_limit, section, factor, method, severity, year, count):
+        records.append((
+            encoder.code("dataset", dataset), encoder.code("road_class", road_class),
+            encoder.code("speed_limit", speed_limit), encoder.code("section", section),
+            encoder.code("factor", factor), encoder.code("method", method),
+            encoder.code("severity", severity), encoder.code("year", year), count,
+        ))
+
+    # RAS0301: a few title rows, then "Type of road, Speed limit, Severity, 2015 ... 2024"
+    rows = _read_csv(speed_limit_csv)
+    header_index = next(i for i, row in enumerate(rows) if row and row[0].startswith("Type of road"))
+    years = [cell.strip() for cell in rows[header_index][3:] if cell.strip()]
+    for row in _data_rows(rows, header_index):
+        road_class, speed_limit, severity = row[:3]
+        for year, cell in zip(years, row[3:]):
+            add("speed_limit", road_class, speed_limit, None, None, "reported", severity, year, _parse_count(cell))
+
+    # RAS0701: header first, year columns like "2023 converted" / "2023 directly recorded"
+    rows = _read_csv(factors_csv)
+    year_columns = [cell.strip().split(" ", 1) for cell in rows[0][3:]]
+    for row in _data_rows(rows, 0):
+        section, factor, severity = row[:3]
+        for (year, method), cell in zip(year_columns, row[3:]):
+            add("factors", None, None, section, factor, method, severity, year, _parse_count(cell))
+
+    return records, encoder.categories
+
+
+def build_table(path: str = TABLE_PATH, speed_limit_csv: str = SPEED_LIMIT_CSV,
+                factors_csv: str = FACTORS_CSV) -> str:
+    records, categories = parse_sources(speed_limit_csv, factors_csv)
+    table = np.array(records, dtype=RECORD_DTYPE)
+
+    arrays = {"records": table}
+    for column in INDEXED_COLUMNS:
+        codes = table[column]
+        applicable = np.flatnonzero(codes != NOT_APPLICABLE)
+        # Row ids grouped by code; rows for code c are rows[offsets[c]:offsets[c + 1]]
+        order = applicable[np.argsort(codes[applicable], kind="stable")]
+        counts = np.bincount(codes[applicable], minlength=len(categories[column]))
+        arrays[f"{column}.rows"] = order.astype(np.int32)
+        arrays[f"{column}.offsets"] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+
+    meta = {"format_version": FORMAT_VERSION, "rows": len(table), "categories": categories}
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class RoadSafetyTable:
+    """Memory-mapped road-safety rows with per-column indexes."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict):
+        self.records = arrays["records"]
+        self.categories: Dict[str, List[str]] = meta["categories"]
+        self._index = {column: (arrays[f"{column}.rows"], arrays[f"{column}.offsets"]) for column in INDEXED_COLUMNS}
+        self._codes = {column: {label: i for i, label in enumerate(labels)}
+                       for column, labels in self.categories.items()}
+        self._subtotal_codes = {column: np.array([i for i, label in enumerate(self.categories[column])
+                                                  if _is_subtotal(column, label)], dtype=np.int16)
+                                for column in [*SUBTOTAL_LABELS, *SUBTOTAL_PREFIXES]}
+
+    @classmethod
+    def load(cls, path: str = TABLE_PATH, mmap: bool = True) -> "RoadSafetyTable":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported road safety table format: {meta.get('format_version')}")
+        mode = "r" if mmap else None
+        names = ["records"] + [f"{c}.{part}" for c in INDEXED_COLUMNS for part in ("rows", "offsets")]
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in names}
+        return cls(arrays, meta)
+
+    def code(self, column: str, label) -> int:
+        try:
+            return self._codes[column][str(label)]
+        except KeyError:
+            raise KeyError(f"Unknown {column}: {label!r}") from None
+
+    def rows(self, **filters) -> np.ndarray:
+        """Row ids matching every column=label filter (None filters are ignored), via the indexes."""
+        result = None
+        # Smallest posting list first keeps the intersections short
+        postings = []
+        for column, label in filters.items():
+            if label is None:
+                continue
+            rows, offsets = self._index[column]
+            code = self.code(column, label)
+            postings.append(rows[offsets[code]:offsets[code + 1]])
+        for posting in sorted(postings, key=len):
+            result = posting if result is None else np.intersect1d(result, posting, assume_unique=True)
+        return np.arange(len(self.records)) if result is None else np.sort(result)
+
+    def collapse_subtotals(self, rows: np.ndarray, keep: Optional[str] = None) -> np.ndarray:
+        """
+        Narrows `rows` to the subtotal rows of each column (other than `keep`) that
+        has any among them, so nothing is counted twice: with no road class or speed
+        limit given, only the "All road types" / "All speeds" row is left.
+        """
+        for column, codes in self._subtotal_codes.items():
+            if column == keep:
+                continue
+            subtotal = np.isin(self.records[column][rows], codes)
+            if subtotal.any():
+                rows = rows[subtotal]
+        return rows
+
+    def aggregate(self, group_by: Optional[str] = None, **filters) -> Dict:
+        """
+        Total collisions matching `filters`, optionally broken down by another column.
+        Unfiltered columns are read from their subtotal rows, so totals match the
+        published figures; a subtotal label shows up as a group of its own.
+        """
+        matched = self.rows(**filters)
+        rows = self.collapse_subtotals(matched)
+        counts = self.records["count"][rows]
+        available = counts != SUPPRESSED
+        result = {
+            "filters": {k: v for k, v in filters.items() if v is not None},
+            "rows": int(len(rows)),
+            "suppressed": int((~available).sum()),
+            "total": int(counts[available].sum()),
+        }
+        if group_by:
+            # Each group is collapsed on its own, e.g. per speed limit across the road classes that have it
+            codes = self.records[group_by][matched]
+            groups = {}
+            for code in np.unique(codes[codes != NOT_APPLICABLE]):
+                group_counts = self.records["count"][self.collapse_subtotals(matched[codes == code], keep=group_by)]
+                groups[self.categories[group_by][code]] = int(group_counts[group_counts != SUPPRESSED].sum())
+            result["group_by"] = group_by
+            result["groups"] = groups
+        return result
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("Usage: python road_safety.py build [output_dir]")
+        sys.exit(1)
+    path = build_table(sys.argv[2] if len(sys.argv) > 2 else TABLE_PATH)
+    table = RoadSafetyTable.load(path)
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    print(f"📦 Built {len(table.records)} road safety rows into {path} ({size / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Rolling-window statistics for the prediction engine.
+MetricHistory keeps every metric's window in one NumPy ring buffer so the
+mean/stdev baselines for all metrics come out of a single vectorized pass;
+RollingMedianMAD keeps a sorted copy of a window so the median and MAD never
+need a re-sort. Both can also age readings out after `max_age` seconds, so a
+window spans the same time however often its metric is read.
+"""
+
+from collections import deque
+import numpy as np
+from sortedcontainers import SortedList
+
+# Scales the MAD so it estimates the standard deviation of normally distributed data.
+MAD_TO_STD_DEV = 1.4826
+
+
+class RollingMedianMAD:
+    """Median and median absolute deviation over the last `maxlen` values
+    (and, with `max_age`, only those pushed within the last `max_age` seconds).
+
+    Each push is O(log n) (one insert and at most one removal in the sorted list).
+    The median is an O(log n) index lookup and the MAD is an O(log^2 n)
+    k-th-smallest selection over the two sorted halves around the median,
+    so nothing is ever re-sorted.
+    """
+
+    def __init__(self, maxlen: int, max_age: float | None = None):
+        self.maxlen = maxlen
+        self.max_age = max_age
+        self._order = deque()      # Insertion order, so we know what to evict
+        self._times = deque()      # Push time of each value in _order
+        self._sorted = SortedList()
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def push(self, value: float, now: float = 0.0):
+        """Adds a value, evicting the oldest one once the window is full."""
+        if len(self._order) == self.maxlen:
+            self._sorted.remove(self._order.popleft())
+            self._times.popleft()
+        self._order.append(value)
+        self._times.append(now)
+        self._sorted.add(value)
+
+    def expire(self, now: float):
+        """Evicts values older than `max_age` seconds (no-op without one)."""
+        if self.max_age is None:
+            return
+        while self._times and self._times[0] < now - self.max_age:
+            self._times.popleft()
+            self._sorted.remove(self._order.popleft())
+
+    def median(self) -> float | None:
+        n = len(self._sorted)
+        if n == 0:
+            return None
+        mid = n // 2
+        if n % 2:
+            return float(self._sorted[mid])
+        return (self._sorted[mid - 1] + self._sorted[mid]) / 2
+
+    def mad(self) -> float | None:
+        """Median of |x - median| across the window."""
+        n = len(self._sorted)
+        if n == 0:
+            return None
+        m = self.median()
+        if n % 2:
+            return self._kth_deviation(m, n // 2 + 1)
+        return (self._kth_deviation(m, n // 2) + self._kth_deviation(m, n // 2 + 1)) / 2
+
+    def robust_std_dev(self) -> float | None:
+        """MAD scaled to be comparable with a standard deviation."""
+        mad = self.mad()
+        return None if mad is None else mad * MAD_TO_STD_DEV
+
+    def _kth_deviation(self, m: float, k: int) -> float:
+        """k-th (1-based) smallest |x - m|.
+
+        Values below m give deviations that grow as we walk left from the split,
+        values at or above m give deviations that grow as we walk right, so this
+        is the classic k-th element of two sorted arrays, done by binary search
+        on how many elements are taken from the left side.
+        """
+        s = self._sorted
+        split = s.bisect_left(m)
+        n_left, n_right = split, len(s) - split
+
+        def left(i):  # i-th smallest deviation among values below m
+            return m - s[split - 1 - i]
+
+        def right(j):  # j-th smallest deviation among values at or above m
+            return s[split + j] - m
+
+        lo, hi = max(0, k - n_right), min(k, n_left)
+        while lo <= hi:
+            i = (lo + hi) // 2  # Take i from the left side, k - i from the right
+            j = k - i
+            if i > 0 and j < n_right and left(i - 1) > right(j):
+                hi = i - 1
+            elif j > 0 and i < n_left and right(j - 1) > left(i):
+                lo = i + 1
+            else:
+                candidates = []
+                if i > 0:
+                    candidates.append(left(i - 1))
+                if j > 0:
+                    candidates.append(right(j - 1))
+                return float(max(candidates))
+        raise RuntimeError("k is out of range for the current window")
+
+
+class MetricHistory:
+    """Shared ring buffer of the last `length` readings for every metric
+    (and, with `max_age`, only those pushed within the last `max_age` seconds).
+
+    Metrics are rows, allocated on first sight. Each cycle's readings are written
+    with one fancy-indexed assignment and the baselines for every row come from
+    whole-array reductions, so adding a metric adds a row rather than another loop.
+    """
+
+    def __init__(self, length: int, initial_rows: int = 16, max_age: float | None = None):
+        self.length = length
+        self.max_age = max_age
+        self._values = np.full((initial_rows, length), np.nan)
+        self._times = np.full((initial_rows, length), np.nan)
+        self._heads = np.zeros(initial_rows, dtype=np.intp)
+        self._counts = np.zeros(initial_rows, dtype=np.intp)
+        self._rows: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def row(self, metric_id) -> int:
+        """Row index for `metric_id`, allocating (and growing the buffer) if needed."""
+        row = self._rows.get(metric_id)
+        if row is None:
+            row = self._rows[metric_id] = len(self._rows)
+            if row == self._values.shape[0]:
+                extra = self._values.shape[0]
+                self._values = np.vstack([self._values, np.full((extra, self.length), np.nan)])
+                self._times = np.vstack([self._times, np.full((extra, self.length), np.nan)])
+                self._heads = np.concatenate([self._heads, np.zeros(extra, dtype=np.intp)])
+                self._counts = np.concatenate([self._counts, np.zeros(extra, dtype=np.intp)])
+        return row
+
+    def metric_ids(self):
+        return self._rows.keys()
+
+    def count(self, metric_id) -> int:
+        row = self._rows.get(metric_id)
+        return 0 if row is None else int(self._counts[row])
+
+    def push(self, rows, values, now: float = 0.0):
+        """Appends one reading to each of `rows` in a single vectorized write."""
+        rows = np.asarray(rows, dtype=np.intp)
+        if rows.size == 0:
+            return
+        self._values[rows, self._heads[rows]] = values
+        self._times[rows, self._heads[rows]] = now
+        self._heads[rows] = (self._heads[rows] + 1) % self.length
+        self._counts[rows] = np.minimum(self._counts[rows] + 1, self.length)
+
+    def expire(self, now: float):
+        """Blanks readings older than `max_age` seconds (no-op without one).
+
+        A row's readings are in time order, so the expired ones are always its
+        oldest and the next push still lands on a free (or the oldest) slot.
+        """
+        if self.max_age is None:
+            return
+        n = len(self._rows)
+        old = self._times[:n] < now - self.max_age
+        if old.any():
+            self._values[:n][old] = np.nan
+            self._times[:n][old] = np.nan
+            self._counts[:n] = (~np.isnan(self._values[:n])).sum(axis=1)
+
+    def mean_std(self):
+        """(means, sample std devs, counts) for every allocated row.
+
+        Rows with fewer than two readings get a std dev of 0 (and a NaN mean when empty).
+        """
+        n = len(self._rows)
+        values, counts = self._values[:n], self._counts[:n]
+        filled = ~np.isnan(values)
+        totals = np.where(filled, values, 0.0).sum(axis=1)
+        safe_counts = np.maximum(counts, 1)
+        means = np.where(counts > 0, totals / safe_counts, np.nan)
+        deviations = np.where(filled, values - means[:, None], 0.0)
+        variances = (deviations ** 2).sum(axis=1) / np.maximum(counts - 1, 1)
+        std_devs = np.where(counts > 1, np.sqrt(variances), 0.0)
+        return means, std_devs, counts
+
+    def clear(self):
+        self._values[:] = np.nan
+        self._times[:] = np.nan
+        self._heads[:] = 0
+        self._counts[:] = 0
+        self._rows.clear()
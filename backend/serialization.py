@@ -0,0 +1,69 @@
+"""
+JSON encoding for REST responses and the WebSocket broadcast.
+
+orjson is used when it is installed (JSON_SERIALIZER = "orjson"); otherwise the
+standard library. Either way NaN/inf come out as null, numpy values are
+handled, and anything else falls back to FastAPI's jsonable_encoder.
+"""
+
+import json
+import logging
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from config.settings import JSON_SERIALIZER
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if JSON_SERIALIZER == "orjson" and orjson is None:
+    logger.warning("orjson not installed; falling back to the json module")
+
+USE_ORJSON = JSON_SERIALIZER == "orjson" and orjson is not None
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "item") and hasattr(value, "dtype"):  # numpy scalar
+        return value.item()
+    if hasattr(value, "tolist"):  # numpy array
+        return value.tolist()
+    return jsonable_encoder(value)
+
+
+def _finite(value: Any) -> Any:
+    """Copy of value with NaN/inf floats replaced by None (what orjson does natively)."""
+    if isinstance(value, float):
+        return value if value == value and value not in (float("inf"), float("-inf")) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def dumps(value: Any) -> bytes:
+    """value -> compact UTF-8 JSON."""
+    if USE_ORJSON:
+        return orjson.dumps(value, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    try:
+        text = json.dumps(value, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    except ValueError:
+        text = json.dumps(_finite(value), default=_default, ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """The app's default response class; content that is already bytes is sent as-is."""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Tests import backend modules the way the server and the training scripts do
+sys.path.insert(0, os.path.join(BACKEND_DIR, "data_analysis"))
+sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import pytest
+
+from data_sources.json_stream import iter_array_items
+
+DOCUMENTS = [
+    '{"v":[1],"t":1e10}',
+    '{"t":1e10,"v":[55.0, -1.5e3, 2E-2, 0, -0, 1e+5, 12345678901234567890]}',
+    '{"last_updated": 1700000000, "v": [{"id": "a", "lat": 55.95, "lon": -3.19, "speed": 12.5e0},'
+    ' {"id": "b", "lat": 55.9, "lon": -3.2, "tags": [true, false, null], "nested": {"x": [1.25, {"y": -7}]}}]}',
+    '{"v": ["café ☃", "\\u00e9", 3.14159, -0.5E-7], "tail": [1, 2.5], "n": -42}',
+    '{"v": []}',
+    '{"other": 1.5, "v": [ 1 , 2.0 , 3e1 ] , "after": 9.75}',
+]
+
+
+def _collect(document: str, chunk_size: int, key: str = "v") -> list:
+    data = document.encode()
+
+    async def chunks():
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    async def run():
+        return [item async for item in iter_array_items(chunks(), key)]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_matches_json_loads_at_every_chunk_size(document):
+    expected = json.loads(document)["v"]
+    for chunk_size in range(1, len(document.encode()) + 1):
+        assert _collect(document, chunk_size) == expected, chunk_size
+
+
+def test_number_split_after_point_or_exponent():
+    # raw_decode("55.") would stop at the point; each split must still give the whole number
+    document = '{"v":[55.25,-1.5e3,7E+2]}'
+    for chunk_size in range(1, len(document) + 1):
+        items = _collect(document, chunk_size)
+        assert items == [55.25, -1500.0, 700.0]
+        assert [type(item) for item in items] == [float, float, float]
+
+
+def test_project_skips_none():
+    document = '{"v":[1,2,3,4]}'
+
+    async def chunks():
+        yield document.encode()
+
+    async def run():
+        return [item async for item in iter_array_items(chunks(), "v", lambda x: x * 10 if x % 2 else None)]
+
+    assert asyncio.run(run()) == [10, 30]
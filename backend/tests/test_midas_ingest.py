@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+import pytest
+
+import midas_ingest
+from feature_pipeline import compile_pipeline
+from midas_ingest import clean_midas_frame, read_midas_csv, stream_midas_aggregates
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_analysis")
+MIDAS_2023 = os.path.join(DATA_DIR, "midas-open_uk-hourly-weather-2023.csv")
+
+
+def _frame(ob_times):
+    return pd.DataFrame({"ob_time": pd.array(ob_times, dtype="string"), "src_id": 19260})
+
+
+def test_ob_time_is_month_first_and_unpadded():
+    frame = clean_midas_frame(_frame(["1/13/2023 0:00", "02/03/2023 08:00", "end data"]))
+    assert frame["timestamp"].tolist() == [pd.Timestamp("2023-01-13 00:00"), pd.Timestamp("2023-02-03 08:00")]
+
+
+def test_unparseable_ob_time_raises():
+    with pytest.raises(ValueError):
+        clean_midas_frame(_frame(["13/01/2023 00:00"]))
+
+
+def test_day_first_rows_going_backwards_raise():
+    with pytest.raises(ValueError):
+        clean_midas_frame(_frame(["02/03/2023 08:00", "2/1/2023 0:00"]))
+
+
+def test_bundled_csv_covers_2023():
+    frame = clean_midas_frame(read_midas_csv(MIDAS_2023))
+    assert len(frame) == 8760
+    assert frame["timestamp"].min() == pd.Timestamp("2023-01-01 00:00")
+    assert frame["timestamp"].max() == pd.Timestamp("2023-12-31 23:00")
+    assert frame["timestamp"].diff().dropna().eq(pd.Timedelta(hours=1)).all()
+    assert frame["timestamp"].dt.floor("D").nunique() == 365
+
+
+def _baseline_daily(path, columns):
+    """The original training script's daily weather: hourly rows from 2023-01-01, complete rows only, resampled."""
+    weather = pd.read_csv(path, low_memory=False)
+    weather.columns = weather.columns.str.strip()
+    weather["timestamp"] = pd.date_range(start="2023-01-01", periods=len(weather), freq="h")
+    weather = weather[["timestamp"] + columns].copy()
+    for col in columns:
+        weather[col] = pd.to_numeric(weather[col], errors="coerce")
+    daily = weather.dropna().set_index("timestamp").resample("D").mean()
+    return daily.dropna(how="all").reset_index()
+
+
+def test_streamed_daily_means_match_baseline(tmp_path, monkeypatch):
+    monkeypatch.setattr(midas_ingest, "CACHE_DIR", str(tmp_path))
+    columns = compile_pipeline("midas").input_fields
+    baseline = _baseline_daily(MIDAS_2023, columns)
+    for _ in range(2):  # Parsed, then from the cache
+        streamed = stream_midas_aggregates([MIDAS_2023], columns=columns, workers=1)
+        assert len(streamed) == len(baseline)
+        assert (streamed["timestamp"].to_numpy() == baseline["timestamp"].to_numpy()).all()
+        pd.testing.assert_frame_equal(streamed[columns], baseline[columns], rtol=1e-12, atol=1e-12)
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,33 @@
+import pytest
+
+from road_safety import RoadSafetyTable
+
+# DfT reported road collisions, Great Britain (RAS0301 "All road types", "All speeds")
+PUBLISHED_ALL_COLLISIONS = {"2023": 104258, "2024": 100927}
+
+
+@pytest.fixture(scope="module")
+def table():
+    return RoadSafetyTable.load()
+
+
+def test_default_total_matches_published_figure(table):
+    for year, published in PUBLISHED_ALL_COLLISIONS.items():
+        result = table.aggregate(dataset="speed_limit", severity="All collisions", year=year)
+        assert result["total"] == published
+
+
+def test_groups_break_down_the_same_total(table):
+    query = dict(dataset="speed_limit", severity="All collisions", year="2024")
+    by_class = table.aggregate(group_by="road_class", **query)
+    assert by_class["total"] == by_class["groups"]["All road types"] == 100927
+
+    by_speed = table.aggregate(group_by="speed_limit", road_class="Built up", **query)
+    assert by_speed["groups"]["All speeds"] == by_speed["total"]
+    assert by_speed["groups"]["30"] == table.aggregate(speed_limit="30", **query)["total"]
+
+
+def test_factor_sections_read_from_their_subtotal(table):
+    query = dict(dataset="factors", severity="All collisions", year="2023", method="converted")
+    by_section = table.aggregate(group_by="section", **query)
+    assert by_section["total"] == by_section["groups"]["Any RSF"]
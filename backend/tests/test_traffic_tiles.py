@@ -0,0 +1,179 @@
+import asyncio
+import math
+import struct
+
+import httpx
+import numpy as np
+import pytest
+
+from config.traffic_segments import TrafficSegment
+from data_sources.traffic_tiles import (
+    ABSOLUTE_STYLE,
+    FLOW_LAYER,
+    SegmentSpeedTable,
+    TrafficTileFetcher,
+    decode_flow_tile,
+    tiles_for_bbox,
+)
+
+Z, X, Y = 12, 2011, 1276  # The tile over central Edinburgh
+EXTENT = 4096
+
+
+# ---- a minimal MVT encoder for the stub tiles ----
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte, n = n & 0x7F, n >> 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number: int, value) -> bytes:
+    if isinstance(value, int):
+        return _varint(number << 3) + _varint(value)
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _packed(values) -> bytes:
+    return b"".join(_varint(v) for v in values)
+
+
+def _value(value) -> bytes:
+    if isinstance(value, bool):
+        return _field(7, int(value))
+    if isinstance(value, str):
+        return _field(1, value.encode())
+    if isinstance(value, int):
+        return _field(6, _zigzag(value))
+    return _varint(3 << 3 | 1) + struct.pack("<d", value)  # double
+
+
+def _geometry(lines, geom_type=2) -> list:
+    """MoveTo + LineTo runs with zigzag deltas from the previous cursor, as in the MVT spec."""
+    commands, cx, cy = [], 0, 0
+    for line in lines:
+        points = line if geom_type == 2 else line[:1]
+        for command, run in ((1, points[:1]), (2, points[1:])):
+            if not run:
+                continue
+            commands.append(command | len(run) << 3)
+            for px, py in run:
+                commands += [_zigzag(px - cx), _zigzag(py - cy)]
+                cx, cy = px, py
+    return commands
+
+
+def encode_tile(features, layer_name=FLOW_LAYER, extra_layers=()) -> bytes:
+    """features: (properties, lines in tile pixels, geometry type)"""
+    keys, values, encoded = [], [], []
+    for props, lines, geom_type in features:
+        tags = []
+        for key, value in props.items():
+            if key not in keys:
+                keys.append(key)
+            values.append(value)
+            tags += [keys.index(key), len(values) - 1]
+        encoded.append(_field(2, _packed(tags)) + _field(3, geom_type) + _field(4, _packed(_geometry(lines, geom_type))))
+    layer = (_field(15, 2) + _field(1, layer_name.encode()) + b"".join(_field(2, f) for f in encoded)
+             + b"".join(_field(3, k.encode()) for k in keys) + b"".join(_field(4, _value(v)) for v in values)
+             + _field(5, EXTENT))
+    return b"".join(_field(3, other) for other in extra_layers) + _field(3, layer)
+
+
+def to_lat_lon(px, py, z=Z, x=X, y=Y):
+    n = EXTENT * (1 << z)
+    lon = (x * EXTENT + px) / n * 360 - 180
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y * EXTENT + py) / n))))
+    return lat, lon
+
+
+# Two features: a two-part line (closed, motorway) and a line whose deltas go negative
+LINE_A = [[(100, 200), (300, 200), (300, 400)], [(1000, 1000), (1100, 900)]]
+LINE_B = [[(2000, 3000), (1500, 2500), (1600, 2400), (1200, 2800)]]
+FEATURES = [
+    ({"traffic_level": 42.5, "road_closure": True, "road_type": "Motorway"}, LINE_A, 2),
+    ({"traffic_level": 17, "road_type": "Local road"}, LINE_B, 2),
+    ({"traffic_level": 99.0}, [[(50, 50)]], 1),                  # Point: not a road line
+    ({"road_type": "Local road"}, [[(10, 10), (20, 20)]], 2),    # No traffic_level
+]
+
+
+@pytest.fixture(scope="module")
+def decoded():
+    other = _field(1, b"Something else") + _field(5, EXTENT)
+    return decode_flow_tile(encode_tile(FEATURES, extra_layers=[other]), Z, X, Y)
+
+
+def test_decodes_line_features_and_properties(decoded):
+    assert decoded["level"].tolist() == [42.5, 17.0]
+    assert decoded["closure"].tolist() == [True, False]
+    assert decoded["road_type"].tolist() == ["Motorway", "Local road"]
+    assert decoded["offsets"].tolist() == [0, 3, 5, 9]
+    assert decoded["line_feature"].tolist() == [0, 0, 1]
+
+
+def test_decodes_geometry_to_lat_lon(decoded):
+    vertices = [p for lines in (LINE_A, LINE_B) for line in lines for p in line]
+    expected = np.array([to_lat_lon(px, py) for px, py in vertices])
+    np.testing.assert_allclose(decoded["lat"], expected[:, 0], atol=1e-9)
+    np.testing.assert_allclose(decoded["lon"], expected[:, 1], atol=1e-9)
+    # Pixel (0, 0) is the tile's north-west corner
+    lat, lon = to_lat_lon(0, 0)
+    assert (X, Y) in tiles_for_bbox([lat - 0.001, lon + 0.001, lat - 0.0005, lon + 0.002], Z)
+
+
+def test_nearest_line_matches_segment(decoded):
+    table = SegmentSpeedTable([decoded])
+    assert len(table) == 2
+
+    # Midway along LINE_B's second edge, then just off it
+    lat, lon = to_lat_lon(1550, 2450)
+    assert table.nearest(lat, lon) == (1, pytest.approx(0, abs=0.01))
+    lat, lon = to_lat_lon(1550, 2460)
+    pixel_m = 40075016.686 * math.cos(math.radians(lat)) / (EXTENT << Z)
+    feature, distance = table.nearest(lat, lon)
+    assert feature == 1
+    assert distance == pytest.approx(10 / math.sqrt(2) * pixel_m, rel=0.01)
+
+    # The gap between LINE_A's two parts isn't an edge
+    lat, lon = to_lat_lon(650, 700)
+    assert table.nearest(lat, lon)[0] == -1
+
+
+def test_fetcher_reads_segments_from_stub_tiles():
+    absolute = encode_tile([({"traffic_level": 36.0}, LINE_B, 2)])
+    relative = encode_tile([({"traffic_level": 0.6}, LINE_B, 2)])
+
+    def handler(request):
+        style = request.url.path.split("/")[-4]
+        return httpx.Response(200, content=absolute if style == ABSOLUTE_STYLE else relative)
+
+    lat, lon = to_lat_lon(1550, 2450)
+    on_road = TrafficSegment("stub_traffic", "stub", "Stub Road", lat, lon, "Built up", "30")
+    lat, lon = to_lat_lon(3900, 100)
+    off_road = TrafficSegment("far_traffic", "far", "Far Road", lat, lon, "Built up", "30")
+
+    async def run():
+        fetcher = TrafficTileFetcher("key", bbox=[lat, lon, lat, lon], zoom=Z)
+        fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await fetcher.fetch_many([on_road, off_road]), fetcher
+        finally:
+            await fetcher.close()
+
+    results, fetcher = asyncio.run(run())
+    assert fetcher.tiles == [(X, Y)]
+    reading = results["stub_traffic"]
+    assert reading["current_speed"] == 36.0
+    assert reading["free_flow_speed"] == 60.0
+    assert fetcher.calculate_score(reading) == 60.0
+    assert isinstance(results["far_traffic"], LookupError)
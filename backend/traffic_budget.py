@@ -0,0 +1,137 @@
+"""
+Daily TomTom request budget for point ingestion (one flowSegmentData call per
+segment poll).
+
+Rather than polling every segment every cycle, PollingBudget spreads what is
+left of the day's quota over the hours left in the (UTC) day, with rush hours
+given a bigger share than the small hours (HOURLY_WEIGHT). That rate is shared
+between segments by weight:
+  - recent score variance: a road whose score is moving gets polled more
+  - open anomaly predictions: a road being watched gets ANOMALY_BOOST
+Because the rate is always "what's left / time left", polling slows smoothly as
+the budget runs down instead of stopping dead when the quota is hit.
+"""
+
+import math
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config.settings import (TRAFFIC_DAILY_QUOTA, TRAFFIC_MAX_POLL_INTERVAL, TRAFFIC_QUOTA_RESERVE,
+                             UPDATE_INTERVAL)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Relative polling weight by UTC hour, like the quota day (rush hours high, overnight low)
+HOURLY_WEIGHT = [0.3] * 6 + [0.7] + [1.5] * 3 + [1.0] * 6 + [1.5] * 3 + [0.8] * 3 + [0.5] * 2
+
+VARIANCE_WINDOW = 20   # Recent scores per segment used for the variance weight
+VARIANCE_SCALE = 10.0  # A score std dev of this many points doubles a segment's weight
+ANOMALY_BOOST = 3.0
+
+
+class PollingBudget:
+    """Decides which segments are due a poll each cycle, within a daily request quota."""
+
+    def __init__(self, segment_keys: Iterable[str], daily_quota: int = TRAFFIC_DAILY_QUOTA,
+                 reserve: float = TRAFFIC_QUOTA_RESERVE, min_interval: float = UPDATE_INTERVAL,
+                 max_interval: float = TRAFFIC_MAX_POLL_INTERVAL, clock=time.time):
+        self.keys = list(segment_keys)
+        self.daily_quota = daily_quota
+        self.reserve = reserve
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._clock = clock
+        self.used = 0
+        self._day = self._utc_day(clock())
+        self._last_polled: Dict[str, Optional[float]] = {key: None for key in self.keys}
+        self._scores: Dict[str, deque] = {key: deque(maxlen=VARIANCE_WINDOW) for key in self.keys}
+        self.intervals: Dict[str, float] = {key: min_interval for key in self.keys}
+
+    @staticmethod
+    def _utc_day(now: float):
+        return datetime.fromtimestamp(now, timezone.utc).date()
+
+    def _roll_day(self, now: float):
+        day = self._utc_day(now)
+        if day != self._day:
+            self._day, self.used = day, 0
+
+    def record(self, requests: int = 1):
+        """Counts requests made against the quota (including on-demand ones)."""
+        self._roll_day(self._clock())
+        self.used += requests
+
+    def observe(self, key: str, score: float):
+        if key in self._scores:
+            self._scores[key].append(score)
+
+    def remaining(self) -> int:
+        self._roll_day(self._clock())
+        return max(0, self.daily_quota - self.used)
+
+    def sustainable_rate(self, now: float) -> float:
+        """
+        Requests per second to spend now so that the rest of today's quota (less
+        the reserve) lasts until midnight UTC, with each hour's share in
+        proportion to HOURLY_WEIGHT.
+        """
+        spendable = self.remaining() - self.reserve * self.daily_quota
+        if spendable <= 0:
+            return 0.0
+        end = now - now % SECONDS_PER_DAY + SECONDS_PER_DAY
+        weighted_seconds, t = 0.0, now
+        while t < end:
+            next_hour = min(end, t - t % 3600 + 3600)
+            weighted_seconds += HOURLY_WEIGHT[datetime.fromtimestamp(t, timezone.utc).hour] * (next_hour - t)
+            t = next_hour
+        return spendable * HOURLY_WEIGHT[datetime.fromtimestamp(now, timezone.utc).hour] / weighted_seconds
+
+    def weight(self, key: str, active: bool) -> float:
+        scores = self._scores[key]
+        spread = float(np.std(scores)) if len(scores) > 1 else 0.0
+        weight = 1 + spread / VARIANCE_SCALE
+        return weight * ANOMALY_BOOST if active else weight
+
+    def plan(self, active_keys: Iterable[str] = ()) -> Dict[str, float]:
+        """Polling interval (seconds) per segment for the current budget; inf means don't poll."""
+        now = self._clock()
+        rate = self.sustainable_rate(now)
+        if rate <= 0:
+            self.intervals = {key: math.inf for key in self.keys}
+            return self.intervals
+
+        active = set(active_keys)
+        weights = np.array([self.weight(key, key in active) for key in self.keys])
+        intervals = weights.sum() / (rate * weights)
+        # Only guarantee the slowest poll rate while the budget can afford it for every segment
+        upper = self.max_interval if rate * self.max_interval >= len(self.keys) else math.inf
+        self.intervals = dict(zip(self.keys, np.clip(intervals, self.min_interval, upper).tolist()))
+        return self.intervals
+
+    def due(self, active_keys: Iterable[str] = ()) -> List[str]:
+        """Segments to poll now; call mark_polled() with the ones actually requested."""
+        intervals = self.plan(active_keys)
+        now = self._clock()
+        return [key for key in self.keys
+                if math.isfinite(intervals[key])
+                and (self._last_polled[key] is None or now - self._last_polled[key] >= intervals[key])]
+
+    def mark_polled(self, keys: Iterable[str]):
+        """Starts the keys' next interval from now and counts one request each."""
+        keys = list(keys)
+        now = self._clock()
+        for key in keys:
+            self._last_polled[key] = now
+        self.record(len(keys))
+
+    def status(self) -> Dict:
+        return {
+            "daily_quota": self.daily_quota,
+            "used_today": self.used,
+            "remaining": self.remaining(),
+            "intervals": {key: (round(v) if math.isfinite(v) else None) for key, v in self.intervals.items()},
+        }
@@ -0,0 +1,127 @@
+"""
+Short-term traffic score forecasts for every monitored segment.
+Holt's linear (damped trend) exponential smoothing, with the level/trend state
+for all segments held in NumPy arrays: each cycle is one vectorized update and
+one outer product for the horizons, so the cost is O(segments) no matter how
+much history has been seen. Segments are polled at different rates (see
+traffic_budget.py), so each update is weighted by the time since that segment's
+last reading, counted in UPDATE_INTERVAL steps.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import numpy as np
+
+from config.settings import UPDATE_INTERVAL
+
+FORECAST_HORIZONS_MINS = (15, 30, 45, 60)
+
+# Smoothing parameters (per 30s step; a longer gap between readings counts as several)
+LEVEL_ALPHA = 0.3    # Weight of the newest reading in the level
+TREND_BETA = 0.05    # Weight of the newest change in the trend
+TREND_DAMPING = 0.98 # Trend fades out over the horizon instead of running away
+
+
+class TrafficForecaster:
+    """Damped-trend Holt smoothing state for each segment, plus the cached forecast."""
+
+    def __init__(self, step_seconds: float = UPDATE_INTERVAL, horizons_mins=FORECAST_HORIZONS_MINS,
+                 alpha: float = LEVEL_ALPHA, beta: float = TREND_BETA, phi: float = TREND_DAMPING):
+        self.step_seconds = step_seconds
+        self.horizons_mins = tuple(horizons_mins)
+        self.alpha, self.beta, self.phi = alpha, beta, phi
+
+        # Each horizon in steps; a forecast is level + damp(age + horizon) * trend
+        self._horizon_steps = np.array([m * 60 / step_seconds for m in self.horizons_mins])
+
+        self._index: Dict[str, int] = {}
+        self._level = np.zeros(0)
+        self._trend = np.zeros(0)  # Per step
+        self._seen = np.zeros(0, dtype=bool)
+        self._last_at = np.zeros(0)  # Epoch seconds of each segment's last reading
+        self._cache: Dict = self._empty_forecast()
+
+    def _empty_forecast(self) -> Dict:
+        return {"generated_at": None, "horizons_mins": list(self.horizons_mins), "segments": {}}
+
+    def _ensure(self, keys):
+        new_keys = [k for k in keys if k not in self._index]
+        if not new_keys:
+            return
+        for key in new_keys:
+            self._index[key] = len(self._index)
+        extra = len(new_keys)
+        self._level = np.concatenate([self._level, np.zeros(extra)])
+        self._trend = np.concatenate([self._trend, np.zeros(extra)])
+        self._seen = np.concatenate([self._seen, np.zeros(extra, dtype=bool)])
+        self._last_at = np.concatenate([self._last_at, np.zeros(extra)])
+
+    def _damped_steps(self, steps: np.ndarray) -> np.ndarray:
+        """Sum of phi^1..phi^k for (fractional) k steps: how much of the trend a k-step gap adds."""
+        return self.phi * (1 - self.phi ** steps) / (1 - self.phi) if self.phi < 1 else steps
+
+    def update(self, scores: Dict[str, float], now: Optional[datetime] = None):
+        """
+        Folds in one reading per segment (missing segments keep their state) and refreshes the cache.
+        A reading k steps after the segment's last one is smoothed as if k steps had passed
+        (at least one), so the trend and the horizons stay in real time however often it is polled.
+        """
+        now = now or datetime.now(timezone.utc)
+        t = now.timestamp()
+        self._ensure(scores)
+        obs = np.full(len(self._index), np.nan)
+        obs[[self._index[k] for k in scores]] = list(scores.values())
+
+        present = ~np.isnan(obs)
+        first = present & ~self._seen
+        update = present & self._seen
+
+        self._level[first] = obs[first]
+        self._trend[first] = 0.0
+        self._seen |= first
+
+        k = np.maximum((t - self._last_at[update]) / self.step_seconds, 1.0)
+        alpha = 1 - (1 - self.alpha) ** k
+        beta = 1 - (1 - self.beta) ** k
+        prev_level = self._level[update]
+        trend = self._trend[update]
+        self._level[update] = alpha * obs[update] + (1 - alpha) * (prev_level + self._damped_steps(k) * trend)
+        self._trend[update] = beta * (self._level[update] - prev_level) / k + (1 - beta) * self.phi ** k * trend
+        self._last_at[present] = t
+
+        self._refresh(obs, now)
+
+    def _refresh(self, obs: np.ndarray, now: datetime):
+        # Forecast from each segment's last reading out to now + horizon; scores live on a 0-100 scale
+        ages = np.maximum(now.timestamp() - self._last_at, 0) / self.step_seconds
+        damping = self._damped_steps(ages[:, None] + self._horizon_steps[None, :])
+        forecasts = np.clip(self._level[:, None] + self._trend[:, None] * damping, 0, 100)
+        per_minute = self._trend * (60 / self.step_seconds)
+        segments = {}
+        for key, i in self._index.items():
+            if not self._seen[i]:
+                continue
+            segments[key] = {
+                "current": None if np.isnan(obs[i]) else round(float(obs[i]), 1),
+                "level": round(float(self._level[i]), 2),
+                "trend_per_min": round(float(per_minute[i]), 3),
+                "forecast": {str(m): round(float(v), 1) for m, v in zip(self.horizons_mins, forecasts[i])},
+            }
+        self._cache = {
+            "generated_at": now.isoformat(),
+            "horizons_mins": list(self.horizons_mins),
+            "segments": segments,
+        }
+
+    def get_forecast(self) -> Dict:
+        """The forecast as of the last update (no recomputation)."""
+        return self._cache
+
+    def reset(self):
+        self._index.clear()
+        self._level = np.zeros(0)
+        self._trend = np.zeros(0)
+        self._seen = np.zeros(0, dtype=bool)
+        self._last_at = np.zeros(0)
+        self._cache = self._empty_forecast()